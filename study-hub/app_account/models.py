@@ -1,6 +1,7 @@
 import uuid
 from pathlib import Path
 
+from app_studyhub.images import AVATAR_WIDTHS, update_image_variants
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models.signals import post_save
@@ -78,6 +79,8 @@ class UserProfile(models.Model):
         blank=True,
         null=True,
     )
+    # resized WebP copies of the avatar, rendered when it is saved
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         db_table = "account_user_profile"
@@ -94,6 +97,12 @@ def create_profile(sender, instance, created, **kwargs):
         UserProfile(user_account=instance).save()
 
 
+@receiver(signal=post_save, sender=UserProfile)
+def update_avatar_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_image_variants(instance, "avatar", AVATAR_WIDTHS)
+
+
 class Feedback(models.Model):
     class ProcessStatus(models.TextChoices):
         NOT_STARTED = "not-started", "Not started"
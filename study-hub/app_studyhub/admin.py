@@ -1,9 +1,26 @@
-from django.contrib import admin
+import mimetypes
+
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from django.template.defaultfilters import filesizeformat
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
+from django.utils.translation import ngettext
 
-from .models import Category, File, Subcategory
+from .forms import DirectUploadForm, FileAdminForm, FileImportForm
+from .imports import import_files
+from .models import Category, File, Subcategory, Task
+from .uploads import (
+    create_direct_upload,
+    get_direct_upload_key,
+    sign_direct_upload,
+    supports_direct_upload,
+)
 
 
 class BaseAppModelAdmin(admin.ModelAdmin):
@@ -165,6 +182,7 @@ class SubcategoryAdmin(BaseAppModelAdmin):
     """Admin display of Subcategory model."""
 
     # inlines = [FileInline]
+    actions = ["import_files"]
     list_display = [
         "name",
         "category",
@@ -197,6 +215,70 @@ class SubcategoryAdmin(BaseAppModelAdmin):
             return add_fieldsets
         return super().get_fieldsets(request, obj)
 
+    def has_import_files_permission(self, request):
+        return request.user.has_perm("app_studyhub.add_file")
+
+    @admin.action(
+        description=_("Import files from a ZIP archive or a folder"),
+        permissions=["import_files"],
+    )
+    def import_files(self, request, queryset):
+        """
+        Import all documents of a ZIP archive (or of a folder) as files of
+        the selected subject, then show what became of each of them.
+        """
+        if len(queryset) != 1:
+            self.message_user(
+                request,
+                _("Select exactly one subject to import the files into."),
+                messages.WARNING,
+            )
+            return None
+        subcategory = queryset.select_related("category").get()
+
+        results = None
+        if "import" in request.POST:
+            form = FileImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                results = import_files(
+                    subcategory,
+                    form.cleaned_data["items"],
+                    request.user,
+                    file_type=form.cleaned_data["file_type"],
+                    file_language=form.cleaned_data["file_language"],
+                )
+                imported_count = sum(item.is_imported for item in results)
+                self.message_user(
+                    request,
+                    ngettext(
+                        "%(imported)d of %(total)d file was imported.",
+                        "%(imported)d of %(total)d files were imported.",
+                        len(results),
+                    )
+                    % {"imported": imported_count, "total": len(results)},
+                    (
+                        messages.SUCCESS
+                        if imported_count == len(results)
+                        else messages.WARNING
+                    ),
+                )
+        else:
+            form = FileImportForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": _("Import files into %(subject)s") % {"subject": subcategory},
+            "opts": self.model._meta,
+            "subcategory": subcategory,
+            "form": form,
+            "results": results,
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "media": self.media + form.media,
+        }
+        return TemplateResponse(
+            request, "admin/app_studyhub/subcategory/import_files.html", context
+        )
+
     # def get_inline_instances(self, request, obj):
     #     return (
     #         obj
@@ -230,6 +312,7 @@ class SubcategoryAdmin(BaseAppModelAdmin):
 class FileAdmin(BaseAppModelAdmin):
     """Admin display of File model."""
 
+    form = FileAdminForm
     list_display = [
         "name",
         "display_custom_subcategory",
@@ -248,16 +331,39 @@ class FileAdmin(BaseAppModelAdmin):
                     "name",
                     "subcategory",
                     "uploaded_file",
+                    "uploaded_file_token",
                     "file_type",
                     "file_language",
                 )
             },
         ),
+        (
+            _("File metadata"),
+            {
+                "fields": (
+                    "file_size",
+                    "mime_type",
+                    "page_count",
+                    "checksum",
+                    "thumbnail",
+                    "preview",
+                )
+            },
+        ),
         (
             _("Detail information"),
             {"fields": ("created_by", "date_created", "modified_by", "last_modified")},
         ),
     )
+    readonly_fields = [
+        *BaseAppModelAdmin.readonly_fields,
+        "file_size",
+        "mime_type",
+        "page_count",
+        "checksum",
+        "thumbnail",
+        "preview",
+    ]
 
     def get_fieldsets(self, request, obj):
         add_fieldsets = (
@@ -270,6 +376,7 @@ class FileAdmin(BaseAppModelAdmin):
                         "file_type",
                         "file_language",
                         "uploaded_file",
+                        "uploaded_file_token",
                     )
                 },
             ),
@@ -295,6 +402,57 @@ class FileAdmin(BaseAppModelAdmin):
         form.base_fields["uploaded_file"].label = _("File")
         return form
 
+    def get_urls(self):
+        return [
+            path(
+                "direct-upload/",
+                self.admin_site.admin_view(self.direct_upload_view),
+                name="app_studyhub_file_direct_upload",
+            ),
+            *super().get_urls(),
+        ]
+
+    def direct_upload_view(self, request):
+        """
+        Return a presigned POST (URL and form fields) with which the browser
+        uploads the file straight to the storage, and the signed key of the
+        uploaded object to send with the File form.
+        """
+        if request.method != "POST":
+            return HttpResponseNotAllowed(["POST"])
+        if not supports_direct_upload():
+            raise Http404
+        if not (
+            self.has_add_permission(request) or self.has_change_permission(request)
+        ):
+            raise PermissionDenied
+
+        form = DirectUploadForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        data = form.cleaned_data
+        key = get_direct_upload_key(
+            data["name"], data["subcategory"], data["file_type"], data["filename"]
+        )
+        content_type = (
+            data["content_type"]
+            or mimetypes.guess_type(data["filename"])[0]
+            or "application/octet-stream"
+        )
+        presigned_post = create_direct_upload(key, content_type)
+        return JsonResponse(
+            {
+                "url": presigned_post["url"],
+                "fields": presigned_post["fields"],
+                "token": sign_direct_upload(
+                    key, data["name"], data["subcategory"].pk, data["file_type"]
+                ),
+            }
+        )
+
+    class Media:
+        js = ["js/admin-direct-upload.js"]
+
     @admin.display(description=_("Subject"))
     def display_custom_subcategory(self, obj):
         return obj.subcategory.name
@@ -302,10 +460,18 @@ class FileAdmin(BaseAppModelAdmin):
     @admin.display(description=_("File"))
     def display_custom_uploaded_file(self, obj):
         if obj.uploaded_file:
+            details = [obj.mime_type]
+            if obj.file_size is not None:
+                details.append(filesizeformat(obj.file_size))
+            if obj.page_count is not None:
+                details.append(
+                    ngettext("%d page", "%d pages", obj.page_count) % obj.page_count
+                )
             return format_html(
-                "<a target=_blank href={}>{}</a>",
+                "<a target=_blank href={}>{}</a><br><small>{}</small>",
                 obj.uploaded_file.url,
                 obj.uploaded_file.name,
+                ", ".join(detail for detail in details if detail),
             )
         return obj.uploaded_file
 
@@ -328,3 +494,20 @@ class FileAdmin(BaseAppModelAdmin):
         if obj.last_modified:
             return obj.last_modified.strftime("%d/%m/%Y, %I:%M %p")
         return obj.last_modified
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """Admin display of the queue of background tasks (Task model)."""
+
+    list_display = [
+        "name",
+        "arguments",
+        "status",
+        "attempts",
+        "run_after",
+        "finished_at",
+    ]
+    list_filter = ["status", "name"]
+    ordering = ["-date_created"]
+    readonly_fields = ["started_at", "finished_at", "error", "date_created"]
@@ -0,0 +1,139 @@
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
+
+# Number of members fetched from the storage at the same time
+ARCHIVE_MAX_WORKERS = 4
+# Size of the chunks read from the storage
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+# Number of chunks of one member waiting to be written to the archive,
+# memory usage stays under ARCHIVE_MAX_WORKERS * ARCHIVE_QUEUE_SIZE chunks
+ARCHIVE_QUEUE_SIZE = 16
+
+
+class ZipBuffer:
+    """
+    Unseekable file-like object for zipfile.ZipFile, it keeps what is
+    written until it is drained (zipfile then uses data descriptors
+    instead of seeking back to the local headers).
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ArchiveMember:
+    """One file of the archive: its name in the storage and in the archive."""
+
+    def __init__(self, storage_name, archive_name, date_time):
+        self.storage_name = storage_name
+        self.archive_name = archive_name
+        self.date_time = date_time
+        self.chunks = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+
+
+# marks the end of the chunks of a member
+END_OF_MEMBER = object()
+
+
+def fetch_member(storage, member, stopped):
+    """Read the member from the storage chunk by chunk (in a worker thread)."""
+
+    def put(item):
+        # give up when the response is closed (e.g. the download is cancelled)
+        while not stopped.is_set():
+            try:
+                member.chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        with storage.open(member.storage_name, "rb") as storage_file:
+            for chunk in storage_file.chunks(ARCHIVE_CHUNK_SIZE):
+                if not put(chunk):
+                    return
+    except Exception as e:
+        put(e)
+    else:
+        put(END_OF_MEMBER)
+
+
+def stream_zip(members, storage=None, max_workers=ARCHIVE_MAX_WORKERS):
+    """
+    Yield a ZIP archive of the members (ArchiveMember objects) as it is built.
+
+    The members are fetched from the storage by a bounded thread pool, a few
+    members ahead of the one being written, so only a bounded number of chunks
+    is in memory at any time and the archive itself is never buffered.
+    Members are stored without compression (documents are already compressed).
+    """
+
+    storage = storage or default_storage
+    members = iter(members)
+    stopped = threading.Event()
+    pending = []
+
+    def prefetch():
+        while len(pending) < max_workers:
+            member = next(members, None)
+            if member is None:
+                return
+            executor.submit(fetch_member, storage, member, stopped)
+            pending.append(member)
+
+    buffer = ZipBuffer()
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="studyhub-zip"
+    )
+    try:
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            prefetch()
+            while pending:
+                member = pending.pop(0)
+                zip_info = zipfile.ZipInfo(member.archive_name, member.date_time)
+                with zf.open(zip_info, mode="w", force_zip64=True) as zip_member:
+                    while (chunk := member.chunks.get()) is not END_OF_MEMBER:
+                        if isinstance(chunk, Exception):
+                            raise chunk
+                        zip_member.write(chunk)
+                        yield buffer.drain()
+                prefetch()
+        # central directory
+        yield buffer.drain()
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def astream_zip(members, storage=None, max_workers=ARCHIVE_MAX_WORKERS):
+    """
+    Asynchronous version of stream_zip() for the ASGI server, which reads a
+    synchronous iterator whole in memory. The chunks are built one at a time
+    in a thread (outside of the thread of the synchronous views, as they
+    wait for the storage).
+    """
+    chunks = stream_zip(members, storage, max_workers)
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=False)()
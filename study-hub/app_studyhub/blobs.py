@@ -0,0 +1,40 @@
+import hashlib
+from pathlib import Path
+
+# Number of contents hashed or uploaded to the storage at the same time
+BLOB_MAX_WORKERS = 8
+# Size of the chunks read to hash a content
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_upload_to(sha256, filename) -> str:
+    """Generate the (content-addressed) path of a stored file from its SHA-256."""
+    file_extension = Path(filename).suffix.lower()
+    return f"blobs/{sha256[:2]}/{sha256}{file_extension}"
+
+
+def hash_content(content):
+    """Return the SHA-256 (hex) and the size of a file-like object, read in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := content.read(BLOB_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class BlobSource:
+    """
+    Content to store as a blob (see Blob.objects.store): its file name and how
+    to open it, then its hash, its metadata and its Blob object or its error.
+    The hash and size may be given when they are already known.
+    """
+
+    def __init__(self, filename, open_content, sha256=None, size=None):
+        self.filename = filename
+        self.open_content = open_content
+        self.sha256 = sha256
+        self.size = size
+        self.metadata = None
+        self.blob = None
+        self.error = None
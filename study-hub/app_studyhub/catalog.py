@@ -0,0 +1,184 @@
+import threading
+import uuid
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Count
+
+from .metrics import CATALOG_TREE_BUILDS
+from .models import (
+    CATALOG_TREE_VERSION_KEY,
+    Category,
+    Subcategory,
+    new_catalog_tree_version,
+)
+from .routers import use_primary
+
+
+@dataclass(frozen=True, slots=True)
+class SubcategoryNode:
+    """Subcategory (subject) of the catalog tree."""
+
+    id: uuid.UUID
+    name: str
+    slug: str
+    url: str
+    file_count: int
+    category_id: uuid.UUID
+    category_name: str
+    category_slug: str
+    category_url: str
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryNode:
+    """Category of the catalog tree with its subcategories."""
+
+    id: uuid.UUID
+    name: str
+    slug: str
+    url: str
+    cover_image_url: str
+    # WebP variants of the cover image (see images.py), for the srcset tag
+    cover_image_variants: dict
+    file_count: int
+    subcategories: tuple[SubcategoryNode, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogTree:
+    """
+    Immutable category -> subcategory hierarchy of the catalog, with its URLs
+    and file counts, indexed by slug. Each process keeps one in memory (see
+    get_catalog_tree) so the pages of the catalog are built without queries.
+    """
+
+    version: str
+    categories: tuple[CategoryNode, ...]
+    categories_by_slug: MappingProxyType
+    subcategories_by_slug: MappingProxyType
+
+    @classmethod
+    def build(cls, version):
+        """
+        Load the whole tree from the database (two queries), without the
+        inactive categories and subcategories (hidden from the users).
+        """
+        subcategories_of = {}
+        subcategories = (
+            Subcategory.objects.filter(is_active=True, category__is_active=True)
+            .select_related("category")
+            .only(
+                "name",
+                "slug_name",
+                "category__name",
+                "category__slug_name",
+            )
+            .annotate(file_count=Count("files"))
+        )
+        for subcategory in subcategories:
+            category = subcategory.category
+            subcategories_of.setdefault(category.pk, []).append(
+                SubcategoryNode(
+                    id=subcategory.pk,
+                    name=subcategory.name,
+                    slug=subcategory.slug_name,
+                    url=subcategory.get_absolute_url(),
+                    file_count=subcategory.file_count,
+                    category_id=category.pk,
+                    category_name=category.name,
+                    category_slug=category.slug_name,
+                    category_url=category.get_absolute_url(),
+                )
+            )
+
+        categories = []
+        for category in Category.objects.filter(is_active=True).only(
+            "name", "slug_name", "cover_image", "cover_image_variants"
+        ):
+            category_subcategories = tuple(subcategories_of.get(category.pk, ()))
+            categories.append(
+                CategoryNode(
+                    id=category.pk,
+                    name=category.name,
+                    slug=category.slug_name,
+                    url=category.get_absolute_url(),
+                    cover_image_url=(
+                        category.cover_image.url if category.cover_image else ""
+                    ),
+                    cover_image_variants=category.cover_image_variants,
+                    file_count=sum(each.file_count for each in category_subcategories),
+                    subcategories=category_subcategories,
+                )
+            )
+
+        return cls(
+            version=version,
+            categories=tuple(categories),
+            categories_by_slug=MappingProxyType(
+                {category.slug: category for category in categories}
+            ),
+            subcategories_by_slug=MappingProxyType(
+                {
+                    subcategory.slug: subcategory
+                    for category in categories
+                    for subcategory in category.subcategories
+                }
+            ),
+        )
+
+    def get_category(self, slug):
+        """Return the category node with the given slug or None."""
+        return self.categories_by_slug.get(slug)
+
+    def get_subcategory(self, category_slug, subcategory_slug):
+        """
+        Return the subcategory node with the given slug or None,
+        also when it does not belong to the category with the given slug.
+        """
+        subcategory = self.subcategories_by_slug.get(subcategory_slug)
+        if subcategory is None or subcategory.category_slug != category_slug:
+            return None
+        return subcategory
+
+
+# catalog tree of this process, it is replaced as a whole (never modified)
+_catalog_tree = None
+_catalog_tree_lock = threading.Lock()
+
+
+def get_catalog_tree():
+    """
+    Return the catalog tree of this process, it is rebuilt when its version
+    (stored in the default cache, see models.invalidate_catalog_tree) changes.
+    """
+
+    global _catalog_tree
+
+    version = cache.get_or_set(CATALOG_TREE_VERSION_KEY, new_catalog_tree_version, None)
+    catalog_tree = _catalog_tree
+    if catalog_tree is not None and catalog_tree.version == version:
+        return catalog_tree
+
+    with _catalog_tree_lock:
+        # another thread may have rebuilt it in the meantime
+        if _catalog_tree is None or _catalog_tree.version != version:
+            # a lagging replica would build a stale tree with the new version
+            with use_primary():
+                _catalog_tree = CatalogTree.build(version)
+                CATALOG_TREE_BUILDS.inc()
+        return _catalog_tree
+
+
+async def aget_catalog_tree():
+    """Asynchronous version of get_catalog_tree() for the async views."""
+    version = await cache.aget_or_set(
+        CATALOG_TREE_VERSION_KEY, new_catalog_tree_version, None
+    )
+    catalog_tree = _catalog_tree
+    if catalog_tree is not None and catalog_tree.version == version:
+        return catalog_tree
+    # rebuilt by the (synchronous) queries of get_catalog_tree
+    return await sync_to_async(get_catalog_tree)()
@@ -1,21 +1,15 @@
-from .models import Category
+from .catalog import get_catalog_tree
 
 
 def category_list(request):
-    """Context processor to provide the list of categories to templates."""
+    """
+    Context processor to provide the category menu to templates,
+    it comes from the catalog tree kept in memory (see catalog.py).
+    """
 
     try:
-        # Check if Category model exists and has objects
-        if hasattr(Category, "objects"):
-            category_list = Category.objects.all()
-            # Check if queryset is empty
-            if category_list.exists():
-                return {"category_list": category_list}
-            else:
-                return {"category_list": []}
-        else:
-            return {"category_list": []}
-    except (Exception, ImportError) as e:
+        return {"category_menu": get_catalog_tree().categories}
+    except Exception as e:
         # Print to console the error message
-        print(f"--- [ERROR] --- CATEGORY LIST: {e}")
-        return {"category_list": []}
+        print(f"--- [ERROR] --- CATEGORY MENU: {e}")
+        return {"category_menu": ()}
@@ -0,0 +1,292 @@
+import hashlib
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+from django.utils.translation import get_language
+
+from .models import CatalogVersion
+from .search import search_files
+from .streaming import aiter_rows, astream_json, iter_rows, stream_json
+
+
+class DataTablesMixin:
+    """
+    Mixin implementing the DataTables.net server-side processing protocol
+    over the file catalog (FileCatalogEntry model).
+
+    Paging, ordering and searching are translated into LIMIT/OFFSET,
+    ORDER BY and WHERE clauses so only the requested page leaves the database.
+    See https://datatables.net/manual/server-side
+
+    Responses carry an ETag and Last-Modified built from the catalog version
+    stamp (CatalogVersion model), so unchanged pages are answered with
+    "304 Not Modified" without querying the catalog.
+    """
+
+    # column name (as sent by DataTables) -> model field lookup
+    datatables_columns = {
+        "name": "name",
+        "category": "category_name",
+        "subcategory": "subcategory_name",
+        "file_type": "file_type",
+        "file_language": "file_language",
+        "last_modified": "updated_at",
+    }
+    datatables_default_ordering = ["-updated_at", "name"]
+    datatables_default_length = 10
+    datatables_max_length = 100
+
+    def get_datatables_queryset(self):
+        """Return the base queryset (before filtering) of this table."""
+        raise NotImplementedError
+
+    def get_datatables_row(self, entry):
+        """Serialize one FileCatalogEntry object into one row of the table."""
+        return {
+            "id": str(entry.file_id),
+            "name": entry.name,
+            "category": entry.category_name,
+            "subcategory": entry.subcategory_name,
+            "file_type": entry.get_file_type_display(),
+            "file_language": entry.get_file_language_display(),
+            "uploaded_file": entry.uploaded_file_url,
+            "file_size": entry.file_size,
+            "mime_type": entry.mime_type,
+            "page_count": entry.page_count,
+            "checksum": entry.checksum,
+            "thumbnail_url": entry.thumbnail_url,
+            "preview_url": entry.preview_url,
+            "last_modified": entry.last_modified,
+        }
+
+    def get_datatables_columns(self, params):
+        """
+        Return list of (name, search value, searchable, orderable)
+        of the columns sent by DataTables.
+        """
+        columns = []
+        index = 0
+        while f"columns[{index}][data]" in params:
+            columns.append(
+                (
+                    params.get(f"columns[{index}][name]", ""),
+                    params.get(f"columns[{index}][search][value]", "").strip(),
+                    params.get(f"columns[{index}][searchable]") != "false",
+                    params.get(f"columns[{index}][orderable]") != "false",
+                )
+            )
+            index += 1
+        return columns
+
+    def filter_datatables_queryset(self, queryset, params, columns):
+        """Apply the global search and the per-column searches as WHERE clauses."""
+        global_search = params.get("search[value]", "").strip()
+        if global_search:
+            global_condition = Q()
+            for name, _, searchable, _ in columns:
+                if searchable and name in self.datatables_columns:
+                    lookup = self.datatables_columns[name]
+                    global_condition |= Q(**{f"{lookup}__icontains": global_search})
+            queryset = queryset.filter(global_condition)
+
+        for name, search_value, searchable, _ in columns:
+            if search_value and searchable and name in self.datatables_columns:
+                queryset = self.filter_datatables_column(queryset, name, search_value)
+        return queryset
+
+    def filter_datatables_column(self, queryset, name, search_value):
+        """Apply the search of one column, the name column uses the search index."""
+        if name == "name":
+            return search_files(queryset, search_value, field_prefix="file__")
+        lookup = self.datatables_columns[name]
+        return queryset.filter(**{f"{lookup}__icontains": search_value})
+
+    def order_datatables_queryset(self, queryset, params, columns):
+        """Apply the requested ordering as ORDER BY clause."""
+        ordering = []
+        index = 0
+        while f"order[{index}][column]" in params:
+            try:
+                name, _, _, orderable = columns[int(params[f"order[{index}][column]"])]
+            except (ValueError, IndexError):
+                name, orderable = "", False
+            if orderable and name in self.datatables_columns:
+                lookup = self.datatables_columns[name]
+                if params.get(f"order[{index}][dir]") == "desc":
+                    ordering.append(f"-{lookup}")
+                else:
+                    ordering.append(lookup)
+            index += 1
+        if not ordering:
+            if "search_rank" in queryset.query.annotations:
+                # the most relevant search results first
+                ordering = ["-search_rank", *self.datatables_default_ordering]
+            else:
+                ordering = list(self.datatables_default_ordering)
+        # always finish with a unique column to keep paging stable
+        return queryset.order_by(*ordering, "pk")
+
+    def get_datatables_page_bounds(self, params):
+        """Return the (start, length) of the requested page."""
+        try:
+            start = max(int(params.get("start", 0)), 0)
+        except ValueError:
+            start = 0
+        try:
+            length = int(params.get("length", self.datatables_default_length))
+        except ValueError:
+            length = self.datatables_default_length
+        if length < 0 or length > self.datatables_max_length:
+            # "-1" means "all rows" for DataTables, but never send the whole catalog
+            length = self.datatables_max_length
+        return start, length
+
+    def get_datatables_full_data(self, request):
+        """
+        Stream all rows of the table as {"data": [...]}, for clients which
+        do not use the server-side processing. Memory usage stays constant
+        whatever the number of rows.
+        """
+
+        queryset = self.get_datatables_queryset().order_by(
+            *self.datatables_default_ordering, "pk"
+        )
+        return StreamingHttpResponse(
+            stream_json(iter_rows(queryset, self.get_datatables_row)),
+            content_type="application/json",
+        )
+
+    def get_datatables_stamp(self):
+        """Return (version, last_modified) of the listed files or None."""
+        return CatalogVersion.objects.get_stamp()
+
+    async def aget_datatables_stamp(self):
+        """Asynchronous version of get_datatables_stamp()."""
+        return await CatalogVersion.objects.aget_stamp()
+
+    def get_datatables_etag(self, request, version, last_modified):
+        """
+        Return the ETag of the response, it depends on the catalog version
+        and on everything else the response is made of (parameters, language).
+        """
+        representation = (
+            f"{get_language()}?{urlencode(sorted(request.GET.lists()), doseq=True)}"
+        )
+        digest = hashlib.sha256(representation.encode()).hexdigest()[:32]
+        return quote_etag(f"{version}.{int(last_modified.timestamp())}.{digest}")
+
+    def get_datatables_validators(self, request, stamp):
+        """Return the (ETag, Last-Modified timestamp) of a version stamp or None."""
+        if stamp is None:
+            return None
+        version, last_modified = stamp
+        etag = self.get_datatables_etag(request, version, last_modified)
+        return etag, timegm(last_modified.utctimetuple())
+
+    def get_not_modified_response(self, request, validators):
+        """Return the "304 Not Modified" response if the client is up to date."""
+        if validators is None:
+            return None
+        etag, timestamp = validators
+        return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def patch_datatables_response(self, response, validators):
+        if validators is None:
+            return response
+        etag, timestamp = validators
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(timestamp)
+        # the browser may keep the response, but must revalidate it each time
+        response.headers["Cache-Control"] = "no-cache"
+        # the same URL also serves the HTML page
+        patch_vary_headers(response, ["X-Requested-With"])
+        return response
+
+    def get_datatables_data(self, request):
+        """
+        Handle DataTables.net Ajax requests.
+        """
+
+        validators = self.get_datatables_validators(
+            request, self.get_datatables_stamp()
+        )
+        response = self.get_not_modified_response(request, validators)
+        if response is None:
+            response = self.get_datatables_response(request)
+        return self.patch_datatables_response(response, validators)
+
+    async def aget_datatables_data(self, request):
+        """Asynchronous version of get_datatables_data() for the async views."""
+        validators = self.get_datatables_validators(
+            request, await self.aget_datatables_stamp()
+        )
+        response = self.get_not_modified_response(request, validators)
+        if response is None:
+            response = await self.aget_datatables_response(request)
+        return self.patch_datatables_response(response, validators)
+
+    def get_datatables_response(self, request):
+        params = request.GET
+        if "start" not in params:
+            return self.get_datatables_full_data(request)
+
+        queryset = self.get_datatables_queryset()
+        records_total = queryset.count()
+
+        columns = self.get_datatables_columns(params)
+        filtered_queryset = self.filter_datatables_queryset(queryset, params, columns)
+        if filtered_queryset is queryset:
+            records_filtered = records_total
+        else:
+            records_filtered = filtered_queryset.count()
+
+        ordered_queryset = self.order_datatables_queryset(
+            filtered_queryset, params, columns
+        )
+        start, length = self.get_datatables_page_bounds(params)
+        page = ordered_queryset[start : start + length]
+
+        data = {
+            "recordsTotal": records_total,
+            "recordsFiltered": records_filtered,
+            "data": [self.get_datatables_row(each) for each in page],
+        }
+        if "draw" in params:
+            # the client does not send it when the response may come from its cache
+            try:
+                data["draw"] = int(params["draw"])
+            except ValueError:
+                data["draw"] = 0
+        return JsonResponse(data)
+
+    async def aget_datatables_response(self, request):
+        """
+        Asynchronous version of get_datatables_response(). A page is built
+        in one thread: its few queries (counts, page, search checks) cost
+        one switch instead of one each with the async ORM.
+        """
+        if "start" not in request.GET:
+            if isinstance(request, ASGIRequest):
+                return await self.aget_datatables_full_data(request)
+            # the WSGI server reads a synchronous iterator without the
+            # event loop, an asynchronous one would be read whole in memory
+            return self.get_datatables_full_data(request)
+        return await sync_to_async(self.get_datatables_response)(request)
+
+    async def aget_datatables_full_data(self, request):
+        """
+        Version of get_datatables_full_data() streamed by an asynchronous
+        iterator: a synchronous one is read whole in memory under ASGI.
+        """
+        queryset = self.get_datatables_queryset().order_by(
+            *self.datatables_default_ordering, "pk"
+        )
+        return StreamingHttpResponse(
+            astream_json(aiter_rows(queryset, self.get_datatables_row)),
+            content_type="application/json",
+        )
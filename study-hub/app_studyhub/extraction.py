@@ -0,0 +1,172 @@
+import hashlib
+import re
+import subprocess
+import tempfile
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+from django.conf import settings
+
+from .blobs import BLOB_CHUNK_SIZE
+from .metadata import ZIP_MIME_TYPES, detect_mime_type, open_stored_file
+from .models import CatalogVersion, DocumentText, File, FileCatalogEntry
+
+# Largest number of characters of text kept (and indexed) for a document
+DOCUMENT_TEXT_MAX_CHARS = 1_000_000
+# Seconds after which the extraction of the text of a PDF is given up
+PDF_EXTRACTOR_TIMEOUT = 300
+
+WORD_NAMESPACE = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+DRAWING_NAMESPACE = "http://schemas.openxmlformats.org/drawingml/2006/main"
+SLIDE_NAME_PATTERN = re.compile(r"ppt/slides/slide(\d+)\.xml")
+# control characters other than whitespace (NUL cannot be stored by PostgreSQL)
+CONTROL_CHARACTERS_PATTERN = re.compile(r"[\x00-\x08\x0b\x0e-\x1f\x7f]")
+
+EXTRACTABLE_MIME_TYPES = {
+    "application/pdf",
+    ZIP_MIME_TYPES[".docx"],
+    ZIP_MIME_TYPES[".pptx"],
+}
+
+
+def extract_pdf_text(path):
+    """Return the text of a PDF with the local extractor (Poppler)."""
+    result = subprocess.run(
+        [settings.PDF_TEXT_EXTRACTOR, "-enc", "UTF-8", "-q", str(path), "-"],
+        check=True,
+        capture_output=True,
+        timeout=PDF_EXTRACTOR_TIMEOUT,
+    )
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def iter_xml_paragraphs(member, namespace):
+    """
+    Yield the text of the paragraphs of an Office Open XML part, parsed
+    incrementally (the paragraphs already read are freed).
+    """
+    text_tag = f"{{{namespace}}}t"
+    tab_tag = f"{{{namespace}}}tab"
+    paragraph_tag = f"{{{namespace}}}p"
+    parts = []
+    for _event, element in ElementTree.iterparse(member):
+        if element.tag == text_tag:
+            parts.append(element.text or "")
+        elif element.tag == tab_tag:
+            parts.append("\t")
+        elif element.tag == paragraph_tag:
+            if parts:
+                yield "".join(parts)
+                parts = []
+            element.clear()
+
+
+def iter_office_paragraphs(path, mime_type):
+    """Yield the paragraphs of a DOCX document or of the slides of a PPTX one."""
+    with zipfile.ZipFile(path) as zf:
+        if mime_type == ZIP_MIME_TYPES[".docx"]:
+            with zf.open("word/document.xml") as member:
+                yield from iter_xml_paragraphs(member, WORD_NAMESPACE)
+            return
+
+        slides = sorted(
+            (int(match.group(1)), name)
+            for name in zf.namelist()
+            if (match := SLIDE_NAME_PATTERN.fullmatch(name))
+        )
+        for _number, name in slides:
+            with zf.open(name) as member:
+                yield from iter_xml_paragraphs(member, DRAWING_NAMESPACE)
+
+
+def extract_text(path, mime_type):
+    """
+    Return the plain text of a PDF, DOCX or PPTX document, cut to
+    DOCUMENT_TEXT_MAX_CHARS characters, or None for other documents.
+    """
+    if mime_type == "application/pdf":
+        text = extract_pdf_text(path)[:DOCUMENT_TEXT_MAX_CHARS]
+    elif mime_type in EXTRACTABLE_MIME_TYPES:
+        paragraphs = []
+        length = 0
+        for paragraph in iter_office_paragraphs(path, mime_type):
+            paragraphs.append(paragraph)
+            length += len(paragraph) + 1
+            if length >= DOCUMENT_TEXT_MAX_CHARS:
+                break
+        text = "\n".join(paragraphs)[:DOCUMENT_TEXT_MAX_CHARS]
+    else:
+        return None
+    return CONTROL_CHARACTERS_PATTERN.sub("", text)
+
+
+def extract_stored_text(name, mime_type=""):
+    """
+    Return the SHA-256 (hex) of a stored file and its text (None when the type
+    of document is not supported). The content is read once, into a temporary
+    file, and hashed while it is copied.
+    Also run by the worker processes of "manage.py reindex_file_text".
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, f"original{Path(name).suffix.lower()}")
+        digest = hashlib.sha256()
+        with open_stored_file(name) as content, open(path, "wb") as f:
+            while chunk := content.read(BLOB_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+        if not mime_type:
+            with open(path, "rb") as f:
+                mime_type = detect_mime_type(f.read(16), name)
+        return digest.hexdigest(), extract_text(path, mime_type)
+
+
+def save_extracted_texts(results):
+    """
+    Store the texts extracted from the contents of File objects, given as
+    {file: (sha256, text)}, and set the checksums which were not known yet.
+    """
+    texts = {sha256: text for sha256, text in results.values() if text is not None}
+    DocumentText.objects.store(texts)
+    checksummed_ids = []
+    for file_obj, (sha256, _text) in results.items():
+        if file_obj.checksum:
+            continue
+        # the file may have been replaced meanwhile
+        if File.objects.filter(
+            pk=file_obj.pk, uploaded_file=file_obj.uploaded_file.name, checksum=""
+        ).update(checksum=sha256):
+            checksummed_ids.append(file_obj.pk)
+    if checksummed_ids:
+        FileCatalogEntry.objects.refresh(File.objects.filter(pk__in=checksummed_ids))
+    elif not texts:
+        return
+    # the results of the content searches changed
+    CatalogVersion.objects.bump(
+        CatalogVersion.GLOBAL, *{file_obj.subcategory_id for file_obj in results}
+    )
+
+
+def extract_file_text(file_id):
+    """
+    Extract and index the text of the content of a file (background task,
+    queued when the file is created or replaced). Contents are tracked by
+    their checksum: a content whose text is already indexed is never read again.
+    """
+    file_obj = (
+        File.objects.filter(pk=file_id)
+        .only("pk", "subcategory", "uploaded_file", "mime_type", "checksum")
+        .first()
+    )
+    if file_obj is None or not file_obj.uploaded_file:
+        return
+    if file_obj.mime_type and file_obj.mime_type not in EXTRACTABLE_MIME_TYPES:
+        return
+    if (
+        file_obj.checksum
+        and DocumentText.objects.filter(sha256=file_obj.checksum).exists()
+    ):
+        return
+
+    result = extract_stored_text(file_obj.uploaded_file.name, file_obj.mime_type)
+    save_extracted_texts({file_obj: result})
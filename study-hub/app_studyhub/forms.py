@@ -1,7 +1,33 @@
+import zipfile
+
 from app_account.models import Feedback
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import HTML, Div, Field, Layout
-from django.forms import ModelForm
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.forms import (
+    CharField,
+    ChoiceField,
+    FileField,
+    FileInput,
+    Form,
+    HiddenInput,
+    IntegerField,
+    ModelChoiceField,
+    ModelForm,
+)
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+
+from .imports import IMPORT_MAX_FILES, get_uploaded_items, get_zip_items
+from .metadata import inspect_content, open_stored_file
+from .models import File, Subcategory
+from .uploads import (
+    DIRECT_UPLOAD_MAX_SIZE,
+    supports_direct_upload,
+    unsign_direct_upload,
+)
 
 
 class FeedbackForm(ModelForm):
@@ -62,3 +88,157 @@ class FeedbackForm(ModelForm):
                 "invalid": "Địa chỉ Email không hợp lệ",
             },
         }
+
+
+class DirectUploadForm(Form):
+    """
+    Request (from the File admin form) of a presigned POST
+    to upload a file straight to the storage.
+    """
+
+    name = CharField(max_length=255)
+    subcategory = ModelChoiceField(queryset=Subcategory.objects.all())
+    file_type = ChoiceField(choices=File.FileType.choices)
+    filename = CharField(max_length=255)
+    content_type = CharField(max_length=255, required=False)
+    size = IntegerField(min_value=1, max_value=DIRECT_UPLOAD_MAX_SIZE)
+
+
+class FileAdminForm(ModelForm):
+    """
+    Admin form of File model, the file is either sent with the form or uploaded
+    straight to the storage by the browser beforehand (then only the signed
+    key of the uploaded object is sent, see admin-direct-upload.js).
+    """
+
+    uploaded_file_token = CharField(widget=HiddenInput, required=False)
+
+    class Meta:
+        model = File
+        fields = ["name", "subcategory", "uploaded_file", "file_type", "file_language"]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if "uploaded_file" in self.fields:
+            # required unless the file is uploaded straight to the storage
+            self.fields["uploaded_file"].required = False
+        if supports_direct_upload():
+            # the browser uploads the file straight to the storage
+            self.fields["uploaded_file_token"].widget.attrs[
+                "data-direct-upload-url"
+            ] = reverse("admin:app_studyhub_file_direct_upload")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        token = cleaned_data.get("uploaded_file_token")
+        if token:
+            try:
+                upload = unsign_direct_upload(token)
+            except signing.BadSignature:
+                raise ValidationError(
+                    _("The upload has expired, please choose the file again.")
+                )
+            subcategory = cleaned_data.get("subcategory")
+            if (
+                upload["name"] != cleaned_data.get("name")
+                or upload["subcategory"] != str(getattr(subcategory, "pk", ""))
+                or upload["file_type"] != cleaned_data.get("file_type")
+            ):
+                raise ValidationError(
+                    _(
+                        "The name, subject or type changed after the file was "
+                        "uploaded, please choose the file again."
+                    )
+                )
+            if not default_storage.exists(upload["key"]):
+                raise ValidationError(_("The uploaded file was not found."))
+            # the object is already in the storage, only its key is saved
+            cleaned_data["uploaded_file"] = upload["key"]
+            # the checksum is left to "manage.py backfill_file_metadata",
+            # it would take to download the whole object
+            with open_stored_file(upload["key"]) as content:
+                self.uploaded_file_metadata = inspect_content(content, upload["key"])
+        elif "uploaded_file" in self.fields and not cleaned_data.get("uploaded_file"):
+            self.add_error(
+                "uploaded_file", self.fields["uploaded_file"].error_messages["required"]
+            )
+        return cleaned_data
+
+    def save(self, commit=True):
+        if self.cleaned_data.get("uploaded_file_token"):
+            self.instance.set_metadata(self.uploaded_file_metadata)
+            if self.instance.blob_id:
+                # the object uploaded by the browser replaces the blob of the file
+                self.instance._replaced_blob_id = self.instance.blob_id
+                self.instance.blob = None
+        return super().save(commit)
+
+
+class MultipleFileInput(FileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(FileField):
+    """File field accepting several files (e.g. the files of a folder)."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("widget", MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(each, initial) for each in data]
+        return [single_file_clean(data, initial)] if data else []
+
+
+class FileImportForm(Form):
+    """Bulk import (admin) of the documents of a ZIP archive or of a folder."""
+
+    archive = FileField(
+        label=_("ZIP archive"),
+        required=False,
+        widget=FileInput(attrs={"accept": ".zip,application/zip"}),
+    )
+    folder = MultipleFileField(
+        label=_("Folder"),
+        required=False,
+        widget=MultipleFileInput(attrs={"webkitdirectory": True}),
+    )
+    file_type = ChoiceField(
+        label=_("Type"),
+        choices=[("", _("Inferred from the names"))] + File.FileType.choices,
+        required=False,
+        help_text=_(
+            "Used when the folder and file names do not tell the type "
+            '(e.g. "Đề thi", "Bài tập", "Giáo trình"). Default: lesson.'
+        ),
+    )
+    file_language = ChoiceField(
+        label=_("Language"),
+        choices=File.FileLanguage.choices,
+        initial=File.FileLanguage.VIETNAMESE,
+        help_text=_("Used when the folder and file names do not tell the language."),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        archive = cleaned_data.get("archive")
+        if archive:
+            if not zipfile.is_zipfile(archive):
+                raise ValidationError(_("The archive is not a ZIP file."))
+            items = get_zip_items(zipfile.ZipFile(archive))
+        elif cleaned_data.get("folder"):
+            items = get_uploaded_items(cleaned_data["folder"])
+        else:
+            raise ValidationError(_("Choose a ZIP archive or a folder."))
+
+        if not items:
+            raise ValidationError(_("There is no file to import."))
+        if len(items) > IMPORT_MAX_FILES:
+            raise ValidationError(
+                _("At most %(max_files)d files can be imported at once.")
+                % {"max_files": IMPORT_MAX_FILES}
+            )
+        cleaned_data["items"] = items
+        return cleaned_data
@@ -0,0 +1,105 @@
+import base64
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageFilter, ImageOps
+
+# Widths (pixels) of the variants of the cover images, from phones to 2x screens
+COVER_IMAGE_WIDTHS = (320, 640, 960, 1280)
+# Widths (pixels) of the variants of the avatars of the users
+AVATAR_WIDTHS = (64, 128, 256)
+VARIANT_QUALITY = 80
+# Width (pixels) of the blurred placeholder, inlined in the pages as data URI
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 40
+
+
+def variant_upload_to(name, width) -> str:
+    """Generate the path of a variant, next to its image (same prefix)."""
+    path = PurePosixPath(name)
+    return str(path.with_name(f"{path.stem}_{width}w.webp"))
+
+
+def encode_webp(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, "WEBP", quality=quality, method=6)
+    return buffer.getvalue()
+
+
+def render_image_variants(field_file, widths):
+    """
+    Store the WebP variants of the image of a FieldFile, one per width smaller
+    than the image (or the image width if it is smaller than all of them),
+    and return their description:
+    {"source": name, "width": ..., "height": ..., "variants": [[width, name], ...],
+    "placeholder": data URI of a tiny blurred copy}.
+    """
+    with field_file.open("rb"), Image.open(field_file) as image:
+        # photos of phones are stored sideways with an orientation tag
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    variant_widths = [width for width in widths if width < image.width]
+    if len(variant_widths) < len(widths):
+        variant_widths.append(image.width)
+    variants = []
+    for width in variant_widths:
+        variant = image.resize(
+            (width, max(1, round(image.height * width / image.width))),
+            Image.Resampling.LANCZOS,
+        )
+        name = field_file.storage.save(
+            variant_upload_to(field_file.name, width),
+            ContentFile(encode_webp(variant, VARIANT_QUALITY)),
+        )
+        variants.append([width, name])
+
+    placeholder = image.copy()
+    placeholder.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(1))
+    placeholder_data = base64.b64encode(encode_webp(placeholder, PLACEHOLDER_QUALITY))
+    return {
+        "source": field_file.name,
+        "width": image.width,
+        "height": image.height,
+        "variants": variants,
+        "placeholder": f"data:image/webp;base64,{placeholder_data.decode()}",
+    }
+
+
+def delete_image_variants(variants, storage, keep=()):
+    """Delete the stored variants described by a variants dictionary."""
+    for _width, name in (variants or {}).get("variants", []):
+        if name not in keep:
+            storage.delete(name)
+
+
+def update_image_variants(instance, field_name, widths):
+    """
+    Render the variants of the image field "field_name" of a saved instance
+    when its image changed, into its "<field_name>_variants" field (saved
+    with update(), without signals). The previous variants are deleted.
+    """
+    field_file = getattr(instance, field_name)
+    variants_field_name = f"{field_name}_variants"
+    previous_variants = getattr(instance, variants_field_name) or {}
+    if (field_file.name or "") == previous_variants.get("source", ""):
+        return
+
+    variants = {}
+    if field_file:
+        try:
+            variants = render_image_variants(field_file, widths)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # not an image (cover_image is a FileField): served as it is
+            variants = {"source": field_file.name}
+    type(instance)._default_manager.filter(pk=instance.pk).update(
+        **{variants_field_name: variants}
+    )
+    setattr(instance, variants_field_name, variants)
+    delete_image_variants(
+        previous_variants,
+        field_file.storage,
+        keep={name for _width, name in variants.get("variants", [])},
+    )
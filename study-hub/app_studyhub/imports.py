@@ -0,0 +1,224 @@
+import logging
+import re
+import unicodedata
+from pathlib import PurePosixPath
+
+from autoslug.utils import crop_slug
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .blobs import BlobSource
+from .models import (
+    Blob,
+    CatalogVersion,
+    File,
+    FileCatalogEntry,
+    Task,
+    invalidate_catalog_tree,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of files uploaded to the storage at the same time
+IMPORT_MAX_WORKERS = 8
+# Largest number of files of one import
+IMPORT_MAX_FILES = 1000
+# Number of rows inserted by one query
+IMPORT_BATCH_SIZE = 500
+
+# Words (without accents) of the folder or file names -> file type,
+# the first matching type wins, from the file name up to the top folder
+FILE_TYPE_KEYWORDS = [
+    (File.FileType.EXAM, ["exam", "de thi", "dethi", "kiem tra", "giua ky", "cuoi ky"]),
+    (File.FileType.EXERCISE, ["exercise", "bai tap", "baitap", "homework", "bt"]),
+    (File.FileType.PRACTICE, ["practice", "thuc hanh", "on tap", "lab"]),
+    (File.FileType.BOOK, ["book", "giao trinh", "sach", "textbook"]),
+    (File.FileType.LESSON, ["lesson", "bai giang", "lecture", "slide", "slides"]),
+]
+FILE_LANGUAGE_KEYWORDS = [
+    (File.FileLanguage.ENGLISH, ["en", "eng", "english", "tieng anh"]),
+    (File.FileLanguage.VIETNAMESE, ["vi", "vn", "vietnamese", "tieng viet"]),
+]
+
+
+def fold_words(text):
+    """Return the words of the text in lower case without accents, e.g. "đề thi"."""
+    text = unicodedata.normalize("NFKD", text.lower().replace("đ", "d"))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def infer_from_path(path, keywords, default):
+    """Return the value whose keywords appear in the path (see FILE_TYPE_KEYWORDS)."""
+    for part in reversed(PurePosixPath(path).parts):
+        words = f" {fold_words(part)} "
+        for value, value_keywords in keywords:
+            if any(f" {keyword} " in words for keyword in value_keywords):
+                return value
+    return default
+
+
+class ImportItem(BlobSource):
+    """One file of an import, and what became of it."""
+
+    def __init__(self, path, open_content, sha256=None, size=None):
+        super().__init__(path, open_content, sha256=sha256, size=size)
+        self.path = path
+        self.name = " ".join(PurePosixPath(path).stem.replace("_", " ").split())[:255]
+        self.file = None
+
+    @property
+    def is_imported(self):
+        return self.file is not None and self.error is None
+
+
+def get_zip_items(zip_file):
+    """Return an ImportItem for each document of the ZIP archive."""
+    items = []
+    for member in zip_file.infolist():
+        path = PurePosixPath(member.filename)
+        if member.is_dir() or any(
+            part.startswith((".", "__MACOSX")) for part in path.parts
+        ):
+            continue
+        items.append(
+            ImportItem(
+                member.filename,
+                lambda member=member: zip_file.open(member),
+            )
+        )
+    return items
+
+
+def get_uploaded_items(uploaded_files):
+    """Return an ImportItem for each uploaded file (files of a folder)."""
+    return [
+        ImportItem(
+            uploaded_file.name, lambda uploaded_file=uploaded_file: uploaded_file
+        )
+        for uploaded_file in uploaded_files
+        if not uploaded_file.name.startswith(".")
+    ]
+
+
+def get_slug_rounds(files):
+    """
+    Split the File objects in rounds without two files of the same slug:
+    AutoSlugField makes the slugs unique among the saved rows only.
+    """
+    slug_field = File._meta.get_field("slug_name")
+    rounds = []
+    for file_obj in files:
+        # the slug made by AutoSlugField.pre_save() before its uniqueness check
+        slug = slug_field.slugify(
+            crop_slug(slug_field, slug_field.slugify(file_obj.name) or "file")
+        )
+        for slugs, round_files in rounds:
+            if slug not in slugs:
+                break
+        else:
+            slugs, round_files = set(), []
+            rounds.append((slugs, round_files))
+        slugs.add(slug)
+        round_files.append(file_obj)
+    return [round_files for _, round_files in rounds]
+
+
+def insert_files(files):
+    """
+    Insert the File objects in batches. Their slugs are made on insert (one
+    query per file), the files of the same slug by different inserts.
+    """
+    for round_files in get_slug_rounds(files):
+        File.objects.bulk_create(round_files, batch_size=IMPORT_BATCH_SIZE)
+
+
+def import_files(
+    subcategory,
+    items,
+    user,
+    file_type=None,
+    file_language=File.FileLanguage.VIETNAMESE,
+    storage=None,
+    max_workers=IMPORT_MAX_WORKERS,
+):
+    """
+    Import the items (ImportItem objects) as files of the subcategory and
+    return them with their File object or their error.
+
+    The type and language of each file are inferred from its path, otherwise
+    the given ones are used. The contents are hashed in parallel and only the
+    ones not stored yet are uploaded (see Blob), then the rows are inserted
+    in batches.
+    """
+
+    storage = storage or default_storage
+    default_file_type = file_type or File.FileType.LESSON
+
+    existing_names = set(
+        File.objects.filter(name__in=[item.name for item in items]).values_list(
+            "name", flat=True
+        )
+    )
+    now = timezone.now()
+    new_items = []
+    for item in items:
+        if not item.name:
+            item.error = _("The file has no name.")
+        elif item.name in existing_names:
+            item.error = _("A file with this name already exists.")
+        else:
+            existing_names.add(item.name)
+            item.file = File(
+                name=item.name,
+                subcategory=subcategory,
+                file_type=infer_from_path(
+                    item.path, FILE_TYPE_KEYWORDS, default_file_type
+                ),
+                file_language=infer_from_path(
+                    item.path, FILE_LANGUAGE_KEYWORDS, file_language
+                ),
+                created_by=user,
+                date_created=now,
+            )
+            new_items.append(item)
+    if not new_items:
+        return items
+
+    Blob.objects.store(new_items, storage, max_workers=max_workers)
+    uploaded_items = []
+    for item in new_items:
+        if item.error is None:
+            item.file.blob = item.blob
+            item.file.set_metadata(item.metadata)
+            item.file.uploaded_file.name = item.blob.storage_name
+            uploaded_items.append(item)
+    if not uploaded_items:
+        return items
+    try:
+        with transaction.atomic():
+            insert_files([item.file for item in uploaded_items])
+            FileCatalogEntry.objects.refresh(
+                File.objects.filter(pk__in=[item.file.pk for item in uploaded_items])
+            )
+            CatalogVersion.objects.bump(CatalogVersion.GLOBAL, subcategory.pk)
+            invalidate_catalog_tree()
+            for task_name in ("render_file_previews", "extract_file_text"):
+                Task.objects.enqueue_many(
+                    task_name,
+                    [{"file_id": str(item.file.pk)} for item in uploaded_items],
+                )
+    except Exception as e:
+        # do not leave the uploaded blobs without files
+        for item in uploaded_items:
+            item.error = e
+        try:
+            Blob.objects.release({item.blob.pk for item in uploaded_items}, storage)
+        except Exception:
+            logger.exception(
+                "The blobs of %d imported files could not be released.",
+                len(uploaded_items),
+            )
+    return items
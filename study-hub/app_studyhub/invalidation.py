@@ -0,0 +1,123 @@
+import json
+import logging
+import threading
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+from .routers import create_direct_connection
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL channel (LISTEN/NOTIFY) of the invalidation events
+INVALIDATION_CHANNEL = "studyhub_invalidation"
+# Cache keys per event: a payload is limited to 8000 bytes by PostgreSQL
+EVENT_MAX_KEYS = 50
+# Seconds between two checks of the connection of the listener, the delay
+# before a lost connection is noticed (and the local cache dropped)
+HEALTH_CHECK_INTERVAL = 5.0
+# Seconds to wait before connecting again after an error
+RECONNECT_DELAY = 1.0
+
+
+def is_local_cache(cache=None) -> bool:
+    """Return whether the (default) cache is private to this process."""
+    cache = cache or caches[DEFAULT_CACHE_ALIAS]
+    return isinstance(cache, LocMemCache)
+
+
+def publish_versions(versions):
+    """
+    Give new versions ({cache key: version}) to version keys of the default
+    cache, in every process (see InvalidationListener) after the commit.
+    """
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    transaction.on_commit(lambda: cache.set_many(versions, None))
+    # sent in the transaction: PostgreSQL delivers it when (and only if) it
+    # is committed, even if this process stops right after the commit
+    items = list(versions.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), EVENT_MAX_KEYS):
+            payload = {"versions": dict(items[start : start + EVENT_MAX_KEYS])}
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [INVALIDATION_CHANNEL, json.dumps(payload)]
+            )
+
+
+def apply_event(payload):
+    """Set the versions of an invalidation event in the cache of this process."""
+    cache = caches[DEFAULT_CACHE_ALIAS]
+    # a shared cache got them from the process which published them
+    if is_local_cache(cache):
+        cache.set_many(json.loads(payload)["versions"], None)
+
+
+class InvalidationListener(threading.Thread):
+    """
+    Thread applying the invalidation events published by every process (web
+    workers of every container, task workers) to the local cache of this one,
+    as soon as PostgreSQL delivers them (after the commit), on its own
+    connection. When the connection is lost, the events may have been missed:
+    the local cache is cleared once connected again.
+    """
+
+    def __init__(self):
+        super().__init__(name="studyhub-invalidation-listener", daemon=True)
+        self.listening = threading.Event()
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.listen()
+            except Exception:
+                logger.exception("Invalidation listener disconnected.")
+                self.stopping.wait(RECONNECT_DELAY)
+
+    def stop(self):
+        self.stopping.set()
+
+    def listen(self):
+        # out of the pool: the connection is never given back
+        database = create_direct_connection()
+        try:
+            database.ensure_connection()
+            database.set_autocommit(True)
+            with database.cursor() as cursor:
+                cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+            if is_local_cache():
+                # events published before this point are lost
+                caches[DEFAULT_CACHE_ALIAS].clear()
+            self.listening.set()
+
+            while not self.stopping.is_set():
+                for notify in database.connection.notifies(
+                    timeout=HEALTH_CHECK_INTERVAL
+                ):
+                    apply_event(notify.payload)
+                # a dead connection is only noticed when it is used
+                with database.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+        finally:
+            self.listening.clear()
+            database.close()
+
+
+# listener of this process (see start_listener)
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_listener():
+    """
+    Start the invalidation listener of this process once, e.g. in each
+    Gunicorn worker (see config/gunicorn.py), and return it.
+    """
+    global _listener
+
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = InvalidationListener()
+            _listener.start()
+        return _listener
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app_studyhub.blobs import hash_content
+from app_studyhub.metadata import inspect_content, open_stored_file
+from app_studyhub.models import CatalogVersion, File, FileCatalogEntry
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+METADATA_FIELDS = ["file_size", "mime_type", "page_count", "checksum"]
+
+
+def inspect_stored_file(file_obj):
+    """Return the FileMetadata of the stored content of a file (in a worker thread)."""
+    name = file_obj.uploaded_file.name
+    with open_stored_file(name) as content:
+        # the hash of a blob is known, other contents are read once to hash them
+        sha256 = file_obj.blob_id or hash_content(content)[0]
+        return inspect_content(content, name, sha256)
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract the metadata (size, MIME type, page count, checksum) of the "
+        "files which have none yet, in batches of files inspected in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Inspect all the files again, not only the ones without metadata.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of files inspected at the same time (default: 8).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of files updated by one query (default: 200).",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        files = File.objects.only("pk", "subcategory", "uploaded_file", "blob")
+        if not options["all"]:
+            files = files.filter(mime_type="")
+        files = files.order_by("pk")
+
+        updated_count = failed_count = 0
+        last_pk = None
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                # keyset pagination: the failed files are not fetched again
+                batch = files if last_pk is None else files.filter(pk__gt=last_pk)
+                batch = list(batch[: options["batch_size"]])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                futures = [
+                    executor.submit(inspect_stored_file, file_obj) for file_obj in batch
+                ]
+                inspected_files = []
+                for file_obj, future in zip(batch, futures):
+                    try:
+                        file_obj.set_metadata(future.result())
+                    except Exception as e:
+                        failed_count += 1
+                        self.stderr.write(f"Failed {file_obj.uploaded_file.name}: {e}")
+                        continue
+                    inspected_files.append(file_obj)
+                if not inspected_files:
+                    continue
+
+                # bulk_update sends no signals: update the catalog as the receivers do
+                with transaction.atomic():
+                    File.objects.bulk_update(inspected_files, METADATA_FIELDS)
+                    FileCatalogEntry.objects.refresh(
+                        File.objects.filter(
+                            pk__in=[file_obj.pk for file_obj in inspected_files]
+                        )
+                    )
+                    CatalogVersion.objects.bump(
+                        CatalogVersion.GLOBAL,
+                        *{file_obj.subcategory_id for file_obj in inspected_files},
+                    )
+                updated_count += len(inspected_files)
+                self.stdout.write(f"{updated_count:,} files inspected...")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backfilled the metadata of {updated_count:,} files "
+                f"in {elapsed:.1f}s ({failed_count:,} failed)."
+            )
+        )
@@ -0,0 +1,135 @@
+import statistics
+import threading
+import time
+
+from app_studyhub.models import CatalogVersion
+from app_studyhub.routers import create_direct_connection
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+# connections to the database of the benchmark, except the one counting them
+CONNECTION_COUNT_SQL = """
+SELECT count(*) FROM pg_stat_activity
+WHERE datname = current_database() AND pid <> pg_backend_pid()
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the database latency of requests made by concurrent threads "
+        "and the number of connections they open, with the current connection "
+        "settings (persistent connections, or a pool with DJANGO_DATABASE_POOL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=16,
+            help="Number of concurrent threads making requests (default: 16).",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Number of requests made by each thread (default: 500).",
+        )
+        parser.add_argument(
+            "--work-ms",
+            type=float,
+            default=2.0,
+            help=(
+                "Milliseconds of work (e.g. rendering) of each request after "
+                "its query, holding its connection (default: 2)."
+            ),
+        )
+
+    def make_requests(self, count, work_seconds, timings, errors):
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                # like the request handler: the connections are checked, or
+                # taken from the pool, then closed, or given back to it
+                request_started.send(sender=self.__class__)
+                try:
+                    CatalogVersion.objects.get_stamp()
+                    time.sleep(work_seconds)
+                finally:
+                    request_finished.send(sender=self.__class__)
+                timings.append(time.perf_counter() - started - work_seconds)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    def count_connections(self, ready, stop, counts):
+        # its own connection, out of the pool
+        monitor = create_direct_connection()
+        try:
+            with monitor.cursor() as cursor:
+                while True:
+                    cursor.execute(CONNECTION_COUNT_SQL)
+                    counts.append(cursor.fetchone()[0])
+                    ready.set()
+                    if stop.wait(0.01):
+                        break
+        finally:
+            ready.set()
+            monitor.close()
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES["default"]
+        pool_options = database["OPTIONS"].get("pool")
+        if pool_options:
+            mode = (
+                f"pool (min {pool_options['min_size']}, max {pool_options['max_size']})"
+            )
+        else:
+            mode = (
+                f"persistent (CONN_MAX_AGE={database['CONN_MAX_AGE']}, "
+                f"health checks {'on' if database['CONN_HEALTH_CHECKS'] else 'off'})"
+            )
+
+        timings, errors, counts = [], [], []
+        ready, stop = threading.Event(), threading.Event()
+        counter = threading.Thread(
+            target=self.count_connections, args=(ready, stop, counts)
+        )
+        counter.start()
+        ready.wait()
+        threads = [
+            threading.Thread(
+                target=self.make_requests,
+                args=(options["requests"], options["work_ms"] / 1000, timings, errors),
+            )
+            for _ in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        counter.join()
+
+        timings.sort()
+        self.stdout.write(f"Mode: {mode}")
+        self.stdout.write(
+            f"{len(timings):,} requests by {options['threads']} threads "
+            f"in {elapsed:.1f}s ({len(timings) / elapsed:,.0f} requests/s), "
+            f"{len(errors)} failed"
+        )
+        if timings:
+            self.stdout.write(
+                f"Database time per request: mean {statistics.fmean(timings) * 1e3:.2f}ms, "
+                f"p50 {timings[len(timings) // 2] * 1e3:.2f}ms, "
+                f"p99 {timings[int(len(timings) * 0.99)] * 1e3:.2f}ms"
+            )
+        self.stdout.write(
+            f"Connections: {counts[0]} before, {max(counts)} at most during the run"
+        )
+        for error in errors[:5]:
+            self.stderr.write(f"Failed: {error!r}")
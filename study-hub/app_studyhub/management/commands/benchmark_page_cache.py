@@ -0,0 +1,102 @@
+import statistics
+import time
+
+from app_studyhub.catalog import get_catalog_tree
+from app_studyhub.pagecache import AnonymousPageCacheMiddleware
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+
+def not_cached(request):
+    raise CommandError(f"{request.path} is not served from the page cache.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of the hits of the anonymous page cache: the cache "
+        "middleware alone, then the whole middleware stack (no web server)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=5000,
+            help="Number of requests timed per page (default: 5000).",
+        )
+
+    def time_requests(self, factory, url, get_response, count, prepare=None):
+        timings = []
+        for _ in range(count):
+            request = factory.get(url)
+            if prepare is not None:
+                prepare(request)
+            started = time.perf_counter()
+            response = get_response(request)
+            timings.append(time.perf_counter() - started)
+        if response.headers.get("X-Page-Cache") != "hit":
+            raise CommandError(f"{url} is not served from the page cache.")
+        timings.sort()
+        return timings
+
+    def handle(self, *args, **options):
+        urls = [reverse("home-view"), reverse("category-list-view")]
+        for category in get_catalog_tree().categories:
+            urls.append(category.url)
+            if category.subcategories:
+                urls.append(category.subcategories[0].url)
+                break
+
+        handler = BaseHandler()
+        handler.load_middleware()
+        page_cache = AnonymousPageCacheMiddleware(not_cached)
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host[0] not in "*."),
+            "localhost",
+        )
+        factory = RequestFactory(headers={"Accept-Language": "vi", "Host": host})
+        count = options["requests"]
+
+        self.stdout.write(
+            f"{'page':<40} {'cache p50':>10} "
+            f"{'stack mean':>11} {'stack p50':>10} {'stack p99':>10} {'queries':>8}"
+        )
+        for url in urls:
+            # the first request renders the page and caches it, then the
+            # visitor sends back its CSRF cookie like a browser
+            response = handler.get_response(factory.get(url))
+            if settings.CSRF_COOKIE_NAME in response.cookies:
+                factory.cookies[settings.CSRF_COOKIE_NAME] = response.cookies[
+                    settings.CSRF_COOKIE_NAME
+                ].value
+
+            with CaptureQueriesContext(connection) as queries:
+                stack_timings = self.time_requests(
+                    factory, url, handler.get_response, count
+                )
+                # what the middlewares before it set up (language, CSRF secret)
+                translation.activate("vi")
+                csrf_cookie = factory.cookies.get(settings.CSRF_COOKIE_NAME)
+
+                def prepare(request):
+                    if csrf_cookie is not None:
+                        request.META["CSRF_COOKIE"] = csrf_cookie.value
+
+                cache_timings = self.time_requests(
+                    factory, url, page_cache, count, prepare=prepare
+                )
+
+            self.stdout.write(
+                f"{url:<40} "
+                f"{cache_timings[len(cache_timings) // 2] * 1e6:>8.0f}µs "
+                f"{statistics.fmean(stack_timings) * 1e6:>9.0f}µs "
+                f"{stack_timings[len(stack_timings) // 2] * 1e6:>8.0f}µs "
+                f"{stack_timings[int(len(stack_timings) * 0.99)] * 1e6:>8.0f}µs "
+                f"{len(queries):>8}"
+            )
@@ -0,0 +1,158 @@
+import time
+
+from app_studyhub.models import File
+from app_studyhub.search import search_files
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+SUBJECT_NAMES = [
+    "Toán cao cấp",
+    "Giải tích",
+    "Đại số tuyến tính",
+    "Vật lý đại cương",
+    "Hóa học",
+    "Lập trình hướng đối tượng",
+    "Mạng máy tính",
+    "Cơ sở dữ liệu",
+    "Hệ điều hành",
+    "Kiến trúc máy tính",
+]
+
+FILE_TYPES = ["Bài giảng", "Bài tập", "Đề thi", "Giáo trình", "Ôn tập", "Thực hành"]
+
+# file names are built from these syllables so that the seeded catalog is
+# as diverse as a real one (not the same few words repeated in every row)
+FILE_SYLLABLES = (
+    "an bảo biến cấu chất chuỗi cực dạng dãy điểm điện đồ động giới hàm hệ "
+    "hình khối không kỹ lệnh liệu luồng lưới mạch mảng máy mẫu năng nhiệt "
+    "phân phép quang sóng số tập thống thuật tích tín toán trường tử vector "
+    "vi xác xử"
+).split()
+
+# (description, search query) - accent folding and typo tolerance included
+BENCHMARK_QUERIES = [
+    ("exact", "Giải tích 42"),
+    ("without accents", "giai tich 42"),
+    ("file name", "quang phân xử"),
+    ("file name, without accents", "dong luong song"),
+    ("typo", "dong luongg song"),
+]
+
+SEED_SQL = """
+WITH benchmark_user AS (
+    SELECT id FROM account_user ORDER BY date_joined LIMIT 1
+),
+new_category AS (
+    INSERT INTO studyhub_category
+        (id, name, slug_name, is_active, date_created, created_by_id)
+    SELECT gen_random_uuid(), 'Benchmark', 'benchmark', true, now(), id
+    FROM benchmark_user
+    RETURNING id
+),
+new_subcategories AS (
+    INSERT INTO studyhub_subcategory
+        (id, name, slug_name, is_active, date_created, created_by_id, category_id)
+    SELECT gen_random_uuid(), subject_name || ' ' || n,
+           'benchmark-' || ordinality || '-' || n, true,
+           now(), benchmark_user.id, new_category.id
+    FROM benchmark_user, new_category,
+         unnest(%(subjects)s::text[]) WITH ORDINALITY AS subject_name,
+         generate_series(1, 100) AS n
+    RETURNING id
+)
+INSERT INTO studyhub_file
+    (id, name, slug_name, date_created, created_by_id, subcategory_id,
+     file_type, file_language, uploaded_file, mime_type, checksum,
+     previewed_file)
+SELECT gen_random_uuid(),
+       concat_ws(
+           ' ',
+           (%(types)s::text[])[1 + g %% cardinality(%(types)s::text[])],
+           (%(syllables)s::text[])[1 + (g / 7) %% cardinality(%(syllables)s::text[])],
+           (%(syllables)s::text[])[1 + (g / 331) %% cardinality(%(syllables)s::text[])],
+           (%(syllables)s::text[])[1 + (g / 10007) %% cardinality(%(syllables)s::text[])],
+           g
+       ),
+       'benchmark-file-' || g, now(), benchmark_user.id,
+       subcategories.ids[1 + g %% cardinality(subcategories.ids)],
+       'lesson', 'vi', 'files/benchmark/' || g || '.pdf', 'application/pdf', '',
+       ''
+FROM benchmark_user,
+     (SELECT array_agg(id) AS ids FROM new_subcategories) AS subcategories,
+     generate_series(1, %(rows)s) AS g
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a temporary catalog of files (rolled back afterwards) and "
+        "show the query plans and timings of the file search."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1_000_000,
+            help="Number of seeded files (default: 1,000,000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of runs of each search query (default: 5).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options["rows"])
+            for description, search_query in BENCHMARK_QUERIES:
+                self.benchmark(description, search_query, options["repeat"])
+            # never keep the seeded data
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        self.stdout.write(f"Seeding {rows:,} files...")
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM account_user")
+            if not cursor.fetchone()[0]:
+                self.stderr.write("At least one user account is required.")
+                raise SystemExit(1)
+            cursor.execute(
+                SEED_SQL,
+                {
+                    "subjects": SUBJECT_NAMES,
+                    "types": FILE_TYPES,
+                    "syllables": FILE_SYLLABLES,
+                    "rows": rows,
+                },
+            )
+            cursor.execute("ANALYZE studyhub_file")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Seeded in {elapsed:.1f}s.\n")
+
+    def benchmark(self, description, search_query, repeat):
+        queryset = search_files(File.objects.all(), search_query).order_by(
+            "-search_rank", "pk"
+        )[:10]
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        plan = queryset.explain(analyze=True, buffers=True)
+
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(f'"{search_query}" ({description})')
+        )
+        self.stdout.write(plan)
+        self.stdout.write(
+            f"best {min(timings):.2f} ms / worst {max(timings):.2f} ms "
+            f"over {repeat} runs"
+        )
+        if "Seq Scan on studyhub_file" in plan:
+            self.stdout.write(self.style.ERROR("Sequential scan of studyhub_file!\n"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Served by the search indexes.\n"))
@@ -0,0 +1,182 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from app_studyhub.models import Subcategory
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# Gunicorn worker classes compared: the synchronous one (WSGI) and Uvicorn
+# (ASGI), with the settings of their mode of entrypoint.production.sh
+WORKER_MODES = {
+    "sync": ("config.wsgi:application", "sync", {"DJANGO_ASGI": "False"}),
+    "asgi": (
+        "config.asgi:application",
+        "uvicorn_worker.UvicornWorker",
+        {"DJANGO_ASGI": "True"},
+    ),
+}
+# Seconds to wait for a server to answer after its start
+SERVER_START_TIMEOUT = 30.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throughput of one Gunicorn worker serving concurrent "
+        "requests of the read-only catalog views, with the synchronous worker "
+        "(WSGI) then the Uvicorn worker (ASGI, see entrypoint.production.sh)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Number of concurrent clients (default: 32).",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10.0,
+            help="Seconds of load per worker class (default: 10).",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=WORKER_MODES,
+            action="append",
+            help="Worker class to measure (default: all of them).",
+        )
+
+    def get_urls(self):
+        """Return the (URL, headers) of the requests, made in turn."""
+        subcategory = Subcategory.objects.order_by("pk").first()
+        if subcategory is None:
+            raise CommandError("No subcategory: seed the catalog first.")
+        xhr = {"X-Requested-With": "XMLHttpRequest"}
+        listing = "?columns[0][data]=name&start=0&length=10"
+        return [
+            (reverse("category-list-view"), {}),
+            (subcategory.get_absolute_url(), {}),
+            (subcategory.get_absolute_url() + listing, xhr),
+            (reverse("search-all-view") + listing, xhr),
+        ]
+
+    def start_server(self, mode, port):
+        application, worker_class, environment = WORKER_MODES[mode]
+        command = [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            application,
+            "--config",
+            "config/gunicorn.py",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            "1",
+            "--worker-class",
+            worker_class,
+            "--log-level",
+            "warning",
+        ]
+        server = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env={**os.environ, **environment}
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"The {mode} server exited ({server.returncode}).")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"The {mode} server did not start.")
+
+    def make_requests(self, port, host, urls, deadline, timings, errors):
+        client = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        index = 0
+        try:
+            while time.monotonic() < deadline:
+                url, headers = urls[index % len(urls)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    client.request("GET", url, headers={"Host": host, **headers})
+                    response = client.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    errors.append(e)
+                    client.close()
+                    continue
+                if response.status != 200:
+                    errors.append(f"{url}: {response.status}")
+                else:
+                    timings.append(time.perf_counter() - started)
+        finally:
+            client.close()
+
+    def measure(self, mode, urls, host, options):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = self.start_server(mode, port)
+        try:
+            # the first requests build the catalog tree and the cached pages
+            self.make_requests(port, host, urls, time.monotonic() + 1, [], [])
+            timings, errors = [], []
+            deadline = time.monotonic() + options["duration"]
+            threads = [
+                threading.Thread(
+                    target=self.make_requests,
+                    args=(port, host, urls, deadline, timings, errors),
+                )
+                for _ in range(options["concurrency"])
+            ]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+        return timings, errors, elapsed
+
+    def handle(self, *args, **options):
+        urls = self.get_urls()
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host[0] not in "*."),
+            "localhost",
+        )
+        self.stdout.write(
+            f"One worker, {options['concurrency']} concurrent clients, "
+            f"{options['duration']:.0f}s per worker class"
+        )
+        self.stdout.write(
+            f"{'worker':<8} {'requests/s':>11} {'mean':>9} {'p50':>9} "
+            f"{'p99':>9} {'failed':>7}"
+        )
+        for mode in options["mode"] or WORKER_MODES:
+            timings, errors, elapsed = self.measure(mode, urls, host, options)
+            timings.sort()
+            if not timings:
+                self.stdout.write(f"{mode:<8} {'-':>11} {len(errors):>7}")
+            else:
+                self.stdout.write(
+                    f"{mode:<8} {len(timings) / elapsed:>11,.0f} "
+                    f"{statistics.fmean(timings) * 1e3:>7.1f}ms "
+                    f"{timings[len(timings) // 2] * 1e3:>7.1f}ms "
+                    f"{timings[int(len(timings) * 0.99)] * 1e3:>7.1f}ms "
+                    f"{len(errors):>7}"
+                )
+            for error in errors[:5]:
+                self.stderr.write(f"Failed: {error!r}")
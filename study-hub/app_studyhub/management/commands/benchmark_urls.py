@@ -0,0 +1,367 @@
+import json
+import random
+import resource
+import threading
+import time
+from dataclasses import asdict, dataclass, field, replace
+
+from app_studyhub import urls as studyhub_urls
+from app_studyhub.models import Category, File, Subcategory
+from app_studyhub.querybudget import QueryRecorder, record_queries
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+
+# Files of the catalog downloaded as one archive (file-archive-view)
+ARCHIVE_FILE_COUNT = 10
+# Size of the placeholder contents of these files (the seeded ones have none)
+ARCHIVE_FILE_SIZE = 256 * 1024
+# Parameters of the first page of a DataTables listing, sorted by name
+LISTING_PARAMS = {
+    "draw": 1,
+    "columns[0][data]": "name",
+    "columns[0][name]": "name",
+    "order[0][column]": 0,
+    "order[0][dir]": "asc",
+    "start": 0,
+    "length": 10,
+}
+XHR_HEADERS = {"X-Requested-With": "XMLHttpRequest"}
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A request made repeatedly by the benchmark."""
+
+    label: str
+    url_name: str
+    path: str
+    method: str = "get"
+    data: dict = field(default_factory=dict)
+    headers: dict = field(default_factory=dict)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[
+        min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    ]
+
+
+def new_results():
+    return {"timings": [], "queries": [], "errors": []}
+
+
+def get_peak_rss_mb():
+    """Return the peak resident memory of this process, in MiB (Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every URL of the app (pages, DataTables XHR listings, "
+        "exports, archive) at a given concurrency, in this process, against a "
+        "new database seeded by seed_catalog. Report the latency percentiles, "
+        "the queries per request and the peak memory. Run it with the hermetic "
+        "settings profile: DJANGO_SETTINGS_MODULE=config.settings_benchmark."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Number of threads making requests (default: 8).",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests per scenario (default: 200).",
+        )
+        parser.add_argument(
+            "--url-name",
+            action="append",
+            help="Only benchmark the scenarios of this URL name (repeatable).",
+        )
+        parser.add_argument("--categories", type=int, default=10)
+        parser.add_argument("--subcategories", type=int, default=100)
+        parser.add_argument("--files", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database (and its catalog) for the next run.",
+        )
+        parser.add_argument(
+            "--json",
+            dest="json_path",
+            help="Also write the results to this JSON file (to compare runs).",
+        )
+
+    def get_scenarios(self):
+        category = Category.objects.order_by("name").first()
+        subcategory = (
+            Subcategory.objects.annotate(file_count=Count("files"))
+            .select_related("category")
+            .order_by("-file_count", "name")
+            .first()
+        )
+        file_ids = [
+            str(file_id)
+            for file_id in File.objects.order_by("name").values_list("pk", flat=True)[
+                :ARCHIVE_FILE_COUNT
+            ]
+        ]
+        search_path = reverse("search-all-view")
+        subcategory_path = subcategory.get_absolute_url()
+        name_search = {**LISTING_PARAMS, "columns[0][search][value]": subcategory.name}
+        return [
+            Scenario("home", "home-view", reverse("home-view")),
+            Scenario("about", "about-view", reverse("about-view")),
+            Scenario("contact", "contact-view", reverse("contact-view")),
+            Scenario(
+                "category list", "category-list-view", reverse("category-list-view")
+            ),
+            Scenario("category", "category-detail-view", category.get_absolute_url()),
+            Scenario("subject", "subcategory-detail-view", subcategory_path),
+            Scenario(
+                "subject XHR page",
+                "subcategory-detail-view",
+                subcategory_path,
+                data=LISTING_PARAMS,
+                headers=XHR_HEADERS,
+            ),
+            Scenario(
+                "subject XHR all rows",
+                "subcategory-detail-view",
+                subcategory_path,
+                headers=XHR_HEADERS,
+            ),
+            Scenario("search", "search-all-view", search_path),
+            Scenario(
+                "search XHR page",
+                "search-all-view",
+                search_path,
+                data=LISTING_PARAMS,
+                headers=XHR_HEADERS,
+            ),
+            Scenario(
+                "search XHR name",
+                "search-all-view",
+                search_path,
+                data=name_search,
+                headers=XHR_HEADERS,
+            ),
+            Scenario(
+                "search XHR content",
+                "search-all-view",
+                search_path,
+                data={**name_search, "mode": "content"},
+                headers=XHR_HEADERS,
+            ),
+            *(
+                Scenario(
+                    f"export {export_format}",
+                    "catalog-export-view",
+                    reverse(
+                        "catalog-export-view", kwargs={"export_format": export_format}
+                    ),
+                )
+                for export_format in ("csv", "jsonl", "json")
+            ),
+            Scenario(
+                f"archive of {len(file_ids)} files",
+                "file-archive-view",
+                reverse("file-archive-view"),
+                method="post",
+                data={"file_ids": file_ids},
+            ),
+            Scenario(
+                "metrics",
+                "metrics-view",
+                reverse("metrics-view"),
+                headers={"Authorization": f"Bearer {settings.METRICS_TOKEN}"},
+            ),
+        ]
+
+    def store_archive_files(self, seed):
+        """Store placeholder contents of the downloaded files (local storage)."""
+        rng = random.Random(seed)
+        files = File.objects.order_by("name")[:ARCHIVE_FILE_COUNT]
+        for file_obj in files:
+            name = file_obj.uploaded_file.name
+            if not default_storage.exists(name):
+                content = ContentFile(rng.randbytes(ARCHIVE_FILE_SIZE))
+                if default_storage.save(name, content) != name:
+                    raise CommandError(f"{name} could not be stored.")
+
+    def make_request(self, handler, factory, scenario, results):
+        request = getattr(factory, scenario.method)(
+            scenario.path, scenario.data, headers=scenario.headers
+        )
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with record_queries(recorder):
+            response = handler(request.environ, lambda status, headers: None)
+            # the streamed responses are sent while they are read
+            for _ in response:
+                pass
+            response.close()
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            results["errors"].append(f"{scenario.path}: {response.status_code}")
+        results["timings"].append(elapsed)
+        results["queries"].append(recorder.count)
+        return response
+
+    def run_scenario(self, handler, factory, scenario, count, concurrency):
+        results = new_results()
+
+        def make_requests(thread_count):
+            try:
+                for _ in range(thread_count):
+                    self.make_request(handler, factory, scenario, results)
+            except Exception as e:
+                results["errors"].append(repr(e))
+            finally:
+                connections.close_all()
+
+        # caches (catalog tree, pages) are filled before the timed requests
+        self.make_request(handler, factory, scenario, new_results())
+        threads = [
+            threading.Thread(
+                target=make_requests,
+                args=(count // concurrency + (index < count % concurrency),),
+            )
+            for index in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings = sorted(results["timings"])
+        if not timings:
+            raise CommandError(f"{scenario.label}: {results['errors'][:1]}")
+        return {
+            **asdict(scenario),
+            "requests": len(timings),
+            "requests_per_second": round(len(timings) / elapsed, 1),
+            "p50_ms": round(percentile(timings, 0.50) * 1e3, 2),
+            "p95_ms": round(percentile(timings, 0.95) * 1e3, 2),
+            "p99_ms": round(percentile(timings, 0.99) * 1e3, 2),
+            "queries_per_request": round(
+                sum(results["queries"]) / len(results["queries"]), 2
+            ),
+            "errors": results["errors"],
+            "peak_rss_mb": round(get_peak_rss_mb(), 1),
+        }
+
+    def benchmark(self, options):
+        if not (Category.objects.exists() and File.objects.exists()):
+            call_command(
+                "seed_catalog",
+                categories=options["categories"],
+                subcategories=options["subcategories"],
+                files=options["files"],
+                seed=options["seed"],
+                stdout=self.stdout,
+            )
+        self.store_archive_files(options["seed"])
+
+        scenarios = self.get_scenarios()
+        url_names = {pattern.name for pattern in studyhub_urls.urlpatterns}
+        missing = url_names - {scenario.url_name for scenario in scenarios}
+        if missing:
+            raise CommandError(f"No scenario for {', '.join(sorted(missing))}.")
+        if options["url_name"]:
+            scenarios = [s for s in scenarios if s.url_name in options["url_name"]]
+
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        # the CSRF cookie of a visitor, sent back with the token by the forms
+        contact = Scenario("contact", "contact-view", reverse("contact-view"))
+        response = self.make_request(handler, factory, contact, new_results())
+        csrf_token = response.cookies[settings.CSRF_COOKIE_NAME].value
+        factory.cookies[settings.CSRF_COOKIE_NAME] = csrf_token
+        scenarios = [
+            (
+                replace(s, headers={**s.headers, "X-CSRFToken": csrf_token})
+                if s.method == "post"
+                else s
+            )
+            for s in scenarios
+        ]
+
+        self.stdout.write(
+            f"{options['requests']} requests per scenario, "
+            f"{options['concurrency']} threads"
+        )
+        self.stdout.write(
+            f"{'scenario':<24} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} "
+            f"{'queries':>8} {'peak RSS':>9} {'errors':>7}"
+        )
+        results = []
+        for scenario in scenarios:
+            result = self.run_scenario(
+                handler, factory, scenario, options["requests"], options["concurrency"]
+            )
+            results.append(result)
+            self.stdout.write(
+                f"{scenario.label:<24} {result['requests_per_second']:>8,.0f} "
+                f"{result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms "
+                f"{result['p99_ms']:>7.2f}ms {result['queries_per_request']:>8.1f} "
+                f"{result['peak_rss_mb']:>7.0f}MB {len(result['errors']):>7}"
+            )
+            for error in result["errors"][:3]:
+                self.stderr.write(f"Failed: {error}")
+        return results
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, FileSystemStorage):
+            raise CommandError(
+                "The benchmarks store files: run them with the hermetic settings "
+                "profile (DJANGO_SETTINGS_MODULE=config.settings_benchmark)."
+            )
+
+        database_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"]
+        )
+        try:
+            results = self.benchmark(options)
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(
+                database_name, verbosity=0, keepdb=options["keepdb"]
+            )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "options": {
+                            name: options[name]
+                            for name in (
+                                "concurrency",
+                                "requests",
+                                "categories",
+                                "subcategories",
+                                "files",
+                                "seed",
+                            )
+                        },
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                )
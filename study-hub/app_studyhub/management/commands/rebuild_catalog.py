@@ -0,0 +1,19 @@
+import time
+
+from app_studyhub.models import FileCatalogEntry
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Rebuild the file catalog (read model of the listings) from the File table."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        FileCatalogEntry.objects.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {FileCatalogEntry.objects.count():,} catalog entries "
+                f"in {elapsed:.1f}s."
+            )
+        )
@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from app_studyhub.extraction import (
+    EXTRACTABLE_MIME_TYPES,
+    extract_stored_text,
+    save_extracted_texts,
+)
+from app_studyhub.models import DocumentText, File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+def extract_or_error(arguments):
+    """Return the (sha256, text) of a stored file, or the exception raised."""
+    try:
+        return extract_stored_text(*arguments)
+    except Exception as e:
+        return e
+
+
+class InProcessExecutor:
+    """Run the extractions in this process (--processes 1)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, *iterables):
+        return map(function, *iterables)
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract and index the text of the contents (PDF, docx, pptx) which are "
+        "not indexed yet, in batches of files extracted by parallel processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Extract the text of all the contents again.",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help=(
+                "Number of worker processes (default: number of CPUs), "
+                "1 extracts the texts in this process."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of files extracted before their texts are saved (default: 100).",
+        )
+
+    def get_executor(self, processes):
+        if processes <= 1:
+            return InProcessExecutor()
+        # new interpreters: no database connection or S3 client shared with them
+        return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        files = File.objects.filter(mime_type__in=EXTRACTABLE_MIME_TYPES).only(
+            "pk", "subcategory", "uploaded_file", "mime_type", "checksum"
+        )
+        if not options["all"]:
+            files = files.exclude(checksum__in=DocumentText.objects.values("sha256"))
+        files = files.order_by("pk")
+
+        extracted_count = failed_count = 0
+        last_pk = None
+        with self.get_executor(options["processes"]) as executor:
+            while True:
+                # keyset pagination: the failed files are not fetched again
+                batch = files if last_pk is None else files.filter(pk__gt=last_pk)
+                batch = list(batch[: options["batch_size"]])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                # each content is extracted once, even when several files share it
+                contents = {}
+                for file_obj in batch:
+                    contents.setdefault(file_obj.checksum or file_obj.pk, file_obj)
+                results = {}
+                for file_obj, result in zip(
+                    contents.values(),
+                    executor.map(
+                        extract_or_error,
+                        [
+                            (file_obj.uploaded_file.name, file_obj.mime_type)
+                            for file_obj in contents.values()
+                        ],
+                    ),
+                ):
+                    if isinstance(result, Exception):
+                        failed_count += 1
+                        self.stderr.write(
+                            f"Failed {file_obj.uploaded_file.name}: {result}"
+                        )
+                        continue
+                    results[file_obj] = result
+                if not results:
+                    continue
+
+                with transaction.atomic():
+                    save_extracted_texts(results)
+                extracted_count += len(results)
+                self.stdout.write(f"{extracted_count:,} contents extracted...")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed the text of {extracted_count:,} contents "
+                f"in {elapsed:.1f}s ({failed_count:,} failed)."
+            )
+        )
@@ -0,0 +1,37 @@
+from app_account.models import UserProfile
+from app_studyhub.images import (
+    AVATAR_WIDTHS,
+    COVER_IMAGE_WIDTHS,
+    update_image_variants,
+)
+from app_studyhub.models import Category, Subcategory, invalidate_catalog_tree
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the WebP variants of the cover images and of the avatars "
+        "which have none yet (e.g. uploaded before the variants existed)."
+    )
+
+    def handle(self, *args, **options):
+        rendered_count = 0
+        for model, field_name, widths in (
+            (Category, "cover_image", COVER_IMAGE_WIDTHS),
+            (Subcategory, "cover_image", COVER_IMAGE_WIDTHS),
+            (UserProfile, "avatar", AVATAR_WIDTHS),
+        ):
+            instances = model.objects.exclude(
+                Q(**{f"{field_name}__isnull": True}) | Q(**{field_name: ""})
+            )
+            for instance in instances:
+                source = getattr(instance, f"{field_name}_variants").get("source")
+                if source == getattr(instance, field_name).name:
+                    continue
+                update_image_variants(instance, field_name, widths)
+                rendered_count += 1
+        invalidate_catalog_tree()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rendered the variants of {rendered_count:,} images.")
+        )
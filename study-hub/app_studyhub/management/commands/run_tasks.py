@@ -0,0 +1,61 @@
+import signal
+import time
+import traceback
+
+from app_studyhub.models import Task
+from app_studyhub.tasks import run_task
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the queued background tasks (e.g. the previews of the files), "
+        "several worker processes can run at the same time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop when there is no task left to run.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait before looking for new tasks (default: 2).",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # finish the running task before stopping
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            if not connection.in_atomic_block:
+                # like between two requests (CONN_MAX_AGE, broken connections)
+                close_old_connections()
+            task = Task.objects.claim()
+            if task is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+
+            started = time.perf_counter()
+            try:
+                run_task(task)
+            except Exception:
+                task.fail(traceback.format_exc())
+                self.stderr.write(f"Failed {task} (attempt {task.attempts}).")
+            else:
+                task.finish()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"Done {task.name} {task.arguments} in {elapsed:.1f}s."
+                )
+
+    def stop(self, signum, frame):
+        self.stopping = True
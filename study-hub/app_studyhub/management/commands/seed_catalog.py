@@ -0,0 +1,214 @@
+import random
+import time
+from collections import Counter
+
+from app_studyhub.models import (
+    CatalogVersion,
+    Category,
+    File,
+    FileCatalogEntry,
+    Subcategory,
+    invalidate_catalog_tree,
+    invalidate_pages,
+)
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+# Username of the creator of the seeded rows (created if needed)
+SEED_USERNAME = "studyhub-seed"
+
+CATEGORY_NAMES = [
+    "Khoa học máy tính",
+    "Kỹ thuật phần mềm",
+    "Hệ thống thông tin",
+    "Mạng máy tính và truyền thông",
+    "An toàn thông tin",
+    "Khoa học dữ liệu",
+    "Toán học",
+    "Vật lý",
+    "Kinh tế",
+    "Quản trị kinh doanh",
+    "Luật",
+    "Ngoại ngữ",
+]
+# (course code, name) of the subjects
+SUBJECTS = [
+    ("IT001", "Nhập môn lập trình"),
+    ("IT002", "Lập trình hướng đối tượng"),
+    ("IT003", "Cấu trúc dữ liệu và giải thuật"),
+    ("IT004", "Cơ sở dữ liệu"),
+    ("IT007", "Hệ điều hành"),
+    ("IT012", "Kiến trúc máy tính"),
+    ("IT005", "Nhập môn mạng máy tính"),
+    ("IE104", "Phát triển ứng dụng web"),
+    ("CS106", "Trí tuệ nhân tạo"),
+    ("CS114", "Học máy"),
+    ("MA003", "Giải tích"),
+    ("MA004", "Đại số tuyến tính"),
+    ("MA005", "Xác suất thống kê"),
+    ("MA006", "Toán rời rạc"),
+    ("PH002", "Vật lý đại cương"),
+    ("EC001", "Kinh tế vi mô"),
+    ("EC002", "Kinh tế quốc tế"),
+    ("LA001", "Pháp luật đại cương"),
+    ("EN004", "Tiếng Anh chuyên ngành"),
+    ("SS004", "Kỹ năng nghề nghiệp"),
+]
+# name, label of the parts and extension of the files of each type
+FILE_KINDS = {
+    File.FileType.LESSON: ("Bài giảng", "Chương", ".pdf"),
+    File.FileType.EXERCISE: ("Bài tập", "Tuần", ".docx"),
+    File.FileType.BOOK: ("Giáo trình", "Tập", ".pdf"),
+    File.FileType.PRACTICE: ("Thực hành", "Buổi", ".pptx"),
+    File.FileType.EXAM: ("Đề thi", "Học kỳ", ".pdf"),
+}
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+
+
+def numbered(values, count, separator=" "):
+    """Return count unique values, numbered once the list is used up."""
+    return [
+        values[index % len(values)]
+        + (f"{separator}{index // len(values) + 1}" if index >= len(values) else "")
+        for index in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty catalog with generated categories, subjects and files "
+        "(the same ones for the same --seed), with bulk inserts. The files "
+        "have metadata but no content: nothing is uploaded to the storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--categories",
+            type=int,
+            default=10,
+            help="Number of categories (default: 10).",
+        )
+        parser.add_argument(
+            "--subcategories",
+            type=int,
+            default=100,
+            help="Number of subjects, spread over the categories (default: 100).",
+        )
+        parser.add_argument(
+            "--files",
+            type=int,
+            default=5000,
+            help="Number of files, spread over the subjects (default: 5000).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the random generator (default: 0).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows per INSERT statement (default: 1000).",
+        )
+
+    def get_user(self):
+        user, created = get_user_model().objects.get_or_create(
+            username=SEED_USERNAME, defaults={"email": f"{SEED_USERNAME}@example.com"}
+        )
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+        return user
+
+    def build_files(self, rng, subjects, count, user):
+        parts = Counter()
+        files = []
+        for index in range(count):
+            code, subcategory = rng.choice(subjects)
+            file_type = rng.choice(list(FILE_KINDS))
+            kind, part_label, extension = FILE_KINDS[file_type]
+            parts[code, file_type] += 1
+            files.append(
+                File(
+                    # short: the slugs (made from the names) are cut at 50
+                    # characters, which must stay unique within a batch
+                    name=f"{kind} {code} {part_label} {parts[code, file_type]}",
+                    subcategory=subcategory,
+                    file_type=file_type,
+                    file_language=rng.choice(list(File.FileLanguage)),
+                    uploaded_file=f"files/seed/{index:07d}{extension}",
+                    file_size=rng.randint(50_000, 20_000_000),
+                    mime_type=MIME_TYPES[extension],
+                    page_count=rng.randint(1, 400),
+                    created_by=user,
+                )
+            )
+        return files
+
+    def handle(self, *args, **options):
+        if Category.objects.exists() or File.objects.exists():
+            raise CommandError("The catalog is not empty: seed an empty database.")
+        if options["categories"] < 1 or options["subcategories"] < 1:
+            raise CommandError("At least one category and one subject are needed.")
+
+        started = time.perf_counter()
+        rng = random.Random(options["seed"])
+        batch_size = options["batch_size"]
+        user = self.get_user()
+
+        with transaction.atomic():
+            # the slugs are made from the names while they are inserted
+            categories = Category.objects.bulk_create(
+                [
+                    Category(name=name, created_by=user)
+                    for name in numbered(CATEGORY_NAMES, options["categories"])
+                ],
+                batch_size=batch_size,
+            )
+            codes = numbered(
+                [code for code, _ in SUBJECTS], options["subcategories"], "-"
+            )
+            names = numbered([name for _, name in SUBJECTS], options["subcategories"])
+            subcategories = Subcategory.objects.bulk_create(
+                [
+                    Subcategory(
+                        name=name,
+                        description=f"Mã môn học: {code}",
+                        category=rng.choice(categories),
+                        created_by=user,
+                    )
+                    for code, name in zip(codes, names)
+                ],
+                batch_size=batch_size,
+            )
+            # the search fields are filled by the triggers of the table
+            File.objects.bulk_create(
+                self.build_files(
+                    rng, list(zip(codes, subcategories)), options["files"], user
+                ),
+                batch_size=batch_size,
+            )
+
+            # what the signals of the models do for each saved row
+            FileCatalogEntry.objects.refresh(File.objects.all())
+            CatalogVersion.objects.bump(
+                CatalogVersion.GLOBAL,
+                *(subcategory.pk for subcategory in subcategories),
+            )
+            invalidate_catalog_tree()
+            invalidate_pages("categories")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(categories):,} categories, {len(subcategories):,} "
+                f"subjects and {options['files']:,} files in {elapsed:.1f}s."
+            )
+        )
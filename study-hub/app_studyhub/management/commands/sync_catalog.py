@@ -0,0 +1,411 @@
+import json
+import os
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from app_studyhub.blobs import BlobSource, hash_content
+from app_studyhub.imports import (
+    FILE_LANGUAGE_KEYWORDS,
+    FILE_TYPE_KEYWORDS,
+    ImportItem,
+    import_files,
+    infer_from_path,
+)
+from app_studyhub.models import (
+    Blob,
+    CatalogVersion,
+    Category,
+    File,
+    Subcategory,
+    invalidate_catalog_tree,
+    invalidate_pages,
+)
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# Name of the manifest written in the synced directory (by default)
+MANIFEST_NAME = ".studyhub-sync.json"
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hash_content(f)[0]
+
+
+class SyncManifest:
+    """
+    Local record of the last sync: the id of the row of each folder and,
+    for each file, its size, modification time, SHA-256 and File id.
+    It is saved (atomically) after each batch so an interrupted sync resumes
+    where it stopped.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.categories = data.get("categories", {})
+        self.subcategories = data.get("subcategories", {})
+        self.files = data.get("files", {})
+
+    @classmethod
+    def load(cls, path):
+        try:
+            return cls(path, json.loads(path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return cls(path, {})
+
+    def save(self):
+        data = {
+            "categories": self.categories,
+            "subcategories": self.subcategories,
+            "files": self.files,
+        }
+        temporary_path = self.path.with_name(f"{self.path.name}.tmp")
+        temporary_path.write_text(
+            json.dumps(data, ensure_ascii=False, separators=(",", ":")),
+            encoding="utf-8",
+        )
+        os.replace(temporary_path, self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mirror a directory of documents organised as category/subject/[type/]file "
+        "into the catalog: only the folders and files which changed since the "
+        "last sync are created, updated (uploaded again) or removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Root directory of the documents.")
+        parser.add_argument(
+            "--manifest",
+            help=f"Path of the sync manifest (default: <directory>/{MANIFEST_NAME}).",
+        )
+        parser.add_argument(
+            "--user",
+            help="Username of the creator of new rows (default: first superuser).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of files hashed or uploaded at the same time (default: 8).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of files synced between two saves of the manifest.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        root = Path(options["directory"]).resolve()
+        if not root.is_dir():
+            raise CommandError(f"{root} is not a directory.")
+        manifest_path = Path(options["manifest"] or root / MANIFEST_NAME)
+
+        self.user = self.get_user(options["user"])
+        self.workers = options["workers"]
+        self.batch_size = options["batch_size"]
+        self.manifest = SyncManifest.load(manifest_path)
+        self.counts = Counter()
+
+        scanned = self.scan(root)
+        try:
+            subcategories = self.sync_folders(scanned)
+            self.sync_files(root, scanned, subcategories)
+        finally:
+            self.manifest.save()
+
+        elapsed = time.perf_counter() - started
+        counts = self.counts
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Synced {len(scanned):,} files in {elapsed:.1f}s: "
+                f"{counts['created']:,} created, {counts['updated']:,} updated, "
+                f"{counts['unchanged']:,} unchanged, "
+                f"{counts['deleted']:,} deleted, {counts['failed']:,} failed."
+            )
+        )
+
+    def get_user(self, username):
+        users = get_user_model().objects.all()
+        if username:
+            user = users.filter(username=username).first()
+        else:
+            user = users.filter(is_superuser=True).order_by("date_joined").first()
+        if user is None:
+            raise CommandError("No user to record as the creator of the new rows.")
+        return user
+
+    def scan(self, root):
+        """Return {relative path: stat} of the documents (hidden files skipped)."""
+        scanned = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = Path(dirpath, filename)
+                relative_path = path.relative_to(root).as_posix()
+                if len(PurePosixPath(relative_path).parts) < 3:
+                    self.stderr.write(
+                        f"Skipped {relative_path}: not in a category/subject folder."
+                    )
+                    continue
+                scanned[relative_path] = path.stat()
+        return scanned
+
+    def sync_folders(self, scanned):
+        """
+        Create, update or deactivate the categories and subcategories
+        of the folders, return {"category/subject": Subcategory}.
+        """
+        category_folders = {path.split("/")[0] for path in scanned}
+        subcategory_folders = {"/".join(path.split("/")[:2]) for path in scanned}
+
+        known_categories = Category.objects.in_bulk(
+            list(self.manifest.categories.values())
+        )
+        categories = {
+            folder: self.sync_folder(
+                Category, folder, folder, self.manifest.categories, known_categories
+            )
+            for folder in sorted(category_folders)
+        }
+
+        known_subcategories = Subcategory.objects.select_related("category").in_bulk(
+            list(self.manifest.subcategories.values())
+        )
+        subcategories = {}
+        for folder in sorted(subcategory_folders):
+            category_folder, name = folder.split("/")
+            subcategories[folder] = self.sync_folder(
+                Subcategory,
+                name,
+                folder,
+                self.manifest.subcategories,
+                known_subcategories,
+                category=categories[category_folder],
+            )
+
+        deactivated = 0
+        for model, folders, manifest_ids in (
+            (Category, category_folders, self.manifest.categories),
+            (Subcategory, subcategory_folders, self.manifest.subcategories),
+        ):
+            vanished = [folder for folder in manifest_ids if folder not in folders]
+            deactivated += model.objects.filter(
+                pk__in=[manifest_ids.pop(folder) for folder in vanished],
+                is_active=True,
+            ).update(is_active=False, last_modified=timezone.now())
+        if deactivated:
+            # what the signals of the models do for each saved row: the
+            # inactive folders leave the catalog tree, listed by every page,
+            # and the listings of the files
+            CatalogVersion.objects.bump(CatalogVersion.GLOBAL)
+            invalidate_catalog_tree()
+            invalidate_pages("categories")
+        return subcategories
+
+    def sync_folder(self, model, name, folder, manifest_ids, known, **fields):
+        """Return the (active) row of the folder, create it if needed."""
+        obj = None
+        if folder in manifest_ids:
+            obj = known.get(uuid.UUID(manifest_ids[folder]))
+        if obj is None:
+            obj = model.objects.filter(name=name).first()
+        if obj is None:
+            obj = model(name=name, created_by=self.user, **fields)
+            obj.save()
+        elif not obj.is_active or any(
+            getattr(obj, field) != value for field, value in fields.items()
+        ):
+            obj.is_active = True
+            for field, value in fields.items():
+                setattr(obj, field, value)
+            obj.modified_by = self.user
+            obj.last_modified = timezone.now()
+            obj.save()
+        manifest_ids[folder] = str(obj.pk)
+        return obj
+
+    def sync_files(self, root, scanned, subcategories):
+        entries = self.manifest.files
+
+        # only the files whose size or modification time changed are hashed
+        candidates = [
+            path
+            for path, stat in scanned.items()
+            if path not in entries
+            or (entries[path]["size"], entries[path]["mtime_ns"])
+            != (stat.st_size, stat.st_mtime_ns)
+        ]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            hashes = dict(
+                zip(
+                    candidates,
+                    executor.map(lambda path: file_sha256(root / path), candidates),
+                )
+            )
+        changed = []
+        for path in candidates:
+            entry = entries.get(path)
+            if entry is not None and entry["sha256"] == hashes[path]:
+                # touched but not modified
+                self.record(path, scanned[path], hashes[path], entry["file"])
+            else:
+                changed.append(path)
+        self.counts["unchanged"] = len(scanned) - len(changed)
+
+        # the file name is its identity (File names are unique): a file moved
+        # to another folder, or already in the catalog, updates the same row
+        active_file_ids = {
+            entries[path]["file"]
+            for path in scanned
+            if path in entries and path not in changed
+        }
+        new_paths = [path for path in changed if path not in entries]
+        existing_files = File.objects.in_bulk(
+            [self.get_file_name(path) for path in new_paths], field_name="name"
+        )
+        synced_files = File.objects.in_bulk(
+            [entries[path]["file"] for path in changed if path in entries]
+        )
+        creations = defaultdict(list)
+        updates = []
+        for path in changed:
+            if path in entries:
+                file_obj = synced_files.get(uuid.UUID(entries[path]["file"]))
+            else:
+                file_obj = existing_files.get(self.get_file_name(path))
+                if file_obj is not None and str(file_obj.pk) in active_file_ids:
+                    self.fail(path, "another file of the directory has the same name")
+                    continue
+            if file_obj is None:
+                creations["/".join(path.split("/")[:2])].append(path)
+            else:
+                active_file_ids.add(str(file_obj.pk))
+                updates.append((path, file_obj))
+
+        # files have no is_active field: the removed ones are deleted
+        vanished = [path for path in entries if path not in scanned]
+        removed_ids = {entries.pop(path)["file"] for path in vanished} - active_file_ids
+        self.delete_files(removed_ids)
+        self.manifest.save()
+
+        for folder, paths in creations.items():
+            for start in range(0, len(paths), self.batch_size):
+                self.create_files(
+                    root,
+                    subcategories[folder],
+                    paths[start : start + self.batch_size],
+                    scanned,
+                    hashes,
+                )
+                self.manifest.save()
+        for start in range(0, len(updates), self.batch_size):
+            self.update_files(
+                root,
+                updates[start : start + self.batch_size],
+                subcategories,
+                scanned,
+                hashes,
+            )
+            self.manifest.save()
+
+    def create_files(self, root, subcategory, paths, scanned, hashes):
+        """Upload and create the new files of a subcategory (see import_files)."""
+        items = {}
+        for path in paths:
+            item = ImportItem(
+                self.get_subcategory_path(path),
+                lambda path=path: open(root / path, "rb"),
+                sha256=hashes[path],
+                size=scanned[path].st_size,
+            )
+            items[item] = path
+        for item in import_files(
+            subcategory, list(items), self.user, max_workers=self.workers
+        ):
+            path = items[item]
+            if item.is_imported:
+                self.record(path, scanned[path], hashes[path], str(item.file.pk))
+                self.counts["created"] += 1
+            else:
+                self.fail(path, item.error)
+
+    def update_files(self, root, updates, subcategories, scanned, hashes):
+        """Store the content of the modified (or moved) files again."""
+        sources = []
+        for path, file_obj in updates:
+            subcategory_path = self.get_subcategory_path(path)
+            file_obj.name = self.get_file_name(path)
+            file_obj.subcategory = subcategories["/".join(path.split("/")[:2])]
+            file_obj.file_type = infer_from_path(
+                subcategory_path, FILE_TYPE_KEYWORDS, file_obj.file_type
+            )
+            file_obj.file_language = infer_from_path(
+                subcategory_path, FILE_LANGUAGE_KEYWORDS, file_obj.file_language
+            )
+            sources.append(
+                BlobSource(
+                    path,
+                    lambda path=path: open(root / path, "rb"),
+                    sha256=hashes[path],
+                    size=scanned[path].st_size,
+                )
+            )
+        Blob.objects.store(sources, max_workers=self.workers)
+
+        for (path, file_obj), source in zip(updates, sources):
+            if source.error is not None:
+                self.fail(path, source.error)
+                continue
+            previous_blob_id = file_obj.blob_id
+            previous_name = file_obj.uploaded_file.name
+            file_obj.blob = source.blob
+            file_obj.set_metadata(source.metadata)
+            file_obj.uploaded_file.name = source.blob.storage_name
+            file_obj.modified_by = self.user
+            file_obj.last_modified = timezone.now()
+            file_obj.save()
+            if previous_blob_id is not None:
+                Blob.objects.release([previous_blob_id])
+            elif previous_name and previous_name != file_obj.uploaded_file.name:
+                default_storage.delete(previous_name)
+            self.record(path, scanned[path], hashes[path], str(file_obj.pk))
+            self.counts["updated"] += 1
+
+    def delete_files(self, file_ids):
+        """Delete the files removed from the directory (and their stored content)."""
+        for file_obj in File.objects.filter(pk__in=file_ids):
+            # the blob of the file is released by the post_delete receiver
+            file_obj.delete()
+            if file_obj.blob_id is None and file_obj.uploaded_file.name:
+                default_storage.delete(file_obj.uploaded_file.name)
+            self.counts["deleted"] += 1
+
+    def get_subcategory_path(self, path):
+        """Return the path inside the subject folder, e.g. "Đề thi/2024.pdf"."""
+        return "/".join(path.split("/")[2:])
+
+    def get_file_name(self, path):
+        return ImportItem(path, None).name
+
+    def record(self, path, stat, sha256, file_id):
+        self.manifest.files[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "file": file_id,
+        }
+
+    def fail(self, path, error):
+        self.counts["failed"] += 1
+        self.stderr.write(f"Failed {path}: {error}")
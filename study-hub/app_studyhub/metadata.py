@@ -0,0 +1,331 @@
+import io
+import mimetypes
+import os
+import re
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.core.files.storage import default_storage
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+# Bytes read at the end of a PDF to find its cross-reference table
+PDF_TAIL_SIZE = 4 * 1024
+# Bytes read to parse one object (dictionary) of a PDF
+PDF_OBJECT_SIZE = 8 * 1024
+# Size of the ranges read from S3 (see S3RangeReader)
+STORED_FILE_BUFFER_SIZE = 64 * 1024
+
+# first bytes of the file -> MIME type
+MAGIC_NUMBERS = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"Rar!\x1a\x07", "application/vnd.rar"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+]
+ZIP_MAGIC_NUMBER = b"PK\x03\x04"
+OLE_MAGIC_NUMBER = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# MIME types of ZIP (Office Open XML) and OLE (Office 97-2003) documents,
+# the container is recognized by its first bytes, the document by its extension
+ZIP_MIME_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+OLE_MIME_TYPES = {
+    ".doc": "application/msword",
+    ".ppt": "application/vnd.ms-powerpoint",
+    ".xls": "application/vnd.ms-excel",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class FileMetadata:
+    """Metadata of the content of a file."""
+
+    size: int
+    mime_type: str
+    page_count: int | None
+    # SHA-256 (hex) of the content, empty when it is not computed
+    checksum: str
+
+
+def detect_mime_type(header, filename):
+    """Return the MIME type of a file from its first bytes and its name."""
+    extension = Path(filename).suffix.lower()
+    for magic_number, mime_type in MAGIC_NUMBERS:
+        if header.startswith(magic_number):
+            return mime_type
+    if header.startswith(ZIP_MAGIC_NUMBER):
+        return ZIP_MIME_TYPES.get(extension, "application/zip")
+    if header.startswith(OLE_MAGIC_NUMBER):
+        return OLE_MIME_TYPES.get(extension, "application/x-ole-storage")
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+
+class PdfPageCounter:
+    """
+    Count the pages of a PDF from its page tree: only the trailer, the
+    cross-reference sections and the few objects leading to the root of the
+    page tree are read (never the content of the pages).
+    """
+
+    def __init__(self, content, size):
+        self.content = content
+        self.size = size
+        # cross-reference sections, from the newest to the oldest
+        self.sections = []
+        self.object_streams = {}
+
+    def read(self, offset, length):
+        self.content.seek(offset)
+        return self.content.read(length)
+
+    def count(self):
+        tail = self.read(max(0, self.size - PDF_TAIL_SIZE), PDF_TAIL_SIZE)
+        xref_offset = int(re.findall(rb"startxref\s+(\d+)", tail)[-1])
+        root = None
+        visited = set()
+        while xref_offset is not None and xref_offset not in visited:
+            visited.add(xref_offset)
+            trailer = self.read_xref_section(xref_offset)
+            if root is None:
+                root = self.get_reference(trailer, b"Root")
+            xref_offset = self.get_integer(trailer, b"Prev")
+        pages = self.get_reference(self.get_object(root), b"Pages")
+        return self.get_integer(self.get_object(pages), b"Count")
+
+    def get_integer(self, dictionary, key):
+        match = re.search(rb"/" + key + rb"\s+(\d+)\b(?!\s+\d+\s+R)", dictionary)
+        return int(match.group(1)) if match else None
+
+    def get_reference(self, dictionary, key):
+        match = re.search(rb"/" + key + rb"\s+(\d+)\s+\d+\s+R", dictionary)
+        return int(match.group(1)) if match else None
+
+    def read_xref_section(self, offset):
+        """Register the cross-reference section at the offset, return its trailer."""
+        data = self.read(offset, PDF_OBJECT_SIZE)
+        if not data.startswith(b"xref"):
+            # cross-reference stream (PDF 1.5)
+            dictionary, stream = self.read_stream_object(offset)
+            self.sections.append(self.parse_xref_stream(dictionary, stream))
+            return dictionary
+
+        # cross-reference table: subsections of fixed size (20 bytes) entries
+        subsections = []
+        position = offset + len(b"xref")
+        while True:
+            data = self.read(position, 64)
+            match = re.match(rb"\s*(\d+)\s+(\d+)\s*", data)
+            if match is None:
+                break
+            start, count = int(match.group(1)), int(match.group(2))
+            subsections.append((start, count, position + match.end()))
+            position += match.end() + count * 20
+        self.sections.append(subsections)
+        trailer = self.read(position, PDF_OBJECT_SIZE)
+        xref_stream_offset = self.get_integer(trailer, b"XRefStm")
+        if xref_stream_offset is not None:
+            # hybrid file, the compressed objects are in a cross-reference stream
+            dictionary, stream = self.read_stream_object(xref_stream_offset)
+            self.sections.append(self.parse_xref_stream(dictionary, stream))
+        return trailer
+
+    def parse_xref_stream(self, dictionary, stream):
+        widths = [
+            int(width)
+            for width in re.search(rb"/W\s*\[([\d\s]+)\]", dictionary).group(1).split()
+        ]
+        index_match = re.search(rb"/Index\s*\[([\d\s]+)\]", dictionary)
+        if index_match:
+            index = [int(number) for number in index_match.group(1).split()]
+        else:
+            index = [0, self.get_integer(dictionary, b"Size")]
+
+        entries = {}
+        row_size = sum(widths)
+        row = 0
+        for start, count in zip(index[::2], index[1::2]):
+            for number in range(start, start + count):
+                fields = []
+                position = row * row_size
+                for width in widths:
+                    fields.append(int.from_bytes(stream[position : position + width]))
+                    position += width
+                row += 1
+                entry_type = fields[0] if widths[0] else 1
+                if entry_type in (1, 2):
+                    entries[number] = (entry_type, fields[1], fields[2])
+        return entries
+
+    def locate(self, number):
+        """Return ("offset", offset) or ("stream", stream number, index)."""
+        for section in self.sections:
+            if isinstance(section, dict):
+                entry = section.get(number)
+                if entry is not None:
+                    entry_type, field, index = entry
+                    if entry_type == 1:
+                        return ("offset", field)
+                    return ("stream", field, index)
+                continue
+            for start, count, entries_offset in section:
+                if start <= number < start + count:
+                    entry = self.read(entries_offset + (number - start) * 20, 20)
+                    if entry[17:18] == b"n":
+                        return ("offset", int(entry[:10]))
+        raise ValueError(f"Object {number} not found.")
+
+    def get_object(self, number):
+        """Return the content of an object (up to PDF_OBJECT_SIZE bytes)."""
+        location = self.locate(number)
+        if location[0] == "offset":
+            data = self.read(location[1], PDF_OBJECT_SIZE)
+            return data[data.find(b"obj") + 3 :].split(b"endobj", 1)[0]
+
+        _, stream_number, index = location
+        if stream_number not in self.object_streams:
+            dictionary, stream = self.read_stream_object(self.locate(stream_number)[1])
+            first = self.get_integer(dictionary, b"First")
+            header = [int(number) for number in stream[:first].split()]
+            self.object_streams[stream_number] = (first, header[1::2], stream)
+        first, offsets, stream = self.object_streams[stream_number]
+        end = offsets[index + 1] if index + 1 < len(offsets) else len(stream) - first
+        return stream[first + offsets[index] : first + end]
+
+    def read_stream_object(self, offset):
+        """Return the dictionary and the decoded data of a stream object."""
+        data = self.read(offset, PDF_OBJECT_SIZE)
+        match = re.search(rb"stream(\r\n|\n)", data)
+        dictionary = data[: match.start()]
+        length = self.get_integer(dictionary, b"Length")
+        if length is None:
+            length = int(self.get_object(self.get_reference(dictionary, b"Length")))
+        stream = self.read(offset + match.end(), length)
+        if b"/FlateDecode" in dictionary:
+            stream = zlib.decompress(stream)
+        predictor = self.get_integer(dictionary, b"Predictor") or 1
+        if predictor >= 10:
+            stream = self.unpredict_png(
+                stream, self.get_integer(dictionary, b"Columns") or 1
+            )
+        return dictionary, stream
+
+    def unpredict_png(self, data, columns):
+        """Undo the PNG predictors (one byte per pixel) of a stream."""
+        rows = []
+        previous = bytearray(columns)
+        for start in range(0, len(data), columns + 1):
+            filter_type = data[start]
+            row = bytearray(data[start + 1 : start + 1 + columns])
+            for i in range(len(row)):
+                left = row[i - 1] if i else 0
+                up = previous[i]
+                up_left = previous[i - 1] if i else 0
+                if filter_type == 1:
+                    row[i] = (row[i] + left) & 0xFF
+                elif filter_type == 2:
+                    row[i] = (row[i] + up) & 0xFF
+                elif filter_type == 3:
+                    row[i] = (row[i] + (left + up) // 2) & 0xFF
+                elif filter_type == 4:
+                    estimate = left + up - up_left
+                    distances = (
+                        abs(estimate - left),
+                        abs(estimate - up),
+                        abs(estimate - up_left),
+                    )
+                    predicted = (left, up, up_left)[distances.index(min(distances))]
+                    row[i] = (row[i] + predicted) & 0xFF
+            rows.append(bytes(row))
+            previous = row
+        return b"".join(rows)
+
+
+def count_office_pages(content):
+    """Return the pages (or slides) of an Office Open XML document."""
+    with zipfile.ZipFile(content) as zf:
+        properties = zf.read("docProps/app.xml")
+    match = re.search(rb"<(?:\w+:)?(?:Pages|Slides)>(\d+)<", properties)
+    return int(match.group(1)) if match else None
+
+
+def inspect_content(content, filename, sha256=""):
+    """
+    Return the FileMetadata of a seekable binary file without reading all of
+    it: the size comes from the end position, the MIME type from the first
+    bytes, the page count from the structure of PDF and Office documents.
+    The checksum is the given SHA-256 (computed while the content is hashed).
+    """
+    size = content.seek(0, os.SEEK_END)
+    content.seek(0)
+    mime_type = detect_mime_type(content.read(16), filename)
+    page_count = None
+    try:
+        if mime_type == "application/pdf":
+            page_count = PdfPageCounter(content, size).count()
+        elif mime_type in ZIP_MIME_TYPES.values():
+            page_count = count_office_pages(content)
+    except Exception:
+        # damaged, encrypted or unusual document, its pages are not counted
+        pass
+    content.seek(0)
+    return FileMetadata(
+        size=size, mime_type=mime_type, page_count=page_count, checksum=sha256
+    )
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable reader of an object of the S3 bucket which only downloads
+    the ranges of bytes which are read (S3File downloads the whole object).
+    """
+
+    def __init__(self, storage, name):
+        self.s3_object = storage.bucket.Object(
+            storage._normalize_name(clean_name(name))
+        )
+        self.size = self.s3_object.content_length
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        if self.position >= self.size or not len(buffer):
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        response = self.s3_object.get(Range=f"bytes={self.position}-{end}")
+        data = response["Body"].read()
+        buffer[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def open_stored_file(name, storage=None):
+    """Open a stored file for reading, only the read parts of S3 objects are fetched."""
+    storage = storage or default_storage
+    if isinstance(storage, S3Storage):
+        return io.BufferedReader(
+            S3RangeReader(storage, name), buffer_size=STORED_FILE_BUFFER_SIZE
+        )
+    return storage.open(name, "rb")
@@ -0,0 +1,184 @@
+import os
+import time
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.urls import Resolver404, resolve
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets (seconds) of the durations of the requests
+DURATION_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# Buckets (bytes) of the sizes of the responses: 256 B to 16 MiB
+SIZE_BUCKETS = tuple(256 * 4**power for power in range(9))
+# other methods are recorded as "other" (the labels must stay few)
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+REQUEST_DURATION = Histogram(
+    "studyhub_http_request_duration_seconds",
+    "Duration of the requests, until their response is returned.",
+    ["view", "method", "status"],
+    buckets=DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "studyhub_http_response_size_bytes",
+    "Size of the bodies of the responses (streamed ones once sent).",
+    ["view"],
+    buckets=SIZE_BUCKETS,
+)
+DB_QUERIES = Counter(
+    "studyhub_db_queries",
+    "Database queries of the requests (see QueryBudgetMiddleware).",
+    ["view"],
+)
+DB_QUERY_DURATION = Counter(
+    "studyhub_db_query_duration_seconds",
+    "Time spent by the requests in database queries.",
+    ["view"],
+)
+PAGE_CACHE_REQUESTS = Counter(
+    "studyhub_page_cache_requests",
+    "Requests of the anonymous page cache by result (hit or miss).",
+    ["view", "result"],
+)
+CATALOG_TREE_BUILDS = Counter(
+    "studyhub_catalog_tree_builds",
+    "Builds of the in-memory catalog tree of a process (its cache misses).",
+)
+
+
+def is_multiprocess() -> bool:
+    """Return whether the metrics are shared by the processes (Gunicorn)."""
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+def render_metrics() -> bytes:
+    """
+    Return the metrics in the Prometheus text format, those of all the
+    processes sharing PROMETHEUS_MULTIPROC_DIR (see config/gunicorn.py).
+    """
+    if not is_multiprocess():
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+@lru_cache(maxsize=1024)
+def resolve_view_name(path):
+    try:
+        return resolve(path).view_name
+    except Resolver404:
+        return "unresolved"
+
+
+def get_view_name(request):
+    """Return the URL name of the view of a request (resolved if needed)."""
+    match = request.resolver_match
+    if match is not None:
+        return match.view_name
+    # served by a middleware, e.g. the page cache
+    return resolve_view_name(request.path_info)
+
+
+def count_bytes(content, histogram):
+    size = 0
+    try:
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        histogram.observe(size)
+
+
+async def acount_bytes(content, histogram):
+    """Asynchronous version of count_bytes()."""
+    size = 0
+    try:
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        histogram.observe(size)
+
+
+class MetricsMiddleware:
+    """
+    Record the duration, the database queries (counted by
+    QueryBudgetMiddleware, after it), the page cache result and the size of
+    the response of each request, by URL name (see MetricsView).
+
+    Recording takes under 10 microseconds: the values are kept in memory, or
+    in memory-mapped files with PROMETHEUS_MULTIPROC_DIR.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        """Asynchronous version of __call__() (ASGI)."""
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, duration):
+        view_name = get_view_name(request)
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_DURATION.labels(view_name, method, response.status_code).observe(
+            duration
+        )
+
+        recorder = getattr(request, "query_recorder", None)
+        if recorder is not None and recorder.count:
+            DB_QUERIES.labels(view_name).inc(recorder.count)
+            DB_QUERY_DURATION.labels(view_name).inc(recorder.duration)
+
+        page_cache = response.headers.get("X-Page-Cache")
+        if page_cache is not None:
+            PAGE_CACHE_REQUESTS.labels(view_name, page_cache).inc()
+
+        response_size = RESPONSE_SIZE.labels(view_name)
+        if not response.streaming:
+            response_size.observe(len(response.content))
+        elif response.is_async:
+            response.streaming_content = acount_bytes(
+                response.streaming_content, response_size
+            )
+        else:
+            response.streaming_content = count_bytes(
+                response.streaming_content, response_size
+            )
@@ -0,0 +1,126 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations, models
+
+# Text search configuration: "simple" parser/dictionary (no stemming, which
+# suits Vietnamese) with accent folding through the "unaccent" dictionary.
+CREATE_SEARCH_CONFIG_SQL = """
+CREATE TEXT SEARCH CONFIGURATION studyhub_search (COPY = simple);
+ALTER TEXT SEARCH CONFIGURATION studyhub_search
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple;
+"""
+
+DROP_SEARCH_CONFIG_SQL = """
+DROP TEXT SEARCH CONFIGURATION IF EXISTS studyhub_search;
+"""
+
+# Keep "search_vector" and "search_document" of each file up to date
+# with its own name and the names of its subject and category.
+CREATE_SEARCH_TRIGGERS_SQL = """
+CREATE FUNCTION studyhub_file_search_update() RETURNS trigger AS $$
+DECLARE
+    subcategory_name text;
+    category_name text;
+BEGIN
+    SELECT s.name, c.name INTO subcategory_name, category_name
+    FROM studyhub_subcategory s
+    JOIN studyhub_category c ON c.id = s.category_id
+    WHERE s.id = NEW.subcategory_id;
+
+    NEW.search_vector :=
+        setweight(to_tsvector('studyhub_search', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('studyhub_search', coalesce(subcategory_name, '')), 'B')
+        || setweight(to_tsvector('studyhub_search', coalesce(category_name, '')), 'C');
+    NEW.search_document := unaccent(
+        lower(concat_ws(' ', NEW.name, subcategory_name, category_name))
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER studyhub_file_search_update
+    BEFORE INSERT OR UPDATE ON studyhub_file
+    FOR EACH ROW EXECUTE FUNCTION studyhub_file_search_update();
+
+CREATE FUNCTION studyhub_subcategory_search_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE studyhub_file SET search_vector = NULL WHERE subcategory_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER studyhub_subcategory_search_update
+    AFTER UPDATE OF name, category_id ON studyhub_subcategory
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name
+          OR OLD.category_id IS DISTINCT FROM NEW.category_id)
+    EXECUTE FUNCTION studyhub_subcategory_search_update();
+
+CREATE FUNCTION studyhub_category_search_update() RETURNS trigger AS $$
+BEGIN
+    UPDATE studyhub_file f SET search_vector = NULL
+    FROM studyhub_subcategory s
+    WHERE f.subcategory_id = s.id AND s.category_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER studyhub_category_search_update
+    AFTER UPDATE OF name ON studyhub_category
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION studyhub_category_search_update();
+
+-- fill the search fields of existing files
+UPDATE studyhub_file SET search_vector = NULL;
+"""
+
+DROP_SEARCH_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS studyhub_category_search_update ON studyhub_category;
+DROP FUNCTION IF EXISTS studyhub_category_search_update();
+DROP TRIGGER IF EXISTS studyhub_subcategory_search_update ON studyhub_subcategory;
+DROP FUNCTION IF EXISTS studyhub_subcategory_search_update();
+DROP TRIGGER IF EXISTS studyhub_file_search_update ON studyhub_file;
+DROP FUNCTION IF EXISTS studyhub_file_search_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_studyhub', '0002_alter_file_file_type'),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        TrigramExtension(),
+        migrations.RunSQL(
+            sql=CREATE_SEARCH_CONFIG_SQL,
+            reverse_sql=DROP_SEARCH_CONFIG_SQL,
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_SEARCH_TRIGGERS_SQL,
+            reverse_sql=DROP_SEARCH_TRIGGERS_SQL,
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='studyhub_file_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='studyhub_file_trigram_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_file_catalog(apps, schema_editor):
+    File = apps.get_model("app_studyhub", "File")
+    FileCatalogEntry = apps.get_model("app_studyhub", "FileCatalogEntry")
+    entries = []
+    for file in File.objects.select_related("subcategory__category").iterator():
+        updated_at = file.last_modified or file.date_created
+        entries.append(
+            FileCatalogEntry(
+                file_id=file.id,
+                subcategory_id=file.subcategory_id,
+                name=file.name,
+                category_name=file.subcategory.category.name,
+                subcategory_name=file.subcategory.name,
+                file_type=file.file_type,
+                file_language=file.file_language,
+                uploaded_file_url=file.uploaded_file.url,
+                updated_at=updated_at,
+                last_modified=updated_at.date().strftime("%d/%m/%Y"),
+            )
+        )
+        if len(entries) >= 1000:
+            FileCatalogEntry.objects.bulk_create(entries)
+            entries = []
+    FileCatalogEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0003_file_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileCatalogEntry",
+            fields=[
+                (
+                    "file",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="catalog_entry",
+                        serialize=False,
+                        to="app_studyhub.file",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("category_name", models.CharField(max_length=255)),
+                ("subcategory_name", models.CharField(max_length=255)),
+                (
+                    "file_type",
+                    models.CharField(
+                        choices=[
+                            ("lesson", "Lesson"),
+                            ("exercise", "Exercise"),
+                            ("book", "Book"),
+                            ("practice", "Practice"),
+                            ("exam", "Exam"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "file_language",
+                    models.CharField(
+                        choices=[("en", "English"), ("vi", "Vietnamese")], max_length=20
+                    ),
+                ),
+                ("uploaded_file_url", models.CharField(max_length=1024)),
+                ("updated_at", models.DateTimeField()),
+                ("last_modified", models.CharField(max_length=10)),
+                (
+                    "subcategory",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="app_studyhub.subcategory",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "File catalog entry",
+                "verbose_name_plural": "File catalog entries",
+                "db_table": "studyhub_file_catalog",
+                "ordering": ["-updated_at", "name"],
+                "indexes": [
+                    models.Index(
+                        fields=["-updated_at", "name"],
+                        name="studyhub_catalog_updated_idx",
+                    ),
+                    models.Index(
+                        fields=["subcategory", "-updated_at", "name"],
+                        name="studyhub_catalog_subcat_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_file_catalog, migrations.RunPython.noop),
+    ]
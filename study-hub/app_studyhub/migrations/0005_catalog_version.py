@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:40
+
+import uuid
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_catalog_versions(apps, schema_editor):
+    CatalogVersion = apps.get_model("app_studyhub", "CatalogVersion")
+    Subcategory = apps.get_model("app_studyhub", "Subcategory")
+    now = timezone.now()
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(scope=uuid.UUID(int=0), version=1, last_modified=now)]
+        + [
+            CatalogVersion(scope=subcategory_id, version=1, last_modified=now)
+            for subcategory_id in Subcategory.objects.values_list("id", flat=True)
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0004_file_catalog_entry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CatalogVersion",
+            fields=[
+                ("scope", models.UUIDField(primary_key=True, serialize=False)),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("last_modified", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Catalog version",
+                "verbose_name_plural": "Catalog versions",
+                "db_table": "studyhub_catalog_version",
+            },
+        ),
+        migrations.RunPython(create_catalog_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:58
+
+import app_studyhub.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0005_catalog_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("storage_name", models.CharField(max_length=255)),
+                ("size", models.PositiveBigIntegerField()),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Blob",
+                "verbose_name_plural": "Blobs",
+                "db_table": "studyhub_blob",
+            },
+        ),
+        migrations.AlterField(
+            model_name="file",
+            name="uploaded_file",
+            field=app_studyhub.models.BlobFileField(
+                max_length=255, upload_to=app_studyhub.models.File.file_upload_to
+            ),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="files",
+                to="app_studyhub.blob",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0006_file_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="checksum",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="file_size",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="mime_type",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="page_count",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="filecatalogentry",
+            name="checksum",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="filecatalogentry",
+            name="file_size",
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="filecatalogentry",
+            name="mime_type",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="filecatalogentry",
+            name="page_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
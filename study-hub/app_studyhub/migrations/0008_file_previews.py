@@ -0,0 +1,114 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:04
+
+import itertools
+
+import app_studyhub.models
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def queue_file_previews(apps, schema_editor):
+    File = apps.get_model("app_studyhub", "File")
+    Task = apps.get_model("app_studyhub", "Task")
+    tasks = (
+        Task(name="render_file_previews", arguments={"file_id": str(file_id)})
+        for file_id in File.objects.values_list("id", flat=True).iterator()
+    )
+    while batch := list(itertools.islice(tasks, 1000)):
+        Task.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0007_file_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="file",
+            name="preview",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                max_length=255,
+                null=True,
+                upload_to=app_studyhub.models.file_preview_upload_to,
+            ),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="previewed_file",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name="file",
+            name="thumbnail",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                max_length=255,
+                null=True,
+                upload_to=app_studyhub.models.file_preview_upload_to,
+            ),
+        ),
+        migrations.AddField(
+            model_name="filecatalogentry",
+            name="preview_url",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.AddField(
+            model_name="filecatalogentry",
+            name="thumbnail_url",
+            field=models.CharField(blank=True, max_length=1024),
+        ),
+        migrations.CreateModel(
+            name="Task",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("arguments", models.JSONField(default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("run_after", models.DateTimeField(default=django.utils.timezone.now)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Task",
+                "verbose_name_plural": "Tasks",
+                "db_table": "studyhub_task",
+                "ordering": ["-date_created"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status__in", ["pending", "running"])),
+                        fields=["status", "run_after"],
+                        name="studyhub_task_queue_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(queue_file_previews, migrations.RunPython.noop),
+    ]
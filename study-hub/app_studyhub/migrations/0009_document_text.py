@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:08
+
+import app_studyhub.search
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# The extracted texts are compressed by TOAST, with LZ4 (faster to decompress
+# for the snippets) when the server is built with it, otherwise with pglz.
+SET_TEXT_COMPRESSION_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_settings
+        WHERE name = 'default_toast_compression' AND 'lz4' = ANY(enumvals)
+    ) THEN
+        ALTER TABLE studyhub_document_text ALTER COLUMN text SET COMPRESSION lz4;
+    END IF;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0008_file_previews"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="filecatalogentry",
+            name="checksum",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name="DocumentText",
+            fields=[
+                (
+                    "sha256",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("text", models.TextField()),
+                (
+                    "search_vector",
+                    models.GeneratedField(
+                        db_persist=True,
+                        expression=app_studyhub.search.Strip(
+                            django.contrib.postgres.search.SearchVector(
+                                "text", config="studyhub_search"
+                            )
+                        ),
+                        output_field=django.contrib.postgres.search.SearchVectorField(),
+                    ),
+                ),
+                ("date_extracted", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Document text",
+                "verbose_name_plural": "Document texts",
+                "db_table": "studyhub_document_text",
+                "indexes": [
+                    django.contrib.postgres.indexes.GinIndex(
+                        fields=["search_vector"], name="studyhub_document_search_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(SET_TEXT_COMPRESSION_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app_studyhub", "0009_document_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="cover_image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="subcategory",
+            name="cover_image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -1,12 +1,30 @@
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
 from pathlib import Path
 
 from autoslug import AutoSlugField
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.files.base import File as DjangoFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .blobs import BLOB_MAX_WORKERS, BlobSource, blob_upload_to, hash_content
+from .images import COVER_IMAGE_WIDTHS, delete_image_variants, update_image_variants
+from .invalidation import publish_versions
+from .metadata import inspect_content
+from .search import SEARCH_CONFIG, Strip
+
 # get the current user model instead of importing directly
 current_user_model = get_user_model()
 
@@ -22,6 +40,17 @@ def cover_image_upload_to(instance, filename) -> str:
     return upload_to
 
 
+def file_preview_upload_to(instance, filename) -> str:
+    """Generate file path and file name for thumbnails and previews of files."""
+
+    filepath = Path(filename)
+    file_extension = filepath.suffix.lower()
+    obj_id = instance.id
+    preview_kind = filepath.stem
+    upload_to = f"images/file-{preview_kind}s/{obj_id}_{preview_kind}{file_extension}"
+    return upload_to
+
+
 class BaseAppModel(models.Model):
     """
     The purpose of this Abstract base model is to stop repeating/duplicating code
@@ -59,6 +88,8 @@ class BaseAppModel(models.Model):
         blank=True,
         null=True,
     )
+    # resized WebP copies of the cover image, rendered when it is saved (see images.py)
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         abstract = True
@@ -113,6 +144,163 @@ class Subcategory(BaseAppModel):
         )
 
 
+class BlobManager(models.Manager):
+    """Manager storing each content once and deleting the unreferenced ones."""
+
+    def store(self, sources, storage=None, max_workers=BLOB_MAX_WORKERS):
+        """
+        Store the contents of the sources (BlobSource objects) and set their
+        Blob object, or their error.
+
+        The contents are hashed (and inspected, see metadata.py) in parallel,
+        then only the ones which are not stored yet are uploaded, once per hash.
+        Queries run in this thread.
+        """
+        storage = storage or default_storage
+
+        def hash_source(source):
+            with source.open_content() as content:
+                if source.sha256 is None:
+                    source.sha256, source.size = hash_content(content)
+                source.metadata = inspect_content(
+                    content, source.filename, source.sha256
+                )
+
+        def upload_source(source):
+            with source.open_content() as content:
+                key = blob_upload_to(source.sha256, source.filename)
+                return storage.save(key, DjangoFile(content))
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="studyhub-blob"
+        ) as executor:
+            futures = {
+                source: executor.submit(hash_source, source) for source in sources
+            }
+            for source, future in futures.items():
+                source.error = future.exception()
+            hashed_sources = [source for source in sources if source.error is None]
+
+            blobs = self.in_bulk({source.sha256 for source in hashed_sources})
+            missing_sources = {}
+            for source in hashed_sources:
+                if source.sha256 not in blobs:
+                    missing_sources.setdefault(source.sha256, source)
+            futures = {
+                sha256: executor.submit(upload_source, source)
+                for sha256, source in missing_sources.items()
+            }
+            new_blobs = []
+            for sha256, future in futures.items():
+                source = missing_sources[sha256]
+                source.error = future.exception()
+                if source.error is None:
+                    new_blobs.append(
+                        self.model(
+                            sha256=sha256,
+                            storage_name=future.result(),
+                            size=source.size,
+                        )
+                    )
+
+        if new_blobs:
+            self.bulk_create(new_blobs, ignore_conflicts=True)
+            blobs.update(self.in_bulk([blob.sha256 for blob in new_blobs]))
+            for blob in new_blobs:
+                # the same content was stored in the meantime (e.g. by another import)
+                if blobs[blob.sha256].storage_name != blob.storage_name:
+                    storage.delete(blob.storage_name)
+        for source in hashed_sources:
+            if source.sha256 in blobs:
+                source.blob = blobs[source.sha256]
+            else:
+                source.error = missing_sources[source.sha256].error
+        return sources
+
+    def release(self, blob_ids, storage=None):
+        """
+        Delete the given blobs which are not referenced by any file anymore,
+        their stored objects are deleted once the transaction is committed.
+        """
+        storage = storage or default_storage
+        with transaction.atomic():
+            unreferenced_blobs = list(
+                self.select_for_update()
+                .filter(pk__in=blob_ids)
+                .exclude(Exists(File.objects.filter(blob=OuterRef("pk"))))
+                .values_list("pk", "storage_name")
+            )
+            if not unreferenced_blobs:
+                return
+            self.filter(pk__in=[pk for pk, storage_name in unreferenced_blobs]).delete()
+
+            def delete_stored_objects():
+                for pk, storage_name in unreferenced_blobs:
+                    storage.delete(storage_name)
+
+            transaction.on_commit(delete_stored_objects, robust=True)
+
+
+class Blob(models.Model):
+    """
+    Blob model is a stored content identified by its SHA-256, the files with
+    the same content (e.g. a textbook of several subjects) share its object.
+    A blob is deleted when no file references it anymore.
+    """
+
+    sha256 = models.CharField(primary_key=True, max_length=64)
+    storage_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+    class Meta:
+        db_table = "studyhub_blob"
+        verbose_name = _("Blob")
+        verbose_name_plural = _("Blobs")
+
+    def __str__(self):
+        return self.sha256
+
+
+class BlobFieldFile(FieldFile):
+    """File of a BlobFileField, its content is stored as a Blob."""
+
+    def save(self, name, content, save=True):
+        def open_content():
+            content.seek(0)
+            return nullcontext(content)
+
+        source = BlobSource(name, open_content)
+        Blob.objects.store([source], self.storage, max_workers=1)
+        if source.error is not None:
+            raise source.error
+
+        instance = self.instance
+        if instance.blob_id != source.blob.pk:
+            # released once the instance is saved (see release_replaced_blob)
+            instance._replaced_blob_id = instance.blob_id
+        instance.blob = source.blob
+        instance.set_metadata(source.metadata)
+        self.name = source.blob.storage_name
+        setattr(instance, self.field.attname, self.name)
+        self._committed = True
+        if save:
+            instance.save()
+
+    save.alters_data = True
+
+
+class BlobFileField(models.FileField):
+    """
+    FileField whose uploaded contents are stored once (see Blob), the model
+    has a "blob" foreign key declared after this field.
+    """
+
+    attr_class = BlobFieldFile
+
+
 class File(BaseAppModel):
     """
     File model contains information of uploaded files/documents (PDF, docx, pptx, ...)
@@ -143,6 +331,7 @@ class File(BaseAppModel):
     is_active = None  # don't use this field
     description = None  # don't use this field
     cover_image = None  # don't use this field
+    cover_image_variants = None  # don't use this field
 
     subcategory = models.ForeignKey(
         to=Subcategory,
@@ -159,10 +348,612 @@ class File(BaseAppModel):
         choices=FileLanguage,
         default=FileLanguage.ENGLISH,
     )
-    uploaded_file = models.FileField(upload_to=file_upload_to, max_length=255)
+    # the contents are stored as blobs, except the ones uploaded straight to the
+    # storage by the browser (see uploads.py) which keep file_upload_to keys
+    uploaded_file = BlobFileField(upload_to=file_upload_to, max_length=255)
+    # after uploaded_file, whose pre_save sets it
+    blob = models.ForeignKey(
+        to=Blob,
+        on_delete=models.PROTECT,
+        related_name="files",
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
+    # Search fields are maintained by database triggers (see migration 0003)
+    # from the name of the file and the names of its subject and category.
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+    search_document = models.TextField(blank=True, null=True, editable=False)
+
+    # first page of the content, rendered by a background task (see previews.py)
+    thumbnail = models.FileField(
+        upload_to=file_preview_upload_to,
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    preview = models.FileField(
+        upload_to=file_preview_upload_to,
+        max_length=255,
+        blank=True,
+        null=True,
+        editable=False,
+    )
+    # name of the uploaded file from which they were rendered
+    previewed_file = models.CharField(max_length=255, blank=True, editable=False)
+
+    # metadata of the content, extracted when it is uploaded (see metadata.py)
+    # or by "manage.py backfill_file_metadata"
+    file_size = models.PositiveBigIntegerField(blank=True, null=True, editable=False)
+    mime_type = models.CharField(max_length=255, blank=True, editable=False)
+    page_count = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    checksum = models.CharField(max_length=64, blank=True, editable=False)
 
     class Meta:
         db_table = "studyhub_file"
         verbose_name = _("File")
         verbose_name_plural = _("Files")
         ordering = ["-last_modified", "-date_created"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="studyhub_file_search_idx"),
+            GinIndex(
+                fields=["search_document"],
+                opclasses=["gin_trgm_ops"],
+                name="studyhub_file_trigram_idx",
+            ),
+        ]
+
+    def set_metadata(self, metadata):
+        """Set the metadata fields from a FileMetadata object."""
+        self.file_size = metadata.size
+        self.mime_type = metadata.mime_type
+        self.page_count = metadata.page_count
+        self.checksum = metadata.checksum
+
+
+class FileCatalogEntryManager(models.Manager):
+    """Manager keeping the file catalog (read model) in sync with File objects."""
+
+    batch_size = 1000
+
+    def build_entry(self, file):
+        """Return the (unsaved) catalog entry of a File object."""
+        updated_at = file.last_modified or file.date_created
+        return self.model(
+            file_id=file.id,
+            subcategory_id=file.subcategory_id,
+            name=file.name,
+            category_name=file.subcategory.category.name,
+            subcategory_name=file.subcategory.name,
+            file_type=file.file_type,
+            file_language=file.file_language,
+            uploaded_file_url=file.uploaded_file.url,
+            file_size=file.file_size,
+            mime_type=file.mime_type,
+            page_count=file.page_count,
+            checksum=file.checksum,
+            thumbnail_url=file.thumbnail.url if file.thumbnail else "",
+            preview_url=file.preview.url if file.preview else "",
+            updated_at=updated_at,
+            last_modified=updated_at.date().strftime("%d/%m/%Y"),
+        )
+
+    def refresh(self, files):
+        """Create or update the catalog entries of a queryset of File objects."""
+        files = files.select_related("subcategory__category").defer(
+            "search_vector", "search_document"
+        )
+        entries = []
+        for file in files.iterator(chunk_size=self.batch_size):
+            entries.append(self.build_entry(file))
+            if len(entries) >= self.batch_size:
+                self._upsert(entries)
+                entries = []
+        if entries:
+            self._upsert(entries)
+
+    def active(self):
+        """Return the entries of the active subcategories and categories."""
+        return self.filter(
+            subcategory__is_active=True, subcategory__category__is_active=True
+        )
+
+    def rebuild(self):
+        """Rebuild the whole catalog from the File table."""
+        with transaction.atomic():
+            self.all().delete()
+            self.refresh(File.objects.all())
+            CatalogVersion.objects.bump_all()
+
+    def _upsert(self, entries):
+        self.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["file"],
+            update_fields=[
+                field.name
+                for field in self.model._meta.concrete_fields
+                if not field.primary_key
+            ],
+        )
+
+
+class FileCatalogEntry(models.Model):
+    """
+    FileCatalogEntry model is the flat, denormalized copy of File model
+    with exactly the columns needed by the listings of files,
+    so they are served from a single table without any join.
+
+    It is maintained on write by the signal receivers below
+    and can be rebuilt with "manage.py rebuild_catalog".
+    """
+
+    file = models.OneToOneField(
+        to=File,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name="catalog_entry",
+    )
+    subcategory = models.ForeignKey(
+        to=Subcategory,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    name = models.CharField(max_length=255)
+    category_name = models.CharField(max_length=255)
+    subcategory_name = models.CharField(max_length=255)
+    # choice values, the labels are translated when they are displayed
+    file_type = models.CharField(max_length=20, choices=File.FileType)
+    file_language = models.CharField(max_length=20, choices=File.FileLanguage)
+    uploaded_file_url = models.CharField(max_length=1024)
+    file_size = models.PositiveBigIntegerField(blank=True, null=True)
+    mime_type = models.CharField(max_length=255, blank=True)
+    page_count = models.PositiveIntegerField(blank=True, null=True)
+    # links the entry to the text of its content (content search)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    thumbnail_url = models.CharField(max_length=1024, blank=True)
+    preview_url = models.CharField(max_length=1024, blank=True)
+    # last modified (or created) date, for ordering and for display
+    updated_at = models.DateTimeField()
+    last_modified = models.CharField(max_length=10)
+
+    objects = FileCatalogEntryManager()
+
+    class Meta:
+        db_table = "studyhub_file_catalog"
+        verbose_name = _("File catalog entry")
+        verbose_name_plural = _("File catalog entries")
+        ordering = ["-updated_at", "name"]
+        indexes = [
+            models.Index(
+                fields=["-updated_at", "name"],
+                name="studyhub_catalog_updated_idx",
+            ),
+            models.Index(
+                fields=["subcategory", "-updated_at", "name"],
+                name="studyhub_catalog_subcat_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class DocumentTextManager(models.Manager):
+    """Manager of the texts extracted from the contents of the files."""
+
+    batch_size = 100
+
+    def store(self, texts):
+        """Create or replace the texts of contents, given as {sha256: text}."""
+        self.bulk_create(
+            [self.model(sha256=sha256, text=text) for sha256, text in texts.items()],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=["sha256"],
+            update_fields=["text", "date_extracted"],
+        )
+
+
+class DocumentText(models.Model):
+    """
+    DocumentText model stores the plain text of the content (PDF, docx, pptx)
+    of files, extracted once per content (see extraction.py): files are linked
+    to it by their checksum. The text is compressed by PostgreSQL (TOAST, see
+    migration 0009) and indexed for the content search of the "Search" page.
+    """
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    text = models.TextField()
+    # positions are stripped: the index stays small and no phrase search is needed
+    search_vector = models.GeneratedField(
+        expression=Strip(SearchVector("text", config=SEARCH_CONFIG)),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+    date_extracted = models.DateTimeField(auto_now=True)
+
+    objects = DocumentTextManager()
+
+    class Meta:
+        db_table = "studyhub_document_text"
+        verbose_name = _("Document text")
+        verbose_name_plural = _("Document texts")
+        indexes = [
+            GinIndex(fields=["search_vector"], name="studyhub_document_search_idx"),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
+
+class CatalogVersionManager(models.Manager):
+    """Manager of the version stamps of the file catalog."""
+
+    def bump(self, *scopes):
+        """Increase the version of the given scopes (subcategory ids or GLOBAL)."""
+        now = timezone.now()
+        for scope in set(scopes):
+            if scope is None:
+                continue
+            bumped = self.filter(scope=scope).update(
+                version=F("version") + 1, last_modified=now
+            )
+            if not bumped:
+                _, created = self.get_or_create(
+                    scope=scope, defaults={"version": 1, "last_modified": now}
+                )
+                if not created:
+                    self.filter(scope=scope).update(
+                        version=F("version") + 1, last_modified=now
+                    )
+
+    def bump_all(self):
+        """Increase the version of every scope."""
+        self.update(version=F("version") + 1, last_modified=timezone.now())
+        self.bump(self.model.GLOBAL)
+
+    def get_stamp_queryset(self, subcategory_slug=None):
+        """Return the query of the version stamp (see get_stamp)."""
+        if subcategory_slug is None:
+            scope = self.model.GLOBAL
+        else:
+            subcategory_ids = Subcategory.objects.filter(
+                slug_name=subcategory_slug
+            ).values("id")
+            scope = Subquery(subcategory_ids[:1])
+        return self.filter(scope=scope).values_list("version", "last_modified")
+
+    def get_stamp(self, subcategory_slug=None):
+        """
+        Return (version, last_modified) of the whole catalog or of the
+        subcategory with the given slug, with one query, or None.
+        """
+        return self.get_stamp_queryset(subcategory_slug).first()
+
+    async def aget_stamp(self, subcategory_slug=None):
+        """Asynchronous version of get_stamp()."""
+        return await self.get_stamp_queryset(subcategory_slug).afirst()
+
+
+class CatalogVersion(models.Model):
+    """
+    CatalogVersion model stores a counter (version stamp) for the whole file
+    catalog and for each subcategory. It is increased whenever the files
+    listed in the scope change, the JSON listings use it for their ETags.
+    """
+
+    # scope of the whole catalog, other scopes are subcategory ids
+    GLOBAL = uuid.UUID(int=0)
+
+    scope = models.UUIDField(primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    last_modified = models.DateTimeField()
+
+    objects = CatalogVersionManager()
+
+    class Meta:
+        db_table = "studyhub_catalog_version"
+        verbose_name = _("Catalog version")
+        verbose_name_plural = _("Catalog versions")
+
+    def __str__(self):
+        return f"{self.scope} (v{self.version})"
+
+
+class TaskManager(models.Manager):
+    """Manager of the queue of background tasks."""
+
+    def enqueue(self, name, **arguments):
+        """Queue a task, unless the same one is already pending."""
+        pending_tasks = self.filter(
+            name=name, arguments=arguments, status=self.model.Status.PENDING
+        )
+        if not pending_tasks.exists():
+            self.create(name=name, arguments=arguments)
+
+    def enqueue_many(self, name, arguments_list):
+        """Queue a task for each dictionary of arguments (with one query)."""
+        self.bulk_create(
+            [self.model(name=name, arguments=arguments) for arguments in arguments_list]
+        )
+
+    def claim(self):
+        """
+        Return the next task to run, marked as running, or None. Tasks which
+        are running for too long (their worker died) are run again.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            task = (
+                self.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=self.model.Status.PENDING, run_after__lte=now)
+                    | Q(
+                        status=self.model.Status.RUNNING,
+                        started_at__lt=now - self.model.timeout,
+                    )
+                )
+                .order_by("run_after")
+                .first()
+            )
+            if task is not None:
+                task.status = self.model.Status.RUNNING
+                task.attempts += 1
+                task.started_at = now
+                task.save(update_fields=["status", "attempts", "started_at"])
+        return task
+
+
+class Task(models.Model):
+    """
+    Task model is the queue of background tasks (e.g. rendering the previews
+    of a file), run by the worker processes of "manage.py run_tasks".
+    A task is queued in the transaction of the change which needs it.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        RUNNING = "running", _("Running")
+        DONE = "done", _("Done")
+        FAILED = "failed", _("Failed")
+
+    # a failed task is run again later, up to max_attempts times
+    max_attempts = 5
+    retry_delay = timedelta(minutes=1)
+    timeout = timedelta(minutes=30)
+
+    name = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=Status, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskManager()
+
+    class Meta:
+        db_table = "studyhub_task"
+        verbose_name = _("Task")
+        verbose_name_plural = _("Tasks")
+        ordering = ["-date_created"]
+        indexes = [
+            models.Index(
+                fields=["status", "run_after"],
+                name="studyhub_task_queue_idx",
+                condition=Q(status__in=["pending", "running"]),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    def finish(self):
+        self.status = self.Status.DONE
+        self.finished_at = timezone.now()
+        self.error = ""
+        self.save(update_fields=["status", "finished_at", "error"])
+
+    def fail(self, error):
+        """Record the error, the task is run again later unless it failed too often."""
+        now = timezone.now()
+        if self.attempts < self.max_attempts:
+            self.status = self.Status.PENDING
+            self.run_after = now + self.retry_delay * 2 ** (self.attempts - 1)
+        else:
+            self.status = self.Status.FAILED
+        self.finished_at = now
+        self.error = error
+        self.save(update_fields=["status", "run_after", "finished_at", "error"])
+
+
+# key (in the default cache) of the version of the catalog tree (see catalog.py)
+CATALOG_TREE_VERSION_KEY = "studyhub:catalog-tree-version"
+
+
+def new_catalog_tree_version() -> str:
+    return uuid.uuid4().hex
+
+
+def invalidate_catalog_tree():
+    """Make every process rebuild its catalog tree (after the commit)."""
+    publish_versions({CATALOG_TREE_VERSION_KEY: new_catalog_tree_version()})
+
+
+# prefix of the keys (in the default cache) of the versions of the tags of the
+# cached pages (see pagecache.py): "categories", "category:<id>", "subcategory:<id>"
+PAGE_TAG_KEY_PREFIX = "studyhub:page-tag"
+
+
+def page_tag_key(tag) -> str:
+    return f"{PAGE_TAG_KEY_PREFIX}:{tag}"
+
+
+def invalidate_pages(*tags):
+    """Make the cached pages which depend on any of the tags stale (after the commit)."""
+    publish_versions({page_tag_key(tag): uuid.uuid4().hex for tag in tags})
+
+
+@receiver(signal=post_save, sender=File)
+def update_catalog_on_file_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # the file may have been moved from another subcategory
+        previous_subcategory_id = (
+            FileCatalogEntry.objects.filter(file_id=instance.pk)
+            .values_list("subcategory_id", flat=True)
+            .first()
+        )
+        FileCatalogEntry.objects.refresh(File.objects.filter(pk=instance.pk))
+        CatalogVersion.objects.bump(
+            CatalogVersion.GLOBAL, instance.subcategory_id, previous_subcategory_id
+        )
+        invalidate_pages(
+            *{
+                f"subcategory:{subcategory_id}"
+                for subcategory_id in (instance.subcategory_id, previous_subcategory_id)
+                if subcategory_id is not None
+            }
+        )
+
+
+@receiver(signal=post_save, sender=Subcategory)
+def update_catalog_on_subcategory_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        FileCatalogEntry.objects.refresh(File.objects.filter(subcategory=instance))
+        CatalogVersion.objects.bump(CatalogVersion.GLOBAL, instance.pk)
+
+
+@receiver(signal=post_save, sender=Category)
+def update_catalog_on_category_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        FileCatalogEntry.objects.refresh(
+            File.objects.filter(subcategory__category=instance)
+        )
+        CatalogVersion.objects.bump(
+            CatalogVersion.GLOBAL,
+            *instance.subcategories.values_list("id", flat=True),
+        )
+
+
+@receiver(signal=post_save, sender=Category)
+@receiver(signal=post_save, sender=Subcategory)
+def update_cover_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_image_variants(instance, "cover_image", COVER_IMAGE_WIDTHS)
+
+
+@receiver(signal=post_delete, sender=Category)
+@receiver(signal=post_delete, sender=Subcategory)
+def delete_cover_image_variants(sender, instance, **kwargs):
+    variants = instance.cover_image_variants
+    storage = instance.cover_image.storage
+    transaction.on_commit(lambda: delete_image_variants(variants, storage), robust=True)
+
+
+@receiver(signal=[post_save, post_delete], sender=Category)
+@receiver(signal=[post_save, post_delete], sender=Subcategory)
+@receiver(signal=[post_save, post_delete], sender=File)
+def invalidate_catalog_tree_on_change(sender, instance, **kwargs):
+    invalidate_catalog_tree()
+
+
+@receiver(signal=[post_save, post_delete], sender=Category)
+def invalidate_pages_on_category_change(sender, instance, **kwargs):
+    # the categories are listed by the menu of every page
+    invalidate_pages("categories")
+
+
+@receiver(signal=pre_save, sender=Subcategory)
+def remember_previous_category(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._previous_category_id = (
+            Subcategory.objects.filter(pk=instance.pk)
+            .values_list("category_id", flat=True)
+            .first()
+        )
+
+
+@receiver(signal=[post_save, post_delete], sender=Subcategory)
+def invalidate_pages_on_subcategory_change(sender, instance, **kwargs):
+    # the subcategory may have been moved from another category
+    previous_category_id = instance.__dict__.pop("_previous_category_id", None)
+    invalidate_pages(
+        *{
+            f"category:{category_id}"
+            for category_id in (instance.category_id, previous_category_id)
+            if category_id is not None
+        },
+        f"subcategory:{instance.pk}",
+    )
+
+
+@receiver(signal=post_delete, sender=File)
+def invalidate_pages_on_file_delete(sender, instance, **kwargs):
+    invalidate_pages(f"subcategory:{instance.subcategory_id}")
+
+
+@receiver(signal=post_save, sender=File)
+def release_replaced_blob(sender, instance, raw=False, **kwargs):
+    replaced_blob_id = instance.__dict__.pop("_replaced_blob_id", None)
+    if replaced_blob_id is not None:
+        Blob.objects.release([replaced_blob_id])
+
+
+@receiver(signal=post_delete, sender=File)
+def release_blob_on_file_delete(sender, instance, **kwargs):
+    if instance.blob_id is not None:
+        Blob.objects.release([instance.blob_id])
+
+
+@receiver(signal=post_save, sender=File)
+def queue_file_tasks(sender, instance, raw=False, **kwargs):
+    if raw or not instance.uploaded_file:
+        return
+    if instance.uploaded_file.name != instance.previewed_file:
+        Task.objects.enqueue("render_file_previews", file_id=str(instance.pk))
+    # the text is extracted once per content, whatever the previews became
+    if not (
+        instance.checksum
+        and DocumentText.objects.filter(sha256=instance.checksum).exists()
+    ):
+        Task.objects.enqueue("extract_file_text", file_id=str(instance.pk))
+
+
+@receiver(signal=post_delete, sender=File)
+def delete_file_previews(sender, instance, **kwargs):
+    names = [name for name in (instance.thumbnail.name, instance.preview.name) if name]
+    if not names:
+        return
+    storage = instance.thumbnail.storage
+
+    def delete_stored_previews():
+        for name in names:
+            storage.delete(name)
+
+    transaction.on_commit(delete_stored_previews, robust=True)
+
+
+@receiver(signal=post_delete, sender=File)
+def update_catalog_on_file_delete(sender, instance, **kwargs):
+    FileCatalogEntry.objects.filter(file_id=instance.pk).delete()
+    CatalogVersion.objects.bump(CatalogVersion.GLOBAL, instance.subcategory_id)
+
+
+@receiver(signal=post_delete, sender=Subcategory)
+def update_catalog_on_subcategory_delete(sender, instance, **kwargs):
+    FileCatalogEntry.objects.filter(subcategory_id=instance.pk).delete()
+    CatalogVersion.objects.filter(scope=instance.pk).delete()
+    CatalogVersion.objects.bump(CatalogVersion.GLOBAL)
+
+
+@receiver(signal=post_delete, sender=Category)
+def update_catalog_on_category_delete(sender, instance, **kwargs):
+    FileCatalogEntry.objects.filter(subcategory__category_id=instance.pk).delete()
+    CatalogVersion.objects.bump(CatalogVersion.GLOBAL)
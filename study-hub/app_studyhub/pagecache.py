@@ -0,0 +1,206 @@
+import hashlib
+import re
+import uuid
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import Resolver404, resolve
+from django.utils.translation import get_language
+
+from .catalog import aget_catalog_tree, get_catalog_tree
+from .models import page_tag_key
+from .routers import use_primary
+
+# URL names of the pages cached for the anonymous visitors
+CACHED_URL_NAMES = {
+    "home-view",
+    "category-list-view",
+    "category-detail-view",
+    "subcategory-detail-view",
+}
+PAGE_CACHE_KEY_PREFIX = "studyhub:page"
+# Seconds a page stays cached: the tags make it stale, this only frees the memory
+PAGE_CACHE_TIMEOUT = 24 * 60 * 60
+# CSRF token of the forms of a page, replaced by the one of each visitor on hits
+CSRF_TOKEN_PLACEHOLDER = b"__studyhub_csrf_token__"
+CSRF_TOKEN_PATTERN = re.compile(rb'(name="csrfmiddlewaretoken" value=")[a-zA-Z0-9]+"')
+CSRF_TOKEN_REPLACEMENT = rb"\g<1>" + CSRF_TOKEN_PLACEHOLDER + rb'"'
+
+
+@lru_cache(maxsize=1024)
+def resolve_cached_page(path):
+    """Return (URL name, URL kwargs) of a cached page, or None for other paths."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return None
+    if match.url_name not in CACHED_URL_NAMES:
+        return None
+    return match.url_name, match.kwargs
+
+
+def get_page_tags(path, catalog_tree):
+    """
+    Return the tags of the data a cached page is made of, or None when the
+    page is not cached. Every page lists the categories (menu), a category
+    page lists its subcategories. No query: the catalog tree is in memory.
+    """
+    resolved = resolve_cached_page(path)
+    if resolved is None:
+        return None
+    url_name, kwargs = resolved
+
+    if url_name == "category-detail-view":
+        category = catalog_tree.get_category(kwargs["slug_name"])
+        if category is None:
+            return None
+        return ["categories", f"category:{category.id}"]
+    if url_name == "subcategory-detail-view":
+        subcategory = catalog_tree.get_subcategory(
+            kwargs["category_slugname"], kwargs["subcategory_slugname"]
+        )
+        if subcategory is None:
+            return None
+        return ["categories", f"subcategory:{subcategory.id}"]
+    return ["categories"]
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Full-page cache of the catalog pages for the anonymous visitors, keyed on
+    the path and the active language (after LocaleMiddleware).
+
+    A cached page records the versions of its tags (see get_page_tags) and
+    is stale as soon as one of them changes (see models.invalidate_pages),
+    so it is invalidated precisely when its categories or subcategories change.
+    A hit costs one cache lookup: no session, no authentication, no query.
+    It must be after CsrfViewMiddleware, which sets the CSRF cookie of hits.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_cacheable_request(request) or (
+            resolve_cached_page(request.path_info) is None
+        ):
+            return self.get_response(request)
+        tags = get_page_tags(request.path_info, get_catalog_tree())
+        if tags is None:
+            return self.get_response(request)
+
+        page_key = self.get_page_key(request)
+        tag_keys = [page_tag_key(tag) for tag in tags]
+        values = cache.get_many([page_key, *tag_keys])
+        versions = [values.get(key) for key in tag_keys]
+        page = values.get(page_key)
+        if page is not None and page["versions"] == versions:
+            return self.build_response(request, page)
+
+        if None in versions:
+            # a page is never recorded with an unknown version
+            for key in tag_keys:
+                cache.add(key, uuid.uuid4().hex, None)
+            values = cache.get_many(tag_keys)
+            versions = [values.get(key) for key in tag_keys]
+        # the versions are read before the page is rendered: a change
+        # meanwhile makes it stale at once. A lagging replica would cache
+        # a stale page with the new versions.
+        with use_primary():
+            response = self.get_response(request)
+        if self.is_cacheable_response(request, response):
+            cache.set(page_key, self.make_page(response, versions), PAGE_CACHE_TIMEOUT)
+        response.headers["X-Page-Cache"] = "miss"
+        return response
+
+    async def __acall__(self, request):
+        """Asynchronous version of __call__() (ASGI)."""
+        if not self.is_cacheable_request(request) or (
+            resolve_cached_page(request.path_info) is None
+        ):
+            return await self.get_response(request)
+        tags = get_page_tags(request.path_info, await aget_catalog_tree())
+        if tags is None:
+            return await self.get_response(request)
+
+        page_key = self.get_page_key(request)
+        tag_keys = [page_tag_key(tag) for tag in tags]
+        values = await cache.aget_many([page_key, *tag_keys])
+        versions = [values.get(key) for key in tag_keys]
+        page = values.get(page_key)
+        if page is not None and page["versions"] == versions:
+            return self.build_response(request, page)
+
+        if None in versions:
+            for key in tag_keys:
+                await cache.aadd(key, uuid.uuid4().hex, None)
+            values = await cache.aget_many(tag_keys)
+            versions = [values.get(key) for key in tag_keys]
+        with use_primary():
+            response = await self.get_response(request)
+        if self.is_cacheable_response(request, response):
+            await cache.aset(
+                page_key, self.make_page(response, versions), PAGE_CACHE_TIMEOUT
+            )
+        response.headers["X-Page-Cache"] = "miss"
+        return response
+
+    def get_page_key(self, request):
+        path_digest = hashlib.sha256(request.path_info.encode()).hexdigest()[:32]
+        return f"{PAGE_CACHE_KEY_PREFIX}:{get_language()}:{path_digest}"
+
+    def make_page(self, response, versions):
+        """Return the cached page of a response, without its CSRF tokens."""
+        return {
+            "versions": versions,
+            "content": CSRF_TOKEN_PATTERN.sub(CSRF_TOKEN_REPLACEMENT, response.content),
+            "headers": dict(response.headers),
+        }
+
+    def is_cacheable_request(self, request):
+        """Anonymous visitors (no session, no pending message) browsing pages."""
+        # META rather than request.headers, which parses all the headers
+        return (
+            request.method in ("GET", "HEAD")
+            and not request.META.get("QUERY_STRING")
+            and request.META.get("HTTP_X_REQUESTED_WITH") != "XMLHttpRequest"
+            and "HTTP_AUTHORIZATION" not in request.META
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and "messages" not in request.COOKIES
+        )
+
+    def is_cacheable_response(self, request, response):
+        session = getattr(request, "session", None)
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not (session is not None and session.modified)
+            and "private" not in response.headers.get("Cache-Control", "")
+            and "no-store" not in response.headers.get("Cache-Control", "")
+        )
+
+    def build_response(self, request, page):
+        content = page["content"]
+        if CSRF_TOKEN_PLACEHOLDER in content:
+            if "CSRF_COOKIE" not in request.META:
+                # new visitor: the CSRF cookie is set by CsrfViewMiddleware
+                get_token(request)
+            # the secret of the cookie is a valid token too, it is not masked
+            # (against BREACH) as cached pages reflect nothing of the request
+            csrf_secret = request.META["CSRF_COOKIE"]
+            content = content.replace(CSRF_TOKEN_PLACEHOLDER, csrf_secret.encode())
+        response = HttpResponse(content, headers=page["headers"])
+        response.headers["X-Page-Cache"] = "hit"
+        return response
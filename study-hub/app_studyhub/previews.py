@@ -0,0 +1,115 @@
+import shutil
+import subprocess
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from .metadata import detect_mime_type, open_stored_file
+from .models import CatalogVersion, File, FileCatalogEntry
+
+# Largest size (pixels) of the thumbnails shown in the listings of files
+THUMBNAIL_SIZE = (160, 224)
+# Largest size (pixels) of the low resolution previews of the first page
+PREVIEW_SIZE = (640, 896)
+PREVIEW_QUALITY = 75
+# Resolution (DPI) at which the first page of a PDF is rendered
+PDF_RESOLUTION = 72
+# Seconds after which the rendering of a page is given up
+RASTERIZER_TIMEOUT = 120
+
+
+def rasterize_pdf(path, directory):
+    """Render the first page of a PDF as PNG with the local rasteriser (Poppler)."""
+    output_prefix = Path(directory, "first-page")
+    subprocess.run(
+        [
+            settings.PDF_RASTERIZER,
+            "-f",
+            "1",
+            "-l",
+            "1",
+            "-r",
+            str(PDF_RESOLUTION),
+            "-png",
+            "-singlefile",
+            str(path),
+            str(output_prefix),
+        ],
+        check=True,
+        capture_output=True,
+        timeout=RASTERIZER_TIMEOUT,
+    )
+    return Image.open(output_prefix.with_suffix(".png"))
+
+
+def render_first_page(path, mime_type, directory):
+    """Return the first page of a document as an image, or None if not supported."""
+    if mime_type == "application/pdf":
+        return rasterize_pdf(path, directory)
+    if mime_type.startswith("image/"):
+        return Image.open(path)
+    return None
+
+
+def encode_jpeg(image, size):
+    image = image.copy()
+    image.thumbnail(size)
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def render_file_previews(file_id):
+    """
+    Render the thumbnail and the preview of the first page of a file
+    (background task, queued when the file is created or replaced).
+    """
+    file_obj = File.objects.filter(pk=file_id).first()
+    if file_obj is None or file_obj.previewed_file == file_obj.uploaded_file.name:
+        return
+    source_name = file_obj.uploaded_file.name
+    previous_names = {file_obj.thumbnail.name, file_obj.preview.name}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, f"original{Path(source_name).suffix.lower()}")
+        with open_stored_file(source_name) as content, open(path, "wb") as f:
+            shutil.copyfileobj(content, f)
+        mime_type = file_obj.mime_type
+        if not mime_type:
+            with open(path, "rb") as f:
+                mime_type = detect_mime_type(f.read(16), source_name)
+
+        image = render_first_page(path, mime_type, directory)
+        if image is None:
+            file_obj.thumbnail = file_obj.preview = None
+        else:
+            with image:
+                image = image.convert("RGB")
+            file_obj.thumbnail.save(
+                "thumbnail.jpg", encode_jpeg(image, THUMBNAIL_SIZE), save=False
+            )
+            file_obj.preview.save(
+                "preview.jpg", encode_jpeg(image, PREVIEW_SIZE), save=False
+            )
+
+    new_names = {file_obj.thumbnail.name, file_obj.preview.name}
+    # the file may have been replaced meanwhile, then its own task renders it
+    updated = File.objects.filter(pk=file_id, uploaded_file=source_name).update(
+        thumbnail=file_obj.thumbnail.name,
+        preview=file_obj.preview.name,
+        previewed_file=source_name,
+    )
+    if updated:
+        FileCatalogEntry.objects.refresh(File.objects.filter(pk=file_id))
+        CatalogVersion.objects.bump(CatalogVersion.GLOBAL, file_obj.subcategory_id)
+        stale_names = previous_names - new_names
+    else:
+        stale_names = new_names
+    storage = file_obj.thumbnail.storage
+    for name in stale_names:
+        if name:
+            storage.delete(name)
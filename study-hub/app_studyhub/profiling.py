@@ -0,0 +1,242 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .querybudget import QueryRecorder, arecord_queries, record_queries
+
+logger = logging.getLogger(__name__)
+
+# Query parameter of the staff requests to profile: "inline" returns the
+# report instead of the response, "save" stores it (see PROFILE_DIRECTORY)
+PROFILE_PARAMETER = "_profile"
+# Storage directory of the saved reports
+PROFILE_DIRECTORY = "profiles"
+# Functions listed in the reports, by cumulative time
+PROFILE_TOP_FUNCTIONS = 40
+# Characters of SQL kept per query of the timeline
+PROFILE_SQL_LENGTH = 300
+# Seconds a profile waits for the running requests of the event loop (ASGI)
+PROFILE_WAIT_TIMEOUT = 5.0
+
+# cProfile records every thread of the process: one profile at a time
+_profile_lock = threading.Lock()
+# ASGI: requests of the event loop inside the middleware, and the event set
+# at the end of the running profile (None without profile)
+_async_requests = 0
+_async_profile_ended = None
+
+
+class SQLTimeline(QueryRecorder):
+    """QueryRecorder also keeping the start and the SQL of each query."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return super().__call__(execute, sql, params, many, context)
+        finally:
+            self.queries.append(
+                (
+                    started - self.started,
+                    time.perf_counter() - started,
+                    context["connection"].alias,
+                    sql,
+                )
+            )
+
+
+def build_report(request, response, profiler, timeline, duration):
+    """Return the text report of a profiled request."""
+    match = request.resolver_match
+    report = io.StringIO()
+    report.write(
+        f"{request.method} {request.get_full_path()}\n"
+        f"view: {match.view_name if match is not None else '-'}, "
+        f"status: {response.status_code}, "
+        f"time: {duration * 1000:.1f}ms, "
+        f"queries: {timeline.count} ({timeline.duration * 1000:.1f}ms)\n"
+        f"profiled at {timezone.now().isoformat()}\n\n"
+    )
+    report.write("Top functions (by cumulative time)\n")
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+
+    report.write("SQL timeline (start, duration, database)\n")
+    for started, query_duration, alias, sql in timeline.queries:
+        report.write(
+            f"{started * 1000:9.1f}ms {query_duration * 1000:8.1f}ms {alias:<10} "
+            f"{sql[:PROFILE_SQL_LENGTH]}\n"
+        )
+    return report.getvalue()
+
+
+def save_report(request, report):
+    """Store a report, return its name in the default storage."""
+    match = request.resolver_match
+    view_name = match.url_name if match is not None else "unresolved"
+    name = (
+        f"{PROFILE_DIRECTORY}/{timezone.now():%Y%m%d-%H%M%S}-{view_name}-"
+        f"{uuid.uuid4().hex[:8]}.txt"
+    )
+    return default_storage.save(name, ContentFile(report.encode()))
+
+
+class ProfilerMiddleware:
+    """
+    Profile the view of a request with cProfile and report its top functions
+    and its SQL timeline:
+
+    - on demand, for the staff users adding ?_profile=inline (the report is
+      returned instead of the page) or ?_profile=save (it is stored under
+      "profiles/", named by the X-Profile-Report header);
+    - one request in PROFILER_SAMPLE_RATE (0: never), logged to the
+      "app_studyhub.profiling" logger (a rotating file, see settings.LOGGING).
+
+    The profile covers the middlewares after this one and the view, until
+    the response is returned (not its streamed content). cProfile slows the
+    profiled code down, and records the other threads (requests) of the
+    process during the profile: a request is not profiled while another one
+    is. Under ASGI the profiled request runs alone in the event loop: the new
+    requests wait for the end of its profile, which waits for the running
+    ones (PROFILE_WAIT_TIMEOUT), and a sampled request is only profiled when
+    no other one runs.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        mode = self.get_mode(request, request.user)
+        if mode is None:
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            if mode == "sample":
+                return self.get_response(request)
+            return self.get_busy_response()
+        try:
+            profiler = cProfile.Profile()
+            timeline = SQLTimeline()
+            with record_queries(timeline):
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            _profile_lock.release()
+        return self.report(request, response, mode, profiler, timeline)
+
+    async def __acall__(self, request):
+        """Asynchronous version of __call__() (ASGI)."""
+        global _async_profile_ended
+
+        mode = await self.aget_mode(request)
+        while _async_profile_ended is not None:
+            await _async_profile_ended.wait()
+        if mode == "sample" and _async_requests:
+            mode = None
+        if mode is None:
+            return await self.aget_unprofiled_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            if mode == "sample":
+                return await self.aget_unprofiled_response(request)
+            return self.get_busy_response()
+        _async_profile_ended = asyncio.Event()
+        try:
+            if not await self.await_running_requests():
+                return self.get_busy_response()
+            profiler = cProfile.Profile()
+            timeline = SQLTimeline()
+            # the queries run in the thread of the request
+            async with arecord_queries(timeline):
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            _async_profile_ended.set()
+            _async_profile_ended = None
+            _profile_lock.release()
+        # the report may be stored (e.g. on S3)
+        return await sync_to_async(self.report)(
+            request, response, mode, profiler, timeline
+        )
+
+    async def aget_unprofiled_response(self, request):
+        global _async_requests
+
+        _async_requests += 1
+        try:
+            return await self.get_response(request)
+        finally:
+            _async_requests -= 1
+
+    async def await_running_requests(self):
+        """Return whether the other requests of the event loop ended in time."""
+        deadline = time.monotonic() + PROFILE_WAIT_TIMEOUT
+        while _async_requests:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def get_mode(self, request, user):
+        """Return "inline", "save", "sample" or None (not profiled)."""
+        mode = request.GET.get(PROFILE_PARAMETER)
+        # the user (session) is only loaded for the profile requests
+        if mode in ("inline", "save") and user.is_staff:
+            return mode
+        sample_rate = settings.PROFILER_SAMPLE_RATE
+        if sample_rate and random.randrange(sample_rate) == 0:
+            return "sample"
+        return None
+
+    async def aget_mode(self, request):
+        """Asynchronous version of get_mode()."""
+        if request.GET.get(PROFILE_PARAMETER) in ("inline", "save"):
+            return self.get_mode(request, await request.auser())
+        return self.get_mode(request, None)
+
+    def get_busy_response(self):
+        return HttpResponse(
+            "Another request is being profiled, try again.",
+            status=503,
+            content_type="text/plain; charset=utf-8",
+            headers={"Retry-After": "1"},
+        )
+
+    def report(self, request, response, mode, profiler, timeline):
+        duration = time.perf_counter() - timeline.started
+        report = build_report(request, response, profiler, timeline, duration)
+        if mode == "inline":
+            return HttpResponse(report, content_type="text/plain; charset=utf-8")
+        if mode == "save":
+            response["X-Profile-Report"] = save_report(request, report)
+            return response
+        logger.info("Profile of a sampled request:\n%s", report)
+        return response
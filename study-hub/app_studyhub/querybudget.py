@@ -0,0 +1,151 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# lists of parameters (e.g. "IN (%s, %s, %s)") have the same shape whatever
+# their length
+PARAMETER_LIST_PATTERN = re.compile(r"%s(?:, %s)+")
+
+
+class QueryBudgetExceeded(Exception):
+    """A request made more queries than its budget, or the same one repeatedly."""
+
+
+def get_query_shape(sql):
+    """Return the SQL of a query without the length of its parameter lists."""
+    return PARAMETER_LIST_PATTERN.sub("%s, ...", sql)
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper (see connection.execute_wrapper) recording the
+    shape and the duration of the queries of a request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+            self.shapes[get_query_shape(sql)] += 1
+
+    def get_repeated_queries(self, threshold):
+        """Return [(shape, count)] of the reads made at least threshold times."""
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold and shape.lstrip().upper().startswith("SELECT")
+        ]
+
+
+def record_queries(recorder):
+    """Return a context manager recording the queries of all the databases."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+    return stack
+
+
+@asynccontextmanager
+async def arecord_queries(recorder):
+    """
+    Asynchronous version of record_queries(). The connections are local to
+    each thread: the recorder is installed on those of the thread running
+    the synchronous code (ORM) of the request, see ThreadSensitiveContext.
+    """
+    stack = await sync_to_async(record_queries)(recorder)
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the queries and the database time of each request, on every
+    database. A view which makes more queries than its budget (QUERY_BUDGETS
+    by URL name, QUERY_BUDGET_DEFAULT otherwise), or the same read at least
+    QUERY_REPEAT_THRESHOLD times (N+1 queries: one per row or object), is
+    logged with a structured warning. With QUERY_BUDGET_STRICT (tests), the
+    request fails with QueryBudgetExceeded.
+
+    The queries made while a streaming response is sent are not counted. The
+    recorder is kept as request.query_recorder (see MetricsMiddleware).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = request.query_recorder = QueryRecorder()
+        with record_queries(recorder):
+            response = self.get_response(request)
+        self.check_budget(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        """Asynchronous version of __call__() (ASGI)."""
+        recorder = request.query_recorder = QueryRecorder()
+        async with arecord_queries(recorder):
+            response = await self.get_response(request)
+        self.check_budget(request, recorder)
+        return response
+
+    def get_budget(self, request):
+        """Return the query budget of the view of a request, or None."""
+        match = request.resolver_match
+        view_name = match.view_name if match is not None else None
+        return settings.QUERY_BUDGETS.get(view_name, settings.QUERY_BUDGET_DEFAULT)
+
+    def check_budget(self, request, recorder):
+        budget = self.get_budget(request)
+        if budget is None or not recorder.count:
+            return
+        repeated = recorder.get_repeated_queries(settings.QUERY_REPEAT_THRESHOLD)
+        if recorder.count <= budget and not repeated:
+            return
+
+        match = request.resolver_match
+        report = {
+            "view_name": match.view_name if match is not None else None,
+            "path": request.path,
+            "queries": recorder.count,
+            "budget": budget,
+            "db_time_ms": round(recorder.duration * 1000, 2),
+            "repeated_queries": [
+                {"sql": shape, "count": count} for shape, count in repeated
+            ],
+        }
+        message = (
+            f"{report['view_name'] or request.path}: {recorder.count} queries "
+            f"(budget {budget}) in {report['db_time_ms']}ms"
+        )
+        if repeated:
+            message += f", {len(repeated)} repeated (N+1): {repeated[0][0]}"
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(
+            "Query budget exceeded by %s", message, extra={"query_budget": report}
+        )
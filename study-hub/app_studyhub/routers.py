@@ -0,0 +1,183 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.utils import load_backend
+from django.urls import Resolver404, resolve
+
+# Cookie pinning a visitor to the primary database after a write, so they
+# read their own writes while the replicas catch up
+PRIMARY_PIN_COOKIE_NAME = "studyhub_primary"
+# Seconds between two health checks of a replica (per process)
+REPLICA_HEALTH_CHECK_INTERVAL = 10.0
+# methods which do not write: any other one pins the visitor to the primary
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# database role of the current request: "replica", "primary" or None (default)
+_database_role = ContextVar("studyhub_database_role", default=None)
+# (healthy, monotonic time of the check) of the replicas, per alias
+_replica_health = {}
+
+
+def set_database_role(role):
+    """
+    Send the next reads to a replica ("replica") or to the primary
+    ("primary"), unless the primary was already chosen. Return the token
+    resetting the previous role.
+    """
+    if _database_role.get() == "primary":
+        role = "primary"
+    return _database_role.set(role)
+
+
+def current_database_role():
+    """Return the database role of the current request (see use_database)."""
+    return _database_role.get()
+
+
+@contextmanager
+def use_database(role):
+    """Send the reads of the block to a replica or to the primary."""
+    token = set_database_role(role)
+    try:
+        yield
+    finally:
+        _database_role.reset(token)
+
+
+def use_primary():
+    """
+    Read from the primary in the block, e.g. to build data cached with a
+    version (catalog tree, pages): a lagging replica would cache stale data.
+    """
+    return use_database("primary")
+
+
+def create_direct_connection(alias=DEFAULT_DB_ALIAS):
+    """
+    Return a new wrapper of a database which connects without the connection
+    pool (if any), for a connection held by a thread for its whole life.
+    """
+    settings_dict = {**connections[alias].settings_dict}
+    settings_dict["OPTIONS"] = {
+        key: value for key, value in settings_dict["OPTIONS"].items() if key != "pool"
+    }
+    backend = load_backend(settings_dict["ENGINE"])
+    return backend.DatabaseWrapper(settings_dict, alias)
+
+
+def is_replica_healthy(alias) -> bool:
+    """Return whether a replica answers, checked once per interval."""
+    healthy, checked_at = _replica_health.get(alias, (True, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < REPLICA_HEALTH_CHECK_INTERVAL:
+        return healthy
+    try:
+        connection = connections[alias]
+        connection.ensure_connection()
+        healthy = connection.is_usable()
+    except DatabaseError:
+        healthy = False
+    _replica_health[alias] = (healthy, now)
+    return healthy
+
+
+def get_replica():
+    """Return the alias of a healthy replica, or None (the primary is used)."""
+    replicas = [
+        alias for alias in settings.DATABASE_REPLICAS if is_replica_healthy(alias)
+    ]
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaRouter:
+    """
+    Database router sending the reads of the read-only views (see
+    ReplicaRoutingMiddleware) to the replicas of DATABASE_REPLICAS, the
+    other reads and all the writes to the primary (default) database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _database_role.get() == "replica":
+            return get_replica() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # also for the objects read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in settings.DATABASE_REPLICAS else None
+
+
+@lru_cache(maxsize=1024)
+def is_read_only_path(path) -> bool:
+    """Return whether the view of a path reads from a replica (use_read_replica)."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return False
+    view_class = getattr(match.func, "view_class", None)
+    return getattr(view_class, "use_read_replica", False)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Run the views with "use_read_replica = True" on a replica for the
+    requests which do not write. A visitor who writes (any other method, e.g.
+    the contact form or the admin) is pinned to the primary for
+    DATABASE_REPLICA_PIN_SECONDS by a cookie.
+
+    The role ends with the view: the rows of a streamed response, read
+    later, keep it through streaming.iter_rows() and aiter_rows().
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_database(self.get_database_role(request)):
+            response = self.get_response(request)
+        return self.pin_to_primary(request, response)
+
+    async def __acall__(self, request):
+        with use_database(self.get_database_role(request)):
+            response = await self.get_response(request)
+        return self.pin_to_primary(request, response)
+
+    def get_database_role(self, request):
+        if (
+            request.method in SAFE_METHODS
+            and PRIMARY_PIN_COOKIE_NAME not in request.COOKIES
+            and is_read_only_path(request.path_info)
+        ):
+            return "replica"
+        return None
+
+    def pin_to_primary(self, request, response):
+        if request.method not in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE_NAME,
+                "1",
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,121 @@
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Left, Lower
+from django.utils.html import escape
+
+# Name of the text search configuration created in migration 0003
+# (the "simple" configuration + accent folding by "unaccent").
+SEARCH_CONFIG = "studyhub_search"
+
+# Characters of the text of a document in which the snippets are looked for
+SNIPPET_MAX_CHARS = 100_000
+# Delimiters of the matched words in the snippets: control characters, which
+# are removed from the extracted texts, replaced once the snippet is escaped
+SNIPPET_START_SEL = "\x02"
+SNIPPET_STOP_SEL = "\x03"
+
+
+class Unaccent(Func):
+    """Remove accents (diacritics) from text, e.g. "Toán" -> "Toan"."""
+
+    function = "unaccent"
+
+
+class Strip(Func):
+    """Remove the positions (and weights) of the lexemes of a tsvector."""
+
+    function = "strip"
+
+
+def search_files(queryset, search_query, field_prefix=""):
+    """
+    Filter the queryset of File objects by the search query
+    and annotate each result with its relevance as "search_rank".
+
+    For a queryset of another model, "field_prefix" is the lookup
+    to the File model (e.g. "file__").
+
+    Full-text search (accent insensitive) on the file name, subject name and
+    category name is tried first. Only when it finds nothing, e.g. because of
+    a typo or an unfinished word, trigram similarity is used instead.
+    Both searches are served by the GIN indexes of the File model.
+    """
+
+    search_query = search_query.strip()
+    if not search_query:
+        return queryset
+
+    text_query = SearchQuery(
+        search_query, config=SEARCH_CONFIG, search_type="websearch"
+    )
+    search_vector = f"{field_prefix}search_vector"
+    text_matches = queryset.filter(**{search_vector: text_query})
+    if text_matches.exists():
+        return text_matches.annotate(
+            search_rank=SearchRank(F(search_vector), text_query)
+        )
+
+    search_document = f"{field_prefix}search_document"
+    folded_query = Unaccent(Lower(Value(search_query)))
+    return queryset.filter(
+        **{f"{search_document}__trigram_word_similar": folded_query}
+    ).annotate(search_rank=TrigramWordSimilarity(folded_query, search_document))
+
+
+def search_contents(queryset, documents, search_query):
+    """
+    Filter the queryset of FileCatalogEntry objects by the text of their
+    contents, from the queryset of DocumentText objects "documents", and
+    annotate each result with its relevance as "search_rank" and with a
+    short extract of its text around the matched words as "search_snippet".
+
+    Only the indexed texts are searched, the stored files are never read.
+    The snippets are computed by PostgreSQL for the returned rows only,
+    the matched words are between SNIPPET_START_SEL and SNIPPET_STOP_SEL.
+    """
+
+    search_query = search_query.strip()
+    if not search_query:
+        return queryset
+
+    text_query = SearchQuery(
+        search_query, config=SEARCH_CONFIG, search_type="websearch"
+    )
+    matches = documents.filter(search_vector=text_query)
+    content = matches.filter(sha256=OuterRef("checksum"))
+    return queryset.filter(checksum__in=matches.values("sha256")).annotate(
+        search_rank=Subquery(
+            content.annotate(rank=SearchRank(F("search_vector"), text_query)).values(
+                "rank"
+            )[:1]
+        ),
+        search_snippet=Subquery(
+            content.annotate(
+                snippet=SearchHeadline(
+                    Left("text", SNIPPET_MAX_CHARS),
+                    text_query,
+                    config=SEARCH_CONFIG,
+                    start_sel=SNIPPET_START_SEL,
+                    stop_sel=SNIPPET_STOP_SEL,
+                    max_words=30,
+                    min_words=15,
+                    max_fragments=2,
+                    fragment_delimiter=" … ",
+                )
+            ).values("snippet")[:1]
+        ),
+    )
+
+
+def highlight_snippet(snippet):
+    """Return the HTML of a snippet, its matched words marked with <mark>."""
+    return (
+        escape(snippet)
+        .replace(SNIPPET_START_SEL, "<mark>")
+        .replace(SNIPPET_STOP_SEL, "</mark>")
+    )
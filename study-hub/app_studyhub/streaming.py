@@ -0,0 +1,156 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .routers import current_database_role, use_database
+
+# Number of rows fetched from the database (and written to the response) at once
+STREAMING_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    Pseudo-buffer for csv.writer, it returns the written value instead of
+    storing it. See https://docs.djangoproject.com/en/5.2/howto/outputting-csv/
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, serialize_row, chunk_size=STREAMING_CHUNK_SIZE):
+    """
+    Serialize the objects of the queryset one by one without loading
+    the whole queryset in memory (a server-side cursor is used).
+
+    The rows of a streamed response are read after its view returned, out of
+    the database role of the request: the role is kept for its query.
+    """
+    role = current_database_role()
+
+    def rows():
+        with use_database(role):
+            database = queryset.db
+        for obj in queryset.using(database).iterator(chunk_size=chunk_size):
+            yield serialize_row(obj)
+
+    return rows()
+
+
+def aiter_rows(queryset, serialize_row, chunk_size=STREAMING_CHUNK_SIZE):
+    """Asynchronous version of iter_rows()."""
+    role = current_database_role()
+
+    async def rows():
+        with use_database(role):
+            # the health check of a replica may connect to it
+            database = await sync_to_async(lambda: queryset.db)()
+        async for obj in queryset.using(database).aiterator(chunk_size=chunk_size):
+            yield serialize_row(obj)
+
+    return rows()
+
+
+def batched(pieces, size=STREAMING_CHUNK_SIZE):
+    """Join small pieces of text to avoid one socket write per row."""
+
+    batch = []
+    for piece in pieces:
+        batch.append(piece)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def stream_json(rows):
+    """Yield a JSON document in the form of {"data": [row, row, ...]}."""
+
+    def pieces():
+        yield '{"data": ['
+        separator = ""
+        for row in rows:
+            yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+            separator = ", "
+        yield "]}"
+
+    return batched(pieces())
+
+
+async def astream_json(rows):
+    """Asynchronous version of stream_json(), "rows" is an asynchronous iterable."""
+
+    batch = ['{"data": [']
+    separator = ""
+    async for row in rows:
+        batch.append(separator + json.dumps(row, cls=DjangoJSONEncoder))
+        separator = ", "
+        if len(batch) >= STREAMING_CHUNK_SIZE:
+            yield "".join(batch)
+            batch = []
+    batch.append("]}")
+    yield "".join(batch)
+
+
+async def abatched(pieces, size=STREAMING_CHUNK_SIZE):
+    """Asynchronous version of batched(), "pieces" is an asynchronous iterable."""
+
+    batch = []
+    async for piece in pieces:
+        batch.append(piece)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def stream_jsonl(rows):
+    """Yield one JSON document per line (JSON Lines)."""
+
+    return batched(
+        json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def astream_jsonl(rows):
+    """Asynchronous version of stream_jsonl(), "rows" is an asynchronous iterable."""
+
+    async def pieces():
+        async for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+    return abatched(pieces())
+
+
+def stream_csv(rows):
+    """Yield CSV lines, the first line is the header made of the row keys."""
+
+    def pieces():
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(Echo(), fieldnames=list(row))
+                # BOM so that spreadsheet applications detect UTF-8 (Vietnamese)
+                yield "\ufeff" + writer.writeheader()
+            yield writer.writerow(row)
+
+    return batched(pieces())
+
+
+def astream_csv(rows):
+    """Asynchronous version of stream_csv(), "rows" is an asynchronous iterable."""
+
+    async def pieces():
+        writer = None
+        async for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(Echo(), fieldnames=list(row))
+                yield "\ufeff" + writer.writeheader()
+            yield writer.writerow(row)
+
+    return abatched(pieces())
@@ -0,0 +1,13 @@
+from .extraction import extract_file_text
+from .previews import render_file_previews
+
+# name -> function of the background tasks (see Task model),
+# the arguments of a task are passed to its function as keyword arguments
+TASKS = {
+    "render_file_previews": render_file_previews,
+    "extract_file_text": extract_file_text,
+}
+
+
+def run_task(task):
+    TASKS[task.name](**task.arguments)
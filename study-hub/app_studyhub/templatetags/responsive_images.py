@@ -0,0 +1,39 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(src, variants, sizes="100vw", loading="lazy", **attributes):
+    """
+    Render an <img> of an image with its WebP variants (see images.py) as
+    srcset, lazily loaded, and its blurred placeholder shown until it is.
+    Without variants (not rendered yet, not an image) the image itself is used.
+
+    Usage: {% responsive_image category.cover_image_url category.cover_image_variants
+    sizes="(min-width: 768px) 50vw, 100vw" alt="..." class="card-img" %}
+    """
+    variants = variants or {}
+    srcset = [
+        (default_storage.url(name), width)
+        for width, name in variants.get("variants", [])
+    ]
+    if srcset:
+        # for the browsers without srcset support, the largest variant
+        attributes["src"] = srcset[-1][0]
+        attributes["srcset"] = ", ".join(f"{url} {width}w" for url, width in srcset)
+        attributes["sizes"] = sizes
+    else:
+        attributes["src"] = src
+    if "placeholder" in variants:
+        attributes["style"] = (
+            f"background: center / cover no-repeat url({variants['placeholder']});"
+        )
+    attributes["loading"] = loading
+    attributes["decoding"] = "async"
+    return format_html(
+        "<img {}>",
+        format_html_join(" ", '{}="{}"', sorted(attributes.items())),
+    )
@@ -1,3 +1,1862 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from app_account.models import UserAccount
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from prometheus_client import REGISTRY
+from storages.backends.s3 import S3Storage
+
+from .archives import ArchiveMember, stream_zip
+from .catalog import get_catalog_tree
+from .forms import FileAdminForm
+from .imports import ImportItem, import_files
+from .invalidation import start_listener
+from .metadata import inspect_content
+from .metrics import render_metrics
+from .models import (
+    Blob,
+    CatalogVersion,
+    Category,
+    DocumentText,
+    File,
+    FileCatalogEntry,
+    Subcategory,
+    Task,
+)
+from .profiling import PROFILE_DIRECTORY, SQLTimeline, _profile_lock
+from .querybudget import QueryBudgetExceeded, arecord_queries
+from .routers import PRIMARY_PIN_COOKIE_NAME
+from .search import SEARCH_CONFIG, search_files
+from .uploads import get_direct_upload_key, sign_direct_upload
+from .views import SearchView
+
+# The files are stored in memory, the manifest of the static files only
+# exists after "collectstatic"
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+# the replicas (test mirrors of default) do not see the data of the test
+# transactions: everything is read from the primary but in ReplicaRoutingTests.
+# The requests over their query budget fail.
+@override_settings(
+    DATABASE_REPLICAS=[], QUERY_BUDGET_STRICT=True, STORAGES=TEST_STORAGES
+)
+class CatalogDataTestCase(TestCase):
+    """Base test case with a small file catalog."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserAccount.objects.create_user(
+            username="studyhub", email="studyhub@example.com", password="studyhub"
+        )
+        cls.category = Category.objects.create(name="Khoa học", created_by=cls.user)
+        cls.subcategory = Subcategory.objects.create(
+            name="Toán cao cấp", category=cls.category, created_by=cls.user
+        )
+        cls.file = File.objects.create(
+            name="Bài giảng giải tích",
+            subcategory=cls.subcategory,
+            uploaded_file="files/giai-tich.pdf",
+            created_by=cls.user,
+        )
+
+    def setUp(self):
+        # the data of other tests is rolled back without invalidating the cache
+        cache.clear()
+
+    def create_file(self, name, filename, content):
+        """Create a file of the subject, stored (and processed) as uploaded."""
+        file_obj = File(name=name, subcategory=self.subcategory, created_by=self.user)
+        file_obj.uploaded_file.save(filename, ContentFile(content), save=False)
+        file_obj.save()
+        return file_obj
+
+
+class DataTablesProtocolTests(CatalogDataTestCase):
+    """Paging, searching and ordering of the DataTables server-side protocol."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        physics = Subcategory.objects.create(
+            name="Vật lý", category=cls.category, created_by=cls.user
+        )
+        for number in range(1, 5):
+            File.objects.create(
+                name=f"Đề thi {number}",
+                subcategory=cls.subcategory,
+                uploaded_file=f"files/de-thi-{number}.pdf",
+                created_by=cls.user,
+            )
+        for number in range(1, 3):
+            File.objects.create(
+                name=f"Cơ học {number}",
+                subcategory=physics,
+                uploaded_file=f"files/co-hoc-{number}.pdf",
+                created_by=cls.user,
+            )
+        # the same date but for the most recently modified file
+        modified = timezone.now() - timezone.timedelta(days=1)
+        FileCatalogEntry.objects.update(updated_at=modified)
+        FileCatalogEntry.objects.filter(name="Cơ học 2").update(
+            updated_at=modified + timezone.timedelta(hours=1)
+        )
+        cls.names = sorted(FileCatalogEntry.objects.values_list("name", flat=True))
+
+    def get_json(self, **params):
+        params = {
+            "columns[0][data]": "name",
+            "columns[0][name]": "name",
+            "columns[1][data]": "subcategory",
+            "columns[1][name]": "subcategory",
+            "start": 0,
+            "length": 10,
+            **params,
+        }
+        response = self.client.get(
+            reverse("search-all-view"),
+            params,
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get_names(self, **params):
+        return [row["name"] for row in self.get_json(**params)["data"]]
+
+    def test_default_ordering(self):
+        # the most recently modified first, then by name
+        self.assertEqual(
+            self.get_names(),
+            ["Cơ học 2", *[name for name in self.names if name != "Cơ học 2"]],
+        )
+
+    def test_ordering(self):
+        order = {"order[0][column]": 0, "order[0][dir]": "asc"}
+        self.assertEqual(self.get_names(**order), self.names)
+        order["order[0][dir]"] = "desc"
+        self.assertEqual(self.get_names(**order), self.names[::-1])
+
+        default = self.get_names()
+        for column in (2, "name"):
+            with self.subTest(column=column):
+                self.assertEqual(
+                    self.get_names(**{"order[0][column]": column}), default
+                )
+        # a column which is not in datatables_columns
+        self.assertEqual(
+            self.get_names(
+                **{"columns[0][name]": "uploaded_file", "order[0][column]": 0}
+            ),
+            default,
+        )
+
+    def test_paging(self):
+        order = {"order[0][column]": 0}
+        self.assertEqual(self.get_names(start=2, length=3, **order), self.names[2:5])
+        self.assertEqual(self.get_names(start=6, length=3, **order), self.names[6:])
+
+        with mock.patch.object(SearchView, "datatables_max_length", 2):
+            for length in (1000, -1):
+                with self.subTest(length=length):
+                    self.assertEqual(
+                        self.get_names(length=length, **order), self.names[:2]
+                    )
+
+    def test_column_search(self):
+        data = self.get_json(**{"columns[1][search][value]": "Vật lý"})
+        self.assertEqual(data["recordsTotal"], 7)
+        self.assertEqual(data["recordsFiltered"], 2)
+        self.assertEqual(
+            sorted(row["name"] for row in data["data"]), ["Cơ học 1", "Cơ học 2"]
+        )
+
+        data = self.get_json()
+        self.assertEqual(data["recordsTotal"], 7)
+        self.assertEqual(data["recordsFiltered"], 7)
+
+    def test_draw(self):
+        self.assertEqual(self.get_json(draw=3)["draw"], 3)
+        # not sent when the response may come from the cache of the client
+        self.assertNotIn("draw", self.get_json())
+
+
+class FileSearchTests(CatalogDataTestCase):
+    """Accent-insensitive full-text search of the files, trigram fallback."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        english = Subcategory.objects.create(
+            name="Tiếng Anh", category=cls.category, created_by=cls.user
+        )
+        cls.other_file = File.objects.create(
+            name="Ngữ pháp",
+            subcategory=english,
+            uploaded_file="files/ngu-phap.pdf",
+            created_by=cls.user,
+        )
+
+    def search(self, search_query):
+        return list(search_files(File.objects.all(), search_query))
+
+    def test_accent_insensitive_search(self):
+        for search_query in ("toan cao cap", "Toán cao cấp", "TOAN", "giai tich"):
+            with self.subTest(search_query=search_query):
+                self.assertEqual(self.search(search_query), [self.file])
+        self.assertEqual(self.search("ngu phap"), [self.other_file])
+        self.assertCountEqual(self.search("   "), [self.file, self.other_file])
+
+    def test_trigram_fallback(self):
+        # the misspelled word matches no lexeme of the full-text search
+        text_query = SearchQuery("giai tch", config=SEARCH_CONFIG)
+        self.assertFalse(File.objects.filter(search_vector=text_query).exists())
+
+        results = self.search("giai tch")
+        self.assertEqual(results, [self.file])
+        self.assertGreater(results[0].search_rank, 0)
+        self.assertEqual(self.search("xyzxyz"), [])
+
+    def test_home_search_redirects(self):
+        response = self.client.post(reverse("home-view"), {"search": " toán cao cấp "})
+        self.assertRedirects(
+            response,
+            f"{reverse('search-all-view')}?q=to%C3%A1n+cao+c%E1%BA%A5p",
+            fetch_redirect_response=False,
+        )
+        response = self.client.post(reverse("home-view"), {"search": " "})
+        self.assertRedirects(
+            response, reverse("home-view"), fetch_redirect_response=False
+        )
+
+
+class FileCatalogEntryTests(CatalogDataTestCase):
+    """The catalog entries follow the changes of the files and their subjects."""
+
+    def get_entry(self, file_obj=None):
+        return FileCatalogEntry.objects.get(file_id=(file_obj or self.file).pk)
+
+    def get_version(self, subcategory):
+        return CatalogVersion.objects.get(scope=subcategory.pk).version
+
+    def test_renamed_subcategory_and_category(self):
+        self.subcategory.name = "Giải tích"
+        self.subcategory.save()
+        self.assertEqual(self.get_entry().subcategory_name, "Giải tích")
+
+        self.category.name = "Toán học"
+        self.category.save()
+        self.assertEqual(self.get_entry().category_name, "Toán học")
+
+    def test_moved_file(self):
+        other_subcategory = Subcategory.objects.create(
+            name="Vật lý", category=self.category, created_by=self.user
+        )
+        versions = {
+            subcategory: self.get_version(subcategory)
+            for subcategory in (self.subcategory, other_subcategory)
+        }
+
+        self.file.subcategory = other_subcategory
+        self.file.save()
+
+        entry = self.get_entry()
+        self.assertEqual(entry.subcategory_id, other_subcategory.pk)
+        self.assertEqual(entry.subcategory_name, "Vật lý")
+        for subcategory, version in versions.items():
+            with self.subTest(subcategory=subcategory.name):
+                self.assertGreater(self.get_version(subcategory), version)
+
+    def test_deleted_subcategory(self):
+        # its files protect a subcategory: an entry left by a bulk update
+        # (without signals) of files moved elsewhere
+        subcategory = Subcategory.objects.create(
+            name="Vật lý", category=self.category, created_by=self.user
+        )
+        FileCatalogEntry.objects.update(subcategory=subcategory)
+        self.assertTrue(CatalogVersion.objects.filter(scope=subcategory.pk).exists())
+
+        subcategory.delete()
+        self.assertFalse(FileCatalogEntry.objects.exists())
+        self.assertFalse(CatalogVersion.objects.filter(scope=subcategory.pk).exists())
+
+    def test_rebuild_catalog(self):
+        FileCatalogEntry.objects.all().delete()
+        call_command("rebuild_catalog", stdout=io.StringIO())
+        entry = self.get_entry()
+        self.assertEqual(entry.name, self.file.name)
+        self.assertEqual(entry.subcategory_name, self.subcategory.name)
+        self.assertEqual(entry.category_name, self.category.name)
+
+
+class CatalogExportTests(CatalogDataTestCase):
+    """Bulk export of the catalog, streamed in each format."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_file = File.objects.create(
+            name="Đề thi giải tích, 2024",
+            subcategory=cls.subcategory,
+            uploaded_file="files/de-thi.pdf",
+            created_by=cls.user,
+        )
+
+    def export(self, export_format, **headers):
+        return self.client.get(
+            reverse("catalog-export-view", kwargs={"export_format": export_format}),
+            headers=headers,
+        )
+
+    def get_content(self, export_format):
+        response = self.export(export_format)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Disposition"],
+            f'attachment; filename="studyhub-catalog.{export_format}"',
+        )
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv(self):
+        content = self.get_content("csv")
+        # BOM for the spreadsheet applications
+        self.assertTrue(content.startswith("\ufeffid,name,category,subcategory,"))
+        rows = list(csv.DictReader(io.StringIO(content.removeprefix("\ufeff"))))
+        self.assertEqual(
+            sorted(row["name"] for row in rows),
+            ["Bài giảng giải tích", "Đề thi giải tích, 2024"],
+        )
+        self.assertEqual(rows[0]["subcategory"], "Toán cao cấp")
+
+    def test_jsonl(self):
+        lines = self.get_content("jsonl").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(
+            {json.loads(line)["id"] for line in lines},
+            {str(self.file.pk), str(self.other_file.pk)},
+        )
+
+    def test_json(self):
+        rows = json.loads(self.get_content("json"))["data"]
+        self.assertIsInstance(rows, list)
+        self.assertEqual(
+            {row["name"] for row in rows},
+            {"Bài giảng giải tích", "Đề thi giải tích, 2024"},
+        )
+
+    def test_unknown_format(self):
+        self.assertEqual(self.export("xml").status_code, 404)
+
+    def test_unchanged_catalog_is_not_modified(self):
+        etag = self.export("csv")["ETag"]
+        with self.assertNumQueries(1):
+            response = self.export("csv", **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.file.name = "Bài tập giải tích"
+        self.file.save()
+        self.assertEqual(self.export("csv", **{"If-None-Match": etag}).status_code, 200)
+
+    def test_inactive_subcategory(self):
+        search_url = reverse("search-all-view")
+        params = {"columns[0][data]": "name", "start": 0, "length": 10}
+        headers = {"X-Requested-With": "XMLHttpRequest"}
+        etag = self.client.get(search_url, params, headers=headers)["ETag"]
+
+        self.subcategory.is_active = False
+        self.subcategory.save()
+        # the files of the subject leave the search, the export and the archive
+        response = self.client.get(
+            search_url, params, headers={**headers, "If-None-Match": etag}
+        )
+        self.assertEqual(response.json()["data"], [])
+        self.assertEqual(self.get_content("jsonl"), "")
+        response = self.client.post(
+            reverse("file-archive-view"), {"file_ids": [str(self.file.pk)]}
+        )
+        self.assertEqual(response.status_code, 404)
+
+        self.subcategory.is_active = True
+        self.category.is_active = False
+        self.subcategory.save()
+        self.category.save()
+        self.assertEqual(self.get_content("jsonl"), "")
+
+
+class DataTablesConditionalGetTests(CatalogDataTestCase):
+    """ETag / Last-Modified handling of the DataTables JSON listings."""
+
+    params = {
+        "columns[0][data]": "name",
+        "columns[0][name]": "name",
+        "start": 0,
+        "length": 10,
+    }
+
+    def get_json(self, url, **headers):
+        return self.client.get(
+            url, self.params, headers={"X-Requested-With": "XMLHttpRequest", **headers}
+        )
+
+    def test_unchanged_listing_is_not_modified(self):
+        for url in (reverse("search-all-view"), self.subcategory.get_absolute_url()):
+            with self.subTest(url=url):
+                response = self.get_json(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["recordsTotal"], 1)
+                etag = response.headers["ETag"]
+
+                # only the version stamp is read
+                with self.assertNumQueries(1):
+                    response = self.get_json(url, **{"If-None-Match": etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.headers["ETag"], etag)
+
+    def test_etag_depends_on_parameters(self):
+        url = reverse("search-all-view")
+        etag = self.get_json(url).headers["ETag"]
+        response = self.client.get(
+            url,
+            {**self.params, "start": 10},
+            headers={"X-Requested-With": "XMLHttpRequest", "If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_changed_file_changes_etag(self):
+        url = self.subcategory.get_absolute_url()
+        etag = self.get_json(url).headers["ETag"]
+
+        self.file.name = "Bài tập giải tích"
+        self.file.save()
+
+        response = self.get_json(url, **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.json()["data"][0]["name"], "Bài tập giải tích")
+
+
+class QueryBudgetTests(CatalogDataTestCase):
+    """Query budget of the requests and detection of the N+1 queries."""
+
+    params = {"columns[0][data]": "name", "start": 0, "length": 20}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(10):
+            File.objects.create(
+                name=f"Đề thi giải tích {number}",
+                subcategory=cls.subcategory,
+                uploaded_file=f"files/de-thi-{number}.pdf",
+                created_by=cls.user,
+            )
+
+    def get_json(self, url):
+        return self.client.get(
+            url, self.params, headers={"X-Requested-With": "XMLHttpRequest"}
+        )
+
+    def test_listings_within_budget(self):
+        for url in (reverse("search-all-view"), self.subcategory.get_absolute_url()):
+            with self.subTest(url=url):
+                response = self.get_json(url)
+                self.assertEqual(len(response.json()["data"]), 11)
+
+    def test_repeated_queries(self):
+        def get_datatables_row(view, entry):
+            # one query per row
+            return {"name": File.objects.get(pk=entry.file_id).name}
+
+        url = reverse("search-all-view")
+        with mock.patch.object(SearchView, "get_datatables_row", get_datatables_row):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "repeated (N+1)"):
+                self.get_json(url)
+
+            with self.settings(QUERY_BUDGET_STRICT=False):
+                with self.assertLogs("app_studyhub.querybudget", "WARNING") as logs:
+                    self.assertEqual(self.get_json(url).status_code, 200)
+        report = logs.records[0].query_budget
+        self.assertEqual(report["view_name"], "search-all-view")
+        self.assertEqual(report["repeated_queries"][0]["count"], 11)
+        self.assertGreater(report["db_time_ms"], 0)
+
+    async def test_async_views(self):
+        # the queries run in the thread of the request, not in the event loop
+        url = reverse("search-all-view")
+        headers = {"X-Requested-With": "XMLHttpRequest"}
+        with self.settings(QUERY_BUDGETS={"search-all-view": 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "(budget 1)"):
+                await self.async_client.get(url, self.params, headers=headers)
+
+    def test_budget_by_url_name(self):
+        url = reverse("search-all-view")
+        with self.settings(QUERY_BUDGETS={"search-all-view": 1}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "(budget 1)"):
+                self.get_json(url)
+        with self.settings(QUERY_BUDGETS={"search-all-view": None}):
+            self.assertEqual(self.get_json(url).status_code, 200)
+
+
+# a worker of Gunicorn recording requests (see config/gunicorn.py)
+METRICS_WORKER_SCRIPT = """
+from app_studyhub.metrics import CATALOG_TREE_BUILDS, REQUEST_DURATION
+
+CATALOG_TREE_BUILDS.inc()
+REQUEST_DURATION.labels("home-view", "GET", "200").observe(0.01)
+"""
+
+
+@override_settings(METRICS_TOKEN="studyhub-metrics")
+class MetricsTests(CatalogDataTestCase):
+    """Prometheus metrics of the requests and their /metrics page."""
+
+    def get_sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def get_metrics(self, token="studyhub-metrics"):
+        return self.client.get(
+            reverse("metrics-view"), headers={"Authorization": f"Bearer {token}"}
+        )
+
+    def test_metrics_token(self):
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"studyhub_http_request_duration_seconds", response.content)
+
+        self.assertEqual(self.get_metrics("studyhub").status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics-view")).status_code, 403)
+        with self.settings(METRICS_TOKEN=""):
+            self.assertEqual(self.get_metrics("").status_code, 404)
+
+    def test_request_metrics(self):
+        url = self.subcategory.get_absolute_url()
+        view = {"view": "subcategory-detail-view"}
+        requests = self.get_sample(
+            "studyhub_http_request_duration_seconds_count",
+            method="GET",
+            status="200",
+            **view,
+        )
+        queries = self.get_sample("studyhub_db_queries_total", **view)
+        misses = self.get_sample(
+            "studyhub_page_cache_requests_total", result="miss", **view
+        )
+        hits = self.get_sample(
+            "studyhub_page_cache_requests_total", result="hit", **view
+        )
+        sizes = self.get_sample("studyhub_http_response_size_bytes_sum", **view)
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(
+            self.get_sample(
+                "studyhub_http_request_duration_seconds_count",
+                method="GET",
+                status="200",
+                **view,
+            ),
+            requests + 2,
+        )
+        # the second page is served by the page cache, without query
+        self.assertGreater(
+            self.get_sample("studyhub_db_queries_total", **view), queries
+        )
+        self.assertEqual(
+            self.get_sample(
+                "studyhub_page_cache_requests_total", result="miss", **view
+            ),
+            misses + 1,
+        )
+        self.assertEqual(
+            self.get_sample("studyhub_page_cache_requests_total", result="hit", **view),
+            hits + 1,
+        )
+        self.assertEqual(
+            self.get_sample("studyhub_http_response_size_bytes_sum", **view),
+            sizes + len(first.content) + len(second.content),
+        )
+
+    async def test_async_view_queries(self):
+        # the queries of the async views run in the thread of the request
+        view = {"view": "search-all-view"}
+        queries = self.get_sample("studyhub_db_queries_total", **view)
+        duration = self.get_sample("studyhub_db_query_duration_seconds_total", **view)
+        response = await self.async_client.get(
+            reverse("search-all-view"),
+            {"columns[0][data]": "name", "start": 0, "length": 10},
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(
+            self.get_sample("studyhub_db_queries_total", **view), queries
+        )
+        self.assertGreater(
+            self.get_sample("studyhub_db_query_duration_seconds_total", **view),
+            duration,
+        )
+
+    def test_streamed_response_size(self):
+        view = {"view": "catalog-export-view"}
+        sizes = self.get_sample("studyhub_http_response_size_bytes_sum", **view)
+        response = self.client.get(
+            reverse("catalog-export-view", kwargs={"export_format": "csv"})
+        )
+        content = b"".join(response.streaming_content)
+        self.assertEqual(
+            self.get_sample("studyhub_http_response_size_bytes_sum", **view),
+            sizes + len(content),
+        )
+
+    def test_unresolved_paths(self):
+        labels = {"view": "unresolved", "method": "other", "status": "404"}
+        requests = self.get_sample(
+            "studyhub_http_request_duration_seconds_count", **labels
+        )
+        self.client.generic("PROPFIND", "/no-such-page/")
+        self.assertEqual(
+            self.get_sample("studyhub_http_request_duration_seconds_count", **labels),
+            requests + 1,
+        )
+
+    def test_catalog_tree_builds(self):
+        get_catalog_tree()
+        builds = self.get_sample("studyhub_catalog_tree_builds_total")
+        get_catalog_tree()
+        self.assertEqual(self.get_sample("studyhub_catalog_tree_builds_total"), builds)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Toán học", created_by=self.user)
+        get_catalog_tree()
+        self.assertEqual(
+            self.get_sample("studyhub_catalog_tree_builds_total"), builds + 1
+        )
+
+    def test_multiprocess_metrics(self):
+        # the metrics of all the workers, whichever serves /metrics
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            env = {"PROMETHEUS_MULTIPROC_DIR": metrics_dir}
+            for _ in range(2):
+                subprocess.run(
+                    [sys.executable, "-c", METRICS_WORKER_SCRIPT],
+                    check=True,
+                    cwd=settings.BASE_DIR,
+                    env={**os.environ, **env},
+                )
+            with mock.patch.dict(os.environ, env):
+                metrics = render_metrics().decode()
+        self.assertIn("studyhub_catalog_tree_builds_total 2.0", metrics)
+        self.assertIn(
+            'studyhub_http_request_duration_seconds_count{method="GET",'
+            'status="200",view="home-view"} 2.0',
+            metrics,
+        )
+
+
+@override_settings(PROFILER_SAMPLE_RATE=0)
+class ProfilerTests(CatalogDataTestCase):
+    """Profiles of the staff requests and of sampled requests."""
+
+    def setUp(self):
+        super().setUp()
+        self.staff_user = UserAccount.objects.create_user(
+            username="staff", email="staff@example.com", is_staff=True
+        )
+        self.url = self.subcategory.get_absolute_url()
+
+    def test_inline_report(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(self.url, {"_profile": "inline"})
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        report = response.content.decode()
+        self.assertIn("view: subcategory-detail-view, status: 200", report)
+        self.assertIn("Top functions (by cumulative time)", report)
+        self.assertIn("get_catalog_tree", report)
+        self.assertRegex(report, r"SQL timeline.*\n.*ms default +SELECT")
+
+    async def test_async_inline_report(self):
+        await self.async_client.aforce_login(self.staff_user)
+        response = await self.async_client.get(self.url, {"_profile": "inline"})
+        report = response.content.decode()
+        self.assertIn("view: subcategory-detail-view, status: 200", report)
+        # the queries run in the thread of the request
+        self.assertRegex(report, r"SQL timeline.*\n.*ms default +SELECT")
+
+    async def test_async_requests_running(self):
+        await self.async_client.aforce_login(self.staff_user)
+        # another request of the event loop does not end in time
+        with (
+            mock.patch("app_studyhub.profiling._async_requests", 1),
+            mock.patch("app_studyhub.profiling.PROFILE_WAIT_TIMEOUT", 0),
+        ):
+            response = await self.async_client.get(self.url, {"_profile": "inline"})
+            self.assertEqual(response.status_code, 503)
+            # the sampled requests are only profiled alone
+            with self.settings(PROFILER_SAMPLE_RATE=1):
+                with self.assertNoLogs("app_studyhub.profiling"):
+                    response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_staff(self):
+        for user in (None, self.user):
+            with self.subTest(user=user):
+                if user is not None:
+                    self.client.force_login(user)
+                response = self.client.get(self.url, {"_profile": "inline"})
+                self.assertEqual(response["Content-Type"], "text/html; charset=utf-8")
+                self.assertNotIn("X-Profile-Report", response)
+
+    def test_saved_report(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(self.url, {"_profile": "save"})
+        name = response["X-Profile-Report"]
+        with default_storage.open(name) as f:
+            report = f.read().decode()
+        self.assertContains(response, self.subcategory.name)
+        self.assertTrue(name.startswith(f"{PROFILE_DIRECTORY}/"))
+        self.assertIn("subcategory-detail-view", name)
+        self.assertIn("Top functions", report)
+
+    def test_sampled_requests(self):
+        with self.settings(PROFILER_SAMPLE_RATE=1):
+            with self.assertLogs("app_studyhub.profiling", "INFO") as logs:
+                response = self.client.get(self.url)
+        self.assertContains(response, self.subcategory.name)
+        self.assertIn("SQL timeline", logs.output[0])
+
+    def test_one_profile_at_a_time(self):
+        self.client.force_login(self.staff_user)
+        with _profile_lock:
+            response = self.client.get(self.url, {"_profile": "inline"})
+            self.assertEqual(response.status_code, 503)
+            # the sampled requests are served without profile
+            with self.settings(PROFILER_SAMPLE_RATE=1):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+@skipUnless(
+    settings.DATABASE_REPLICAS,
+    "no replica (DJANGO_DATABASE_REPLICA_URLS, e.g. a second local database)",
+)
+@override_settings(DATABASE_REPLICAS=settings.DATABASE_REPLICAS)
+class ReplicaRoutingTests(CatalogDataTestCase):
+    """Reads of the catalog views from the replicas, with failover and pinning."""
+
+    databases = {"default", *settings.DATABASE_REPLICAS}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        # the test database is dropped with the connections of its mirrors
+        for alias in settings.DATABASE_REPLICAS:
+            connections[alias].close_pool()
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(
+            mock.patch.dict("app_studyhub.routers._replica_health", clear=True)
+        )
+        self.replica = settings.DATABASE_REPLICAS[0]
+        self.url = self.subcategory.get_absolute_url()
+        # built from the primary
+        get_catalog_tree()
+
+    def count_queries(self, url):
+        """Return the number of queries (primary, replica) of a JSON listing."""
+        with (
+            CaptureQueriesContext(connections["default"]) as primary_queries,
+            CaptureQueriesContext(connections[self.replica]) as replica_queries,
+        ):
+            response = self.client.get(
+                url,
+                DataTablesConditionalGetTests.params,
+                headers={"X-Requested-With": "XMLHttpRequest"},
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(primary_queries), len(replica_queries)
+
+    def test_read_only_views_read_from_replica(self):
+        primary_count, replica_count = self.count_queries(self.url)
+        self.assertEqual(primary_count, 0)
+        self.assertGreater(replica_count, 0)
+
+    def test_streamed_rows_read_from_replica(self):
+        # the rows are read once the view returned
+        export_url = reverse("catalog-export-view", kwargs={"export_format": "csv"})
+        for url, headers in (
+            (reverse("search-all-view"), {"X-Requested-With": "XMLHttpRequest"}),
+            (export_url, {}),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url, headers=headers)
+                with (
+                    CaptureQueriesContext(connections["default"]) as primary_queries,
+                    CaptureQueriesContext(connections[self.replica]) as replica_queries,
+                ):
+                    b"".join(response.streaming_content)
+                self.assertEqual(len(primary_queries), 0)
+                self.assertGreater(len(replica_queries), 0)
+
+    async def test_async_streamed_rows_read_from_replica(self):
+        response = await self.async_client.get(
+            reverse("search-all-view"), headers={"X-Requested-With": "XMLHttpRequest"}
+        )
+        timeline = SQLTimeline()
+        async with arecord_queries(timeline):
+            [chunk async for chunk in response.streaming_content]
+        self.assertEqual({alias for _, _, alias, _ in timeline.queries}, {self.replica})
+
+    def test_pinned_to_primary_after_write(self):
+        response = self.client.post(reverse("contact-view"), {})
+        cookie = response.cookies[PRIMARY_PIN_COOKIE_NAME]
+        self.assertEqual(cookie["max-age"], settings.DATABASE_REPLICA_PIN_SECONDS)
+        self.assertEqual(self.count_queries(self.url)[1], 0)
+
+        del self.client.cookies[PRIMARY_PIN_COOKIE_NAME]
+        self.assertGreater(self.count_queries(self.url)[1], 0)
+
+    def test_failover_to_primary(self):
+        with mock.patch.object(
+            connections[self.replica], "is_usable", return_value=False
+        ):
+            primary_count, replica_count = self.count_queries(self.url)
+        self.assertGreater(primary_count, 0)
+        self.assertEqual(replica_count, 0)
+
+
+class CatalogTreeTests(CatalogDataTestCase):
+    """
+    The catalog tree (category menu, category and subcategory pages)
+    is kept in memory.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # build the catalog tree of this process
+        self.client.get(reverse("about-view"))
+
+    def test_public_views_query_count(self):
+        # none of the pages queries the catalog
+        views = [
+            reverse("home-view"),
+            reverse("about-view"),
+            reverse("contact-view"),
+            reverse("search-all-view"),
+            reverse("category-list-view"),
+            self.category.get_absolute_url(),
+            self.subcategory.get_absolute_url(),
+        ]
+        for url in views:
+            with self.subTest(url=url), self.assertNumQueries(0):
+                response = self.client.get(url)
+                self.assertContains(
+                    response, f'href="{self.category.get_absolute_url()}"'
+                )
+
+    def test_subcategory_of_another_category(self):
+        other_category = Category.objects.create(name="Kinh tế", created_by=self.user)
+        url = reverse(
+            "subcategory-detail-view",
+            kwargs={
+                "category_slugname": other_category.slug_name,
+                "subcategory_slugname": self.subcategory.slug_name,
+            },
+        )
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_file_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            File.objects.create(
+                name="Đề thi giải tích",
+                subcategory=self.subcategory,
+                uploaded_file="files/de-thi.pdf",
+                created_by=self.user,
+            )
+        category_node = get_catalog_tree().get_category(self.category.slug_name)
+        self.assertEqual(category_node.file_count, 2)
+        self.assertEqual(category_node.subcategories[0].file_count, 2)
+
+    def test_tree_is_rebuilt_on_catalog_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Ngoại ngữ"
+            self.category.save()
+        self.assertContains(self.client.get(reverse("about-view")), "Ngoại Ngữ")
+        self.assertContains(
+            self.client.get(self.subcategory.get_absolute_url()), "Ngoại ngữ"
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Kinh tế", created_by=self.user)
+        self.assertContains(self.client.get(reverse("about-view")), "Kinh Tế")
+
+    def test_inactive_rows_are_hidden(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subcategory.is_active = False
+            self.subcategory.save()
+        self.assertEqual(
+            self.client.get(self.subcategory.get_absolute_url()).status_code, 404
+        )
+        self.assertEqual(
+            get_catalog_tree().get_category(self.category.slug_name).subcategories, ()
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.is_active = False
+            self.category.save()
+        self.assertEqual(
+            self.client.get(self.category.get_absolute_url()).status_code, 404
+        )
+        self.assertNotContains(
+            self.client.get(reverse("about-view")),
+            f'href="{self.category.get_absolute_url()}"',
+        )
+
+
+class AsyncViewsTests(CatalogDataTestCase):
+    """The read-only catalog views served by the ASGI handler."""
+
+    async def test_catalog_pages(self):
+        urls = [
+            reverse("category-list-view"),
+            self.category.get_absolute_url(),
+            self.subcategory.get_absolute_url(),
+            reverse("search-all-view"),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertContains(
+                    response, f'href="{self.category.get_absolute_url()}"'
+                )
+
+        missing_url = reverse(
+            "category-detail-view", kwargs={"slug_name": "khong-ton-tai"}
+        )
+        response = await self.async_client.get(missing_url)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_page_cache(self):
+        url = self.category.get_absolute_url()
+        response = await self.async_client.get(url)
+        self.assertEqual(response.headers["X-Page-Cache"], "miss")
+        response = await self.async_client.get(url)
+        self.assertEqual(response.headers["X-Page-Cache"], "hit")
+        self.assertContains(response, self.subcategory.name)
+
+    async def test_datatables_listings(self):
+        headers = {"X-Requested-With": "XMLHttpRequest"}
+        params = {"columns[0][data]": "name", "start": 0, "length": 10}
+        for url in (reverse("search-all-view"), self.subcategory.get_absolute_url()):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url, params, headers=headers)
+                self.assertEqual(response.json()["data"][0]["name"], self.file.name)
+
+                response = await self.async_client.get(
+                    url, params, headers={**headers, "If-None-Match": response["ETag"]}
+                )
+                self.assertEqual(response.status_code, 304)
+
+                # every file, streamed
+                response = await self.async_client.get(url, headers=headers)
+                content = b"".join(
+                    [chunk async for chunk in response.streaming_content]
+                )
+                self.assertEqual(json.loads(content)["data"][0]["name"], self.file.name)
+
+    async def test_streamed_downloads(self):
+        # a synchronous iterator would be read whole in memory
+        for export_format in ("csv", "jsonl", "json"):
+            with self.subTest(export_format=export_format):
+                response = await self.async_client.get(
+                    reverse(
+                        "catalog-export-view", kwargs={"export_format": export_format}
+                    )
+                )
+                self.assertTrue(response.is_async)
+                content = b"".join(
+                    [chunk async for chunk in response.streaming_content]
+                )
+                self.assertIn(str(self.file.pk), content.decode())
+
+        default_storage.save(self.file.uploaded_file.name, ContentFile(b"%PDF-1"))
+        response = await self.async_client.post(
+            reverse("file-archive-view"), {"file_ids": [str(self.file.pk)]}
+        )
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        self.assertEqual(archive.read(archive.namelist()[0]), b"%PDF-1")
+
+
+class PageCacheTests(CatalogDataTestCase):
+    """Full-page cache of the catalog pages for the anonymous visitors."""
+
+    def setUp(self):
+        super().setUp()
+        self.other_category = Category.objects.create(
+            name="Ngoại ngữ", created_by=self.user
+        )
+        self.urls = {
+            "list": reverse("category-list-view"),
+            "category": self.category.get_absolute_url(),
+            "subcategory": self.subcategory.get_absolute_url(),
+            "other_category": self.other_category.get_absolute_url(),
+        }
+        for url in self.urls.values():
+            self.client.get(url)
+
+    def page_cache(self, url, **headers):
+        return self.client.get(url, headers=headers).headers.get("X-Page-Cache")
+
+    def test_hit_without_query_nor_session(self):
+        client = Client(enforce_csrf_checks=True)
+        url = reverse("home-view")
+        response = client.get(url)
+        self.assertEqual(response.headers["X-Page-Cache"], "miss")
+        client.cookies.clear()
+
+        with self.assertNumQueries(0):
+            response = client.get(url)
+        self.assertEqual(response.headers["X-Page-Cache"], "hit")
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        # the form of the page has the CSRF token of this visitor
+        csrf_secret = response.cookies[settings.CSRF_COOKIE_NAME].value
+        self.assertContains(response, f'value="{csrf_secret}"')
+        response = client.post(url, {"csrfmiddlewaretoken": csrf_secret, "search": "x"})
+        self.assertEqual(response.status_code, 302)
+
+    def test_keyed_on_language(self):
+        url = self.urls["category"]
+        # cached by setUp in the default language
+        self.assertEqual(self.page_cache(url, accept_language="en-us"), "hit")
+        self.assertEqual(self.page_cache(url, accept_language="vi"), "miss")
+        self.assertEqual(self.page_cache(url, accept_language="vi"), "hit")
+
+    def test_not_cached(self):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = "session"
+        self.assertIsNone(self.page_cache(self.urls["category"]))
+        del self.client.cookies[settings.SESSION_COOKIE_NAME]
+        self.assertIsNone(self.page_cache(reverse("about-view")))
+        self.assertEqual(
+            self.client.get(self.urls["category"], {"page": 2}).status_code, 200
+        )
+        self.assertIsNone(self.page_cache(f"{self.urls['category']}?page=2"))
+
+    def test_invalidated_by_changes(self):
+        # a subject is renamed: the pages listing it
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subcategory.name = "Toán rời rạc"
+            self.subcategory.save()
+        self.assertEqual(self.page_cache(self.urls["list"]), "hit")
+        self.assertEqual(self.page_cache(self.urls["other_category"]), "hit")
+        response = self.client.get(self.urls["category"])
+        self.assertEqual(response.headers["X-Page-Cache"], "miss")
+        self.assertContains(response, "Toán rời rạc")
+
+        # a subject is moved: the pages of both categories
+        self.client.get(self.urls["other_category"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subcategory.category = self.other_category
+            self.subcategory.save()
+        self.assertEqual(self.page_cache(self.urls["category"]), "miss")
+        self.assertEqual(self.page_cache(self.urls["other_category"]), "miss")
+
+        # a file is changed: the page of its subject
+        subcategory_url = self.subcategory.get_absolute_url()
+        self.client.get(subcategory_url)
+        self.assertEqual(self.page_cache(subcategory_url), "hit")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.file.save()
+        self.assertEqual(self.page_cache(subcategory_url), "miss")
+        self.assertEqual(self.page_cache(self.urls["other_category"]), "hit")
+
+        # a category is renamed: every page (menu)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_category.name = "Ngoại ngữ 2"
+            self.other_category.save()
+        self.assertEqual(self.page_cache(self.urls["list"]), "miss")
+
+
+class FileArchiveTests(CatalogDataTestCase):
+    """ZIP archive of the selected files, streamed from the storage."""
+
+    def setUp(self):
+        super().setUp()
+        default_storage.save(self.file.uploaded_file.name, ContentFile(b"%PDF-1"))
+
+    def download(self, file_ids):
+        return self.client.post(reverse("file-archive-view"), {"file_ids": file_ids})
+
+    def test_archive_of_selected_files(self):
+        # both names become "Đề thi 1-2" in the archive
+        files = []
+        for number, name in enumerate(["Đề thi 1/2", "Đề thi 1-2"], start=1):
+            file_obj = File.objects.create(
+                name=name,
+                subcategory=self.subcategory,
+                uploaded_file=f"files/de-thi-{number}.PDF",
+                created_by=self.user,
+            )
+            default_storage.save(
+                file_obj.uploaded_file.name, ContentFile(name.encode())
+            )
+            files.append(file_obj)
+
+        response = self.download([self.file.pk, *(each.pk for each in files)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(
+            sorted((name, archive.read(name)) for name in archive.namelist()),
+            [
+                ("Toán cao cấp/Bài giảng giải tích.pdf", b"%PDF-1"),
+                ("Toán cao cấp/Đề thi 1-2 (2).pdf", "Đề thi 1/2".encode()),
+                ("Toán cao cấp/Đề thi 1-2.pdf", "Đề thi 1-2".encode()),
+            ],
+        )
+
+    def test_invalid_selection(self):
+        self.assertEqual(self.download(["not-a-uuid"]).status_code, 400)
+        self.assertEqual(self.download([str(self.subcategory.pk)]).status_code, 404)
+
+    def test_large_members_in_many_chunks(self):
+        contents = {f"files/large-{n}.bin": bytes([n]) * 300_000 for n in range(6)}
+        for name, content in contents.items():
+            default_storage.save(name, ContentFile(content))
+        members = [
+            ArchiveMember(name, name.split("/")[1], (2025, 1, 1, 0, 0, 0))
+            for name in contents
+        ]
+
+        chunks = list(stream_zip(members, max_workers=2))
+        self.assertGreater(len(chunks), len(members))
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        for name, content in contents.items():
+            self.assertEqual(archive.read(name.split("/")[1]), content)
+
+
+# the presigned POSTs are signed by the S3 storage
+@override_settings(STORAGES={**TEST_STORAGES, "default": settings.STORAGES["default"]})
+class DirectUploadTests(CatalogDataTestCase):
+    """Files uploaded by the browser straight to the storage (File admin)."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = UserAccount.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin"
+        )
+
+    def test_presigned_post(self):
+        # the presigned POST is signed locally, the bucket is never contacted
+        self.client.force_login(self.admin_user)
+        with mock.patch.object(S3Storage, "exists", return_value=False):
+            response = self.client.post(
+                reverse("admin:app_studyhub_file_direct_upload"),
+                {
+                    "name": "Bài thi cuối kỳ",
+                    "subcategory": self.subcategory.pk,
+                    "file_type": File.FileType.EXAM,
+                    "filename": "De thi.PDF",
+                    "size": 1024,
+                },
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            data["fields"]["key"],
+            f"files/khoa-hoc/toan-cao-cap/{File.FileType.EXAM}__bai-thi-cuoi-ky.pdf",
+        )
+        self.assertEqual(data["fields"]["Content-Type"], "application/pdf")
+        self.assertIn("policy", data["fields"])
+        self.assertTrue(data["token"])
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_file_created_from_uploaded_object(self):
+        data = {
+            "name": "Đề thi cuối kỳ",
+            "subcategory": self.subcategory.pk,
+            "file_type": File.FileType.EXAM,
+            "file_language": File.FileLanguage.VIETNAMESE,
+        }
+        key = get_direct_upload_key(
+            data["name"], self.subcategory, data["file_type"], "de-thi.pdf"
+        )
+        # uploaded by the browser
+        default_storage.save(key, ContentFile(b"%PDF"))
+
+        token = sign_direct_upload(
+            key, data["name"], self.subcategory.pk, data["file_type"]
+        )
+        form = FileAdminForm({**data, "uploaded_file_token": token})
+        self.assertTrue(form.is_valid(), form.errors)
+        file_obj = form.save(commit=False)
+        file_obj.created_by = self.user
+        file_obj.save()
+        self.assertEqual(file_obj.uploaded_file.name, key)
+        self.assertEqual(
+            file_obj.uploaded_file.name, File.file_upload_to(file_obj, key)
+        )
+        self.assertEqual(
+            default_storage.listdir("files/khoa-hoc/toan-cao-cap")[1],
+            [key.rsplit("/", 1)[1]],
+        )
+
+        # the token only fits the file it was given for
+        form = FileAdminForm(
+            {**data, "name": "Đề thi giữa kỳ", "uploaded_file_token": token}
+        )
+        self.assertFalse(form.is_valid())
+        form = FileAdminForm({**data, "uploaded_file_token": token + "x"})
+        self.assertFalse(form.is_valid())
+
+
+class FileImportTests(CatalogDataTestCase):
+    """Bulk import of a ZIP archive into a subject (Subcategory admin)."""
+
+    def make_archive(self, names):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            for name in names:
+                zf.writestr(name, f"content of {name}")
+        archive.seek(0)
+        archive.name = "import.zip"
+        return archive
+
+    def test_import_archive(self):
+        admin_user = UserAccount.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin"
+        )
+        self.client.force_login(admin_user)
+        archive = self.make_archive(
+            [
+                "Đề thi/Giữa kỳ 2024.pdf",
+                "Bai tap/Chuong 1_en.pdf",
+                "Giáo trình đại số.PDF",
+                "Tài liệu 1.docx",
+                "Tai lieu 1.docx",
+                # already in the catalog
+                "Bài giảng giải tích.pdf",
+                "__MACOSX/._Tài liệu 1.docx",
+            ]
+        )
+        response = self.client.post(
+            reverse("admin:app_studyhub_subcategory_changelist"),
+            {
+                "action": "import_files",
+                "_selected_action": [self.subcategory.pk],
+                "import": "1",
+                "archive": archive,
+                "file_type": "",
+                "file_language": File.FileLanguage.VIETNAMESE,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        results = {item.path: item for item in response.context["results"]}
+        self.assertEqual(len(results), 6)
+        self.assertEqual(
+            str(results["Bài giảng giải tích.pdf"].error),
+            "A file with this name already exists.",
+        )
+
+        files = {
+            file_obj.name: file_obj
+            for file_obj in File.objects.filter(subcategory=self.subcategory)
+        }
+        self.assertEqual(len(files), 6)
+        self.assertEqual(files["Giữa kỳ 2024"].file_type, File.FileType.EXAM)
+        self.assertEqual(files["Chuong 1 en"].file_type, File.FileType.EXERCISE)
+        self.assertEqual(files["Chuong 1 en"].file_language, File.FileLanguage.ENGLISH)
+        self.assertEqual(files["Giáo trình đại số"].file_type, File.FileType.BOOK)
+        self.assertEqual(files["Tài liệu 1"].file_type, File.FileType.LESSON)
+        self.assertEqual(
+            {files["Tài liệu 1"].slug_name, files["Tai lieu 1"].slug_name},
+            {"tai-lieu-1", "tai-lieu-1-2"},
+        )
+
+        file_obj = files["Giáo trình đại số"]
+        content = "content of Giáo trình đại số.PDF".encode()
+        self.assertEqual(
+            file_obj.uploaded_file.name,
+            f"blobs/{file_obj.blob.sha256[:2]}/{file_obj.blob.sha256}.pdf",
+        )
+        self.assertEqual(file_obj.blob.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(file_obj.uploaded_file.read(), content)
+        # listed by the catalog and found by the search
+        self.assertEqual(
+            FileCatalogEntry.objects.filter(subcategory=self.subcategory).count(), 6
+        )
+        self.assertEqual(
+            list(
+                search_files(File.objects.all(), "giao trinh").values_list(
+                    "name", flat=True
+                )
+            ),
+            ["Giáo trình đại số"],
+        )
+
+    def import_files(self, names):
+        items = [
+            ImportItem(
+                name, lambda name=name: ContentFile(f"content of {name}".encode())
+            )
+            for name in names
+        ]
+        return import_files(self.subcategory, items, self.user)
+
+    def test_slugs_unique_with_existing_files(self):
+        # the same slug as the file of the catalog "Bài giảng giải tích"
+        items = self.import_files(
+            ["Bai giang giai tich.pdf", "Bài giảng giải tích!.pdf"]
+        )
+        self.assertEqual(
+            sorted(item.file.slug_name for item in items),
+            ["bai-giang-giai-tich-2", "bai-giang-giai-tich-3"],
+        )
+
+    def test_blobs_released_when_insert_fails(self):
+        with (
+            mock.patch("app_studyhub.imports.insert_files", side_effect=DatabaseError),
+            mock.patch.object(Blob.objects, "release", side_effect=OSError),
+            self.assertLogs("app_studyhub.imports", "ERROR") as logs,
+        ):
+            items = self.import_files(["Tài liệu.pdf"])
+        self.assertIsInstance(items[0].error, DatabaseError)
+        self.assertIn("could not be released", logs.output[0])
+
+
+class BlobTests(CatalogDataTestCase):
+    """Files with the same content share one stored object (Blob)."""
+
+    def test_same_content_stored_once(self):
+        first_file = self.create_file("Giáo trình", "giao-trinh.pdf", b"textbook")
+        with mock.patch.object(
+            default_storage, "save", wraps=default_storage.save
+        ) as storage_save:
+            second_file = self.create_file(
+                "Giáo trình (bản sao)", "ban-sao.pdf", b"textbook"
+            )
+        storage_save.assert_not_called()
+        self.assertEqual(first_file.blob, second_file.blob)
+        self.assertEqual(first_file.uploaded_file.name, second_file.uploaded_file.name)
+        self.assertEqual(first_file.blob.size, len(b"textbook"))
+
+        # the blob is deleted with its last file only
+        stored_name = first_file.uploaded_file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first_file.delete()
+        self.assertTrue(default_storage.exists(stored_name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second_file.delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(default_storage.exists(stored_name))
+
+    def test_replaced_content_released(self):
+        file_obj = self.create_file("Giáo trình", "giao-trinh.pdf", b"textbook")
+        first_blob = file_obj.blob
+        with self.captureOnCommitCallbacks(execute=True):
+            file_obj.uploaded_file.save("v2.pdf", ContentFile(b"textbook v2"))
+        self.assertNotEqual(file_obj.blob, first_blob)
+        self.assertEqual(list(Blob.objects.all()), [file_obj.blob])
+        self.assertFalse(default_storage.exists(first_blob.storage_name))
+
+
+def make_pdf(page_count):
+    """Return the content of a PDF with the given number of (blank) pages."""
+    pdf = io.BytesIO()
+    pages = [Image.new("RGB", (10, 10)) for _ in range(page_count)]
+    pages[0].save(pdf, "PDF", save_all=True, append_images=pages[1:])
+    return pdf.getvalue()
+
+
+class FileMetadataTests(CatalogDataTestCase):
+    """Metadata (size, MIME type, page count, checksum) of the files."""
+
+    def test_metadata_extracted_on_upload(self):
+        content = make_pdf(3)
+        file_obj = self.create_file("Giáo trình", "giao-trinh.pdf", content)
+        self.assertEqual(file_obj.file_size, len(content))
+        self.assertEqual(file_obj.mime_type, "application/pdf")
+        self.assertEqual(file_obj.page_count, 3)
+        self.assertEqual(file_obj.checksum, hashlib.sha256(content).hexdigest())
+
+        # listed with the catalog
+        response = self.client.get(
+            reverse("search-all-view"),
+            {"columns[0][data]": "name", "columns[0][name]": "name", "start": 0},
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        row = next(
+            row for row in response.json()["data"] if row["id"] == str(file_obj.pk)
+        )
+        self.assertEqual(row["file_size"], len(content))
+        self.assertEqual(row["mime_type"], "application/pdf")
+        self.assertEqual(row["page_count"], 3)
+
+    def test_office_document_metadata(self):
+        document = io.BytesIO()
+        with zipfile.ZipFile(document, "w") as zf:
+            zf.writestr("[Content_Types].xml", "<Types/>")
+            zf.writestr(
+                "docProps/app.xml",
+                "<Properties><Pages>12</Pages><Words>3400</Words></Properties>",
+            )
+        metadata = inspect_content(document, "Bài tập.DOCX")
+        self.assertEqual(
+            metadata.mime_type,
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        )
+        self.assertEqual(metadata.page_count, 12)
+        self.assertEqual(metadata.size, len(document.getvalue()))
+
+    def test_backfill_command(self):
+        content = make_pdf(2)
+        default_storage.save(self.file.uploaded_file.name, ContentFile(content))
+        stdout = io.StringIO()
+        call_command("backfill_file_metadata", stdout=stdout)
+        self.assertIn("Backfilled the metadata of 1 files", stdout.getvalue())
+
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.page_count, 2)
+        self.assertEqual(self.file.checksum, hashlib.sha256(content).hexdigest())
+        entry = FileCatalogEntry.objects.get(file=self.file)
+        self.assertEqual(
+            (entry.file_size, entry.mime_type, entry.page_count),
+            (len(content), "application/pdf", 2),
+        )
+        # the files with metadata are skipped
+        call_command("backfill_file_metadata", stdout=stdout)
+        self.assertIn("Backfilled the metadata of 0 files", stdout.getvalue())
+
+
+class FilePreviewTests(CatalogDataTestCase):
+    """Thumbnails and previews rendered by the background tasks."""
+
+    def run_tasks(self):
+        call_command("run_tasks", once=True, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_previews_rendered_by_worker(self):
+        image = io.BytesIO()
+        Image.new("RGB", (1200, 1600), "white").save(image, "PNG")
+        file_obj = self.create_file("Sơ đồ", "so-do.png", image.getvalue())
+        # queued with the file, rendered later
+        task = Task.objects.get(
+            name="render_file_previews", arguments={"file_id": str(file_obj.pk)}
+        )
+        self.assertFalse(file_obj.thumbnail)
+
+        self.run_tasks()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.DONE)
+        file_obj.refresh_from_db()
+        self.assertEqual(
+            file_obj.thumbnail.name,
+            f"images/file-thumbnails/{file_obj.pk}_thumbnail.jpg",
+        )
+        with Image.open(file_obj.preview) as preview:
+            self.assertLessEqual(preview.height, 896)
+        entry = FileCatalogEntry.objects.get(file=file_obj)
+        self.assertEqual(entry.thumbnail_url, file_obj.thumbnail.url)
+        self.assertEqual(entry.preview_url, file_obj.preview.url)
+
+        # saved again without a new content: nothing to render
+        file_obj.save()
+        self.assertEqual(
+            Task.objects.filter(name=task.name, arguments=task.arguments).count(), 1
+        )
+
+    @override_settings(PDF_RASTERIZER="/nonexistent/pdftoppm")
+    def test_failed_task_retried_later(self):
+        file_obj = self.create_file("Giáo trình", "giao-trinh.pdf", make_pdf(1))
+        self.run_tasks()
+        task = Task.objects.get(
+            name="render_file_previews", arguments={"file_id": str(file_obj.pk)}
+        )
+        self.assertEqual(task.status, Task.Status.PENDING)
+        self.assertEqual(task.attempts, 1)
+        self.assertIn("FileNotFoundError", task.error)
+        self.assertGreater(task.run_after, timezone.now())
+
+
+class CoverImageVariantsTests(CatalogDataTestCase):
+    """Resized WebP variants of the cover images."""
+
+    def make_png(self, width, height):
+        image = io.BytesIO()
+        Image.new("RGB", (width, height), "teal").save(image, "PNG")
+        return ContentFile(image.getvalue())
+
+    def test_variants_rendered_on_save(self):
+        self.category.cover_image.save("photo.png", self.make_png(2000, 1000))
+        variants = self.category.cover_image_variants
+        self.assertEqual(variants["source"], self.category.cover_image.name)
+        self.assertEqual(
+            [width for width, _name in variants["variants"]], [320, 640, 960, 1280]
+        )
+        width, name = variants["variants"][0]
+        self.assertEqual(
+            name,
+            self.category.cover_image.name.removesuffix(".png") + "_320w.webp",
+        )
+        self.assertTrue(name.startswith(f"images/category-covers/{self.category.pk}"))
+        with Image.open(default_storage.open(name)) as variant:
+            self.assertEqual((variant.format, variant.size), ("WEBP", (320, 160)))
+        self.assertTrue(variants["placeholder"].startswith("data:image/webp;base64,"))
+
+        response = self.client.get(reverse("category-list-view"))
+        self.assertContains(response, f"{default_storage.url(name)} 320w")
+        self.assertContains(response, 'loading="lazy"')
+
+        # replaced: the previous variants are deleted
+        self.category.cover_image.save("small.png", self.make_png(400, 300))
+        self.assertEqual(
+            [width for width, _name in self.category.cover_image_variants["variants"]],
+            [320, 400],
+        )
+        self.assertFalse(default_storage.exists(name.replace("320w", "1280w")))
+
+    def test_not_an_image(self):
+        self.category.cover_image.save("cover.png", ContentFile(b"not an image"))
+        self.assertEqual(
+            self.category.cover_image_variants,
+            {"source": self.category.cover_image.name},
+        )
+        response = self.client.get(reverse("category-list-view"))
+        self.assertContains(response, f'src="{self.category.cover_image.url}"')
+
+
+def make_office_document(parts):
+    """Return the content of an Office Open XML document made of the given parts."""
+    document = io.BytesIO()
+    with zipfile.ZipFile(document, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        for name, xml in parts.items():
+            zf.writestr(name, xml)
+    return document.getvalue()
+
+
+def make_docx(*paragraphs):
+    body = "".join(
+        f"<w:p><w:r><w:t>{paragraph}</w:t></w:r></w:p>" for paragraph in paragraphs
+    )
+    return make_office_document(
+        {
+            "word/document.xml": (
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+                f'wordprocessingml/2006/main"><w:body>{body}</w:body></w:document>'
+            )
+        }
+    )
+
+
+class DocumentTextTests(CatalogDataTestCase):
+    """Text extracted from the contents of the files and content search."""
+
+    def search_contents(self, query):
+        return self.client.get(
+            reverse("search-all-view"),
+            {
+                "columns[0][data]": "name",
+                "columns[0][name]": "name",
+                "columns[0][search][value]": query,
+                "start": 0,
+                "mode": "content",
+            },
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        ).json()
+
+    def test_text_extracted_and_searched(self):
+        content = make_docx(
+            "Chương 1: Động lực học",
+            "Định luật Newton thứ hai &amp; thứ ba.",
+        )
+        file_obj = self.create_file("Bài đọc thêm", "chuong-1.docx", content)
+        call_command("run_tasks", once=True, stdout=io.StringIO())
+        document = DocumentText.objects.get(sha256=file_obj.checksum)
+        self.assertIn("Định luật Newton thứ hai", document.text)
+
+        # accent insensitive, only the contents are searched
+        data = self.search_contents("dinh luat newton")
+        self.assertEqual(data["recordsFiltered"], 1)
+        row = data["data"][0]
+        self.assertEqual(row["id"], str(file_obj.pk))
+        self.assertIn("<mark>Newton</mark>", row["snippet"])
+        self.assertIn("thứ hai &amp;", row["snippet"])
+        self.assertEqual(self.search_contents("đọc thêm")["recordsFiltered"], 0)
+
+    def test_same_content_extracted_once(self):
+        content = make_docx("Tích phân từng phần")
+        original = self.create_file("Tích phân", "tich-phan.docx", content)
+        call_command("run_tasks", once=True, stdout=io.StringIO())
+
+        copy = self.create_file("Tích phân (bản sao)", "ban-sao.docx", content)
+        with mock.patch("app_studyhub.extraction.extract_stored_text") as extract:
+            call_command("run_tasks", once=True, stdout=io.StringIO())
+        extract.assert_not_called()
+        self.assertEqual(DocumentText.objects.count(), 1)
+        # both files are found
+        self.assertEqual(
+            {row["id"] for row in self.search_contents("tích phân")["data"]},
+            {str(original.pk), str(copy.pk)},
+        )
+
+    def test_queued_apart_from_previews(self):
+        file_obj = self.create_file("Tích phân", "tich-phan.docx", make_docx("x"))
+        Task.objects.all().delete()
+
+        def pending_tasks():
+            file_obj.save()
+            return sorted(
+                Task.objects.filter(
+                    arguments={"file_id": str(file_obj.pk)},
+                    status=Task.Status.PENDING,
+                ).values_list("name", flat=True)
+            )
+
+        # previews rendered, text not extracted (e.g. failed)
+        File.objects.filter(pk=file_obj.pk).update(
+            previewed_file=file_obj.uploaded_file.name
+        )
+        file_obj.refresh_from_db()
+        self.assertEqual(pending_tasks(), ["extract_file_text"])
+
+        # text extracted, previews to render again
+        Task.objects.all().delete()
+        DocumentText.objects.store({file_obj.checksum: "x"})
+        File.objects.filter(pk=file_obj.pk).update(previewed_file="")
+        file_obj.refresh_from_db()
+        self.assertEqual(pending_tasks(), ["render_file_previews"])
+
+    def test_reindex_command(self):
+        presentation = make_office_document(
+            {
+                f"ppt/slides/slide{number}.xml": (
+                    '<p:sld xmlns:p="http://schemas.openxmlformats.org/'
+                    'presentationml/2006/main" xmlns:a="http://schemas.'
+                    'openxmlformats.org/drawingml/2006/main"><a:p><a:r>'
+                    f"<a:t>{text}</a:t></a:r></a:p></p:sld>"
+                )
+                for number, text in ((2, "Ma trận nghịch đảo"), (1, "Định thức"))
+            }
+        )
+        file_obj = self.create_file("Đại số", "dai-so.pptx", presentation)
+        stdout = io.StringIO()
+        call_command("reindex_file_text", processes=1, stdout=stdout)
+        self.assertIn("Indexed the text of 1 contents", stdout.getvalue())
+        # the slides in their order
+        self.assertEqual(
+            DocumentText.objects.get(sha256=file_obj.checksum).text,
+            "Định thức\nMa trận nghịch đảo",
+        )
+
+        # the indexed contents are skipped
+        call_command("reindex_file_text", processes=1, stdout=stdout)
+        self.assertIn("Indexed the text of 0 contents", stdout.getvalue())
+
+
+class SyncCatalogTests(CatalogDataTestCase):
+    """Incremental sync of a directory of documents (sync_catalog command)."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, path, content):
+        path = self.directory / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+    def sync(self):
+        stdout = io.StringIO()
+        call_command(
+            "sync_catalog",
+            str(self.directory),
+            user=self.user.username,
+            stdout=stdout,
+            stderr=io.StringIO(),
+        )
+        return stdout.getvalue()
+
+    def test_sync_directory(self):
+        self.write("Khoa học/Toán cao cấp/Đề thi/Giữa kỳ 2024.pdf", b"exam")
+        self.write("Khoa học/Vật lý/Bài giảng cơ học.pdf", b"lesson")
+        self.write("Ngoại ngữ/Tiếng Anh/Grammar_book.pdf", b"book")
+        output = self.sync()
+        self.assertIn("3 created, 0 updated, 0 unchanged", output)
+        exam = File.objects.get(name="Giữa kỳ 2024")
+        self.assertEqual(exam.subcategory, self.subcategory)
+        self.assertEqual(exam.file_type, File.FileType.EXAM)
+        self.assertEqual(
+            Subcategory.objects.get(name="Tiếng Anh").category.name, "Ngoại ngữ"
+        )
+
+        # nothing changed: no file is read nor uploaded again
+        with mock.patch(
+            "app_studyhub.management.commands.sync_catalog.file_sha256"
+        ) as file_sha256:
+            output = self.sync()
+        file_sha256.assert_not_called()
+        self.assertIn("0 created, 0 updated, 3 unchanged, 0 deleted", output)
+
+        # modified, touched, moved and removed files
+        self.write("Khoa học/Toán cao cấp/Đề thi/Giữa kỳ 2024.pdf", b"exam v2")
+        self.write("Khoa học/Vật lý/Bài giảng cơ học.pdf", b"lesson")
+        (self.directory / "Ngoại ngữ/Tiếng Anh/Grammar_book.pdf").unlink()
+        self.write("Khoa học/Vật lý/Bài tập/Chương 1.pdf", b"exercise")
+        # cached by the page cache
+        self.assertContains(self.client.get(reverse("category-list-view")), "Ngoại")
+        with self.captureOnCommitCallbacks(execute=True):
+            output = self.sync()
+        self.assertIn("1 created, 1 updated, 1 unchanged, 1 deleted", output)
+        exam.refresh_from_db()
+        self.assertEqual(exam.uploaded_file.read(), b"exam v2")
+        self.assertEqual(
+            len(default_storage.listdir(exam.uploaded_file.name.rsplit("/", 1)[0])[1]),
+            1,
+        )
+        self.assertFalse(File.objects.filter(name="Grammar book").exists())
+        self.assertFalse(Subcategory.objects.get(name="Tiếng Anh").is_active)
+        self.assertFalse(Category.objects.get(name="Ngoại ngữ").is_active)
+        # the deactivated folders leave the catalog tree and the cached pages
+        self.assertNotContains(self.client.get(reverse("category-list-view")), "Ngoại")
+        self.assertEqual(
+            File.objects.get(name="Chương 1").file_type,
+            File.FileType.EXERCISE,
+        )
+
+
+@override_settings(DATABASE_REPLICAS=[], STORAGES=TEST_STORAGES)
+class SeedCatalogTests(TestCase):
+    """Synthetic catalog of the benchmarks."""
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, **options):
+        call_command(
+            "seed_catalog",
+            categories=3,
+            subcategories=30,
+            files=300,
+            batch_size=100,
+            stdout=io.StringIO(),
+            **options,
+        )
+
+    def test_seed_catalog(self):
+        self.seed()
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Subcategory.objects.count(), 30)
+        self.assertEqual(FileCatalogEntry.objects.count(), 300)
+        names = list(File.objects.order_by("name").values_list("name", flat=True))
+
+        # listed like the files created one by one
+        subcategory = Subcategory.objects.filter(files__isnull=False).first()
+        response = self.client.get(
+            subcategory.get_absolute_url(),
+            {"columns[0][data]": "name", "start": 0, "length": 10},
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self.assertEqual(response.json()["recordsTotal"], subcategory.files.count())
+        self.assertIn("ETag", response.headers)
+        category_node = get_catalog_tree().get_category(subcategory.category.slug_name)
+        self.assertEqual(
+            category_node.file_count,
+            File.objects.filter(subcategory__category=subcategory.category).count(),
+        )
+        # the search fields are filled by the triggers
+        self.assertEqual(
+            search_files(subcategory.files.all(), subcategory.name).count(),
+            subcategory.files.count(),
+        )
+
+        # the same catalog for the same seed
+        with self.assertRaisesMessage(CommandError, "not empty"):
+            self.seed()
+        FileCatalogEntry.objects.all().delete()
+        File.objects.all().delete()
+        Subcategory.objects.all().delete()
+        Category.objects.all().delete()
+        self.seed()
+        self.assertEqual(
+            list(File.objects.order_by("name").values_list("name", flat=True)), names
+        )
+
+
+class InvalidationBusTests(TransactionTestCase):
+    """The changes reach the local caches of the other processes."""
+
+    def listen_in_child(self, results):
+        # forked: own database connections, own copy of the local cache
+        try:
+            listener = start_listener()
+            listener.listening.wait(10)
+            names = [category.name for category in get_catalog_tree().categories]
+            results.put(names)
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                changed = [category.name for category in get_catalog_tree().categories]
+                if changed != names:
+                    break
+                time.sleep(0.01)
+            results.put(changed)
+        finally:
+            connections.close_all()
+
+    def test_listeners_apply_changes_of_other_processes(self):
+        user = UserAccount.objects.create_user(
+            username="studyhub", email="studyhub@example.com", password="studyhub"
+        )
+        category = Category.objects.create(name="Khoa học", created_by=user)
+        # the children must not share the connections (nor pool) of this process
+        connections.close_all()
+        connections["default"].close_pool()
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        children = [
+            context.Process(target=self.listen_in_child, args=(results,))
+            for _ in range(2)
+        ]
+        for child in children:
+            child.start()
+        try:
+            for _ in children:
+                self.assertEqual(results.get(timeout=20), ["Khoa học"])
+
+            category.name = "Tin học"
+            category.save()
+            for _ in children:
+                self.assertEqual(results.get(timeout=20), ["Tin học"])
+        finally:
+            for child in children:
+                child.join(10)
+                if child.is_alive():
+                    child.kill()
@@ -0,0 +1,75 @@
+from django.core import signing
+from django.core.files.storage import default_storage
+from storages.backends.s3 import S3Storage
+from storages.utils import clean_name
+
+from .models import File
+
+# Largest file accepted by a direct upload (a presigned POST allows 5 GB)
+DIRECT_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+# Seconds during which the browser can use the presigned POST,
+# and then the admin form can be saved with the uploaded object
+DIRECT_UPLOAD_EXPIRES = 60 * 60
+DIRECT_UPLOAD_SALT = "app_studyhub.uploads.direct-upload"
+
+
+def supports_direct_upload(storage=None):
+    """Return True when the browser can upload straight to the storage (S3)."""
+    return isinstance(storage or default_storage, S3Storage)
+
+
+def get_direct_upload_key(name, subcategory, file_type, filename, storage=None):
+    """
+    Return the storage key of a file which is not saved yet, it is computed
+    by File.file_upload_to, the same as for a file uploaded through the form.
+    """
+    storage = storage or default_storage
+    file_obj = File(name=name, subcategory=subcategory, file_type=file_type)
+    # the slug of the file is part of the key
+    File._meta.get_field("slug_name").pre_save(file_obj, add=True)
+    key = File.file_upload_to(file_obj, filename)
+    # never overwrite an existing object
+    return storage.get_available_name(
+        key, max_length=File._meta.get_field("uploaded_file").max_length
+    )
+
+
+def create_direct_upload(key, content_type, storage=None):
+    """
+    Return the URL and the form fields of a presigned POST request
+    which uploads one file to the given key of the S3 bucket.
+    """
+    storage = storage or default_storage
+    fields = {"Content-Type": content_type}
+    conditions = [
+        {"Content-Type": content_type},
+        ["content-length-range", 1, DIRECT_UPLOAD_MAX_SIZE],
+    ]
+    if storage.default_acl:
+        fields["acl"] = storage.default_acl
+        conditions.append({"acl": storage.default_acl})
+    return storage.connection.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(clean_name(key)),
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=DIRECT_UPLOAD_EXPIRES,
+    )
+
+
+def sign_direct_upload(key, name, subcategory_id, file_type):
+    """Return a token proving that the key was given by the server for this file."""
+    return signing.dumps(
+        {
+            "key": key,
+            "name": name,
+            "subcategory": str(subcategory_id),
+            "file_type": file_type,
+        },
+        salt=DIRECT_UPLOAD_SALT,
+    )
+
+
+def unsign_direct_upload(token):
+    """Return the data of the token, raise signing.BadSignature if invalid."""
+    return signing.loads(token, salt=DIRECT_UPLOAD_SALT, max_age=DIRECT_UPLOAD_EXPIRES)
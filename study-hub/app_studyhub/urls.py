@@ -2,10 +2,13 @@ from django.urls import path
 
 from .views import (
     AboutView,
+    CatalogExportView,
     CategoryDetailView,
     CategoryListView,
     ContactView,
+    FileArchiveView,
     HomeView,
+    MetricsView,
     SearchView,
     SubcategoryDetailView,
 )
@@ -15,6 +18,13 @@ urlpatterns = [
     path("about/", AboutView.as_view(), name="about-view"),
     path("contact/", ContactView.as_view(), name="contact-view"),
     path("search/", SearchView.as_view(), name="search-all-view"),
+    path(
+        "export/<slug:export_format>/",
+        CatalogExportView.as_view(),
+        name="catalog-export-view",
+    ),
+    path("metrics", MetricsView.as_view(), name="metrics-view"),
+    path("download/", FileArchiveView.as_view(), name="file-archive-view"),
     path("category/", CategoryListView.as_view(), name="category-list-view"),
     path(
         "category/<slug:slug_name>/",
@@ -1,11 +1,49 @@
+import uuid
+from pathlib import Path
+from urllib.parse import urlencode
+
 from app_account.models import Feedback
-from django.http import HttpResponseRedirect, JsonResponse
-from django.urls import reverse_lazy
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from django.utils.translation import gettext_lazy as _
-from django.views.generic import CreateView, DetailView, ListView, TemplateView
-
+from django.views.generic import (
+    CreateView,
+    DetailView,
+    ListView,
+    TemplateView,
+    View,
+)
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from .archives import ArchiveMember, astream_zip, stream_zip
+from .catalog import aget_catalog_tree, get_catalog_tree
+from .datatables import DataTablesMixin
 from .forms import FeedbackForm
-from .models import Category, File, Subcategory
+from .metrics import render_metrics
+from .models import CatalogVersion, DocumentText, File, FileCatalogEntry
+from .search import highlight_snippet, search_contents
+from .streaming import (
+    aiter_rows,
+    astream_csv,
+    astream_json,
+    astream_jsonl,
+    iter_rows,
+    stream_csv,
+    stream_json,
+    stream_jsonl,
+)
 
 
 class HomeView(TemplateView):
@@ -15,10 +53,17 @@ class HomeView(TemplateView):
 
     template_name = "index.html"
 
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        context_data["category_list"] = get_catalog_tree().categories
+        return context_data
+
     def post(self, request, *args, **kwargs):
-        search_query = request.POST.get("search").strip()
+        search_query = request.POST.get("search", "").strip()
         if search_query:
-            return HttpResponseRedirect(redirect_to=reverse_lazy("search-all-view"))
+            return HttpResponseRedirect(
+                redirect_to=f"{reverse('search-all-view')}?{urlencode({'q': search_query})}"
+            )
         return HttpResponseRedirect(redirect_to=reverse_lazy("home-view"))
 
 
@@ -84,13 +129,23 @@ class CategoryListView(ListView):
     List of categories (Phân loại) page view.
     """
 
-    model = Category
+    # read from a replica (see routers.ReplicaRoutingMiddleware)
+    use_read_replica = True
     template_name = "category/category-list.html"
     context_object_name = "category_list"
     extra_context = {
         "metadata_title": _("Phân loại | StudyHub"),
     }
 
+    def get_queryset(self):
+        return get_catalog_tree().categories
+
+    async def get(self, request, *args, **kwargs):
+        # the categories come from the catalog tree kept in memory
+        self.object_list = (await aget_catalog_tree()).categories
+        context = self.get_context_data()
+        return self.render_to_response(context)
+
 
 class CategoryDetailView(DetailView):
     """
@@ -100,23 +155,37 @@ class CategoryDetailView(DetailView):
     subcategories/subjects belongs to a specific category.
     """
 
-    model = Category
-    slug_field = "slug_name"
+    use_read_replica = True
     slug_url_kwarg = "slug_name"
     template_name = "category/category-detail.html"
     context_object_name = "category_detail"
 
+    def get_object(self, queryset=None):
+        return self.get_category_node(get_catalog_tree())
+
+    async def aget_object(self):
+        return self.get_category_node(await aget_catalog_tree())
+
+    def get_category_node(self, catalog_tree):
+        category_node = catalog_tree.get_category(self.kwargs[self.slug_url_kwarg])
+        if category_node is None:
+            raise Http404(_("Không tìm thấy phân loại."))
+        return category_node
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
+
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        category_obj = self.get_object()
-        context_data["metadata_title"] = f"{category_obj.name} | StudyHub"
-        context_data["subcategory_list"] = Subcategory.objects.filter(
-            category=category_obj
-        )
+        category_node = self.object
+        context_data["metadata_title"] = f"{category_node.name} | StudyHub"
+        context_data["subcategory_list"] = category_node.subcategories
         return context_data
 
 
-class SubcategoryDetailView(DetailView):
+class SubcategoryDetailView(DataTablesMixin, DetailView):
     """
     Detail page view of a specific subcategory/subject.
 
@@ -124,59 +193,68 @@ class SubcategoryDetailView(DetailView):
     belongs to a specific subcategory/subject.
     """
 
-    model = Subcategory
-    slug_field = "slug_name"
+    use_read_replica = True
     slug_url_kwarg = "subcategory_slugname"
     template_name = "category/subcategory-detail.html"
     context_object_name = "subcategory"
 
+    def get_object(self, queryset=None):
+        return self.get_subcategory_node(get_catalog_tree())
+
+    async def aget_object(self):
+        return self.get_subcategory_node(await aget_catalog_tree())
+
+    def get_subcategory_node(self, catalog_tree):
+        subcategory_node = catalog_tree.get_subcategory(
+            self.kwargs["category_slugname"], self.kwargs[self.slug_url_kwarg]
+        )
+        if subcategory_node is None:
+            raise Http404(_("Không tìm thấy môn học."))
+        return subcategory_node
+
     def get_context_data(self, **kwargs):
         context_data = super().get_context_data(**kwargs)
-        subcategory_obj = self.get_object()
-        context_data["metadata_title"] = f"{subcategory_obj.name} | StudyHub"
+        subcategory_node = self.object
+        context_data["metadata_title"] = f"{subcategory_node.name} | StudyHub"
         return context_data
 
-    def get_datatables_data(self, request):
-        """
-        Handle DataTables.net Ajax requests.
-        """
+    def get_datatables_stamp(self):
+        return CatalogVersion.objects.get_stamp(
+            subcategory_slug=self.kwargs[self.slug_url_kwarg]
+        )
 
-        obj_query = self.get_object().files.all()
-        data_list = []
-        for each in obj_query:
-            data_list.append(
-                {
-                    "id": str(each.id),
-                    "name": each.name,
-                    "category": each.subcategory.category.name,
-                    "subcategory": each.subcategory.name,
-                    "file_type": each.get_file_type_display(),
-                    "file_language": each.get_file_language_display(),
-                    "uploaded_file": each.uploaded_file.url,
-                    "last_modified": (
-                        each.last_modified.date().strftime("%d/%m/%Y")
-                        if each.last_modified
-                        else each.date_created.date().strftime("%d/%m/%Y")
-                    ),
-                }
-            )
-        return JsonResponse({"data": data_list})
+    async def aget_datatables_stamp(self):
+        return await CatalogVersion.objects.aget_stamp(
+            subcategory_slug=self.kwargs[self.slug_url_kwarg]
+        )
 
-    def get(self, request, *args, **kwargs):
+    def get_datatables_queryset(self):
+        return FileCatalogEntry.objects.filter(subcategory_id=self.object.id)
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
         # Check if this is an Ajax request or not
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            return self.get_datatables_data(request)
+            return await self.aget_datatables_data(request)
         # Otherwise, render this page/view normally
-        return super().get(request, *args, **kwargs)
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
 
 
-class SearchView(ListView):
+class SearchView(DataTablesMixin, ListView):
     """
     "Search" (Tìm kiếm) page view.
 
-    This view queries all objects from File model.
+    This view queries all objects from File model. The name column searches
+    the names of the files, or the text of their contents with "mode=content".
     """
 
+    use_read_replica = True
+    search_modes = {
+        "name": _("Tên tài liệu"),
+        "content": _("Nội dung"),
+    }
+
     model = File
     template_name = "search.html"
     extra_context = {
@@ -190,35 +268,181 @@ class SearchView(ListView):
         """
         return File.objects.none()
 
-    def get_datatables_data(self, request):
-        """
-        Handle DataTables.net Ajax requests.
-        """
+    def get_context_data(self, **kwargs):
+        context_data = super().get_context_data(**kwargs)
+        # the search query from other pages (e.g. "Home" page),
+        # DataTables.net sends it back with its Ajax requests
+        context_data["search_query"] = self.request.GET.get("q", "").strip()
+        context_data["search_modes"] = self.search_modes
+        context_data["search_mode"] = self.get_search_mode()
+        return context_data
 
-        allObjectsQuery = File.objects.select_related("subcategory").order_by("name")
-        data_list = []
-        for each in allObjectsQuery:
-            data_list.append(
-                {
-                    "id": str(each.id),
-                    "name": each.name,
-                    "category": each.subcategory.category.name,
-                    "subcategory": each.subcategory.name,
-                    "file_type": each.get_file_type_display(),
-                    "file_language": each.get_file_language_display(),
-                    "uploaded_file": each.uploaded_file.url,
-                    "last_modified": (
-                        each.last_modified.date().strftime("%d/%m/%Y")
-                        if each.last_modified
-                        else each.date_created.date().strftime("%d/%m/%Y")
-                    ),
-                }
-            )
-        return JsonResponse({"data": data_list})
+    def get_search_mode(self):
+        mode = self.request.GET.get("mode", "")
+        return mode if mode in self.search_modes else "name"
 
-    def get(self, request, *args, **kwargs):
+    def get_datatables_queryset(self):
+        return FileCatalogEntry.objects.active()
+
+    def filter_datatables_column(self, queryset, name, search_value):
+        if name == "name" and self.get_search_mode() == "content":
+            return search_contents(queryset, DocumentText.objects.all(), search_value)
+        return super().filter_datatables_column(queryset, name, search_value)
+
+    def get_datatables_row(self, entry):
+        row = super().get_datatables_row(entry)
+        snippet = getattr(entry, "search_snippet", None)
+        if snippet:
+            row["snippet"] = highlight_snippet(snippet)
+        return row
+
+    async def get(self, request, *args, **kwargs):
         # Check if this is an Ajax request or not
         if request.headers.get("X-Requested-With") == "XMLHttpRequest":
-            return self.get_datatables_data(request)
-        # Otherwise, render this page/view normally
-        return super().get(request, *args, **kwargs)
+            return await self.aget_datatables_data(request)
+        # Otherwise, render this page/view normally (no query: empty list)
+        self.object_list = self.get_queryset()
+        context = self.get_context_data()
+        return self.render_to_response(context)
+
+
+class CatalogExportView(DataTablesMixin, View):
+    """
+    Bulk export of the file catalog as CSV, JSON Lines or JSON.
+
+    The rows are streamed while they are read from the database,
+    so the memory usage does not grow with the size of the catalog.
+    Under ASGI, they are streamed by an asynchronous iterator: a synchronous
+    one is read whole in memory.
+
+    The export is public: it holds the rows which the search page already
+    lists to everyone (its full listing). As the listings, it is validated
+    by the catalog version stamp, an unchanged catalog is answered with
+    "304 Not Modified" after one query.
+    """
+
+    # read from a replica (see routers.ReplicaRoutingMiddleware)
+    use_read_replica = True
+    export_formats = {
+        "csv": (stream_csv, astream_csv, "text/csv; charset=utf-8"),
+        "jsonl": (stream_jsonl, astream_jsonl, "application/x-ndjson"),
+        "json": (stream_json, astream_json, "application/json"),
+    }
+
+    def get_datatables_queryset(self):
+        return FileCatalogEntry.objects.active()
+
+    def get(self, request, *args, **kwargs):
+        export_format = kwargs["export_format"]
+        if export_format not in self.export_formats:
+            raise Http404(_("Unsupported export format."))
+        stream, astream, content_type = self.export_formats[export_format]
+
+        validators = self.get_datatables_validators(
+            request, self.get_datatables_stamp()
+        )
+        response = self.get_not_modified_response(request, validators)
+        if response is not None:
+            return self.patch_datatables_response(response, validators)
+
+        queryset = self.get_datatables_queryset().order_by(
+            "category_name", "subcategory_name", "name", "pk"
+        )
+        if isinstance(request, ASGIRequest):
+            content = astream(aiter_rows(queryset, self.get_datatables_row))
+        else:
+            content = stream(iter_rows(queryset, self.get_datatables_row))
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="studyhub-catalog.{export_format}"'
+        )
+        return self.patch_datatables_response(response, validators)
+
+
+class FileArchiveView(View):
+    """
+    Download of the files selected in the table as one ZIP archive.
+
+    The archive is streamed while the files are fetched from the storage,
+    it is never kept in memory nor on disk (by an asynchronous iterator
+    under ASGI).
+    """
+
+    max_files = 100
+
+    def get_archive_members(self, files):
+        """Return ArchiveMember objects, grouped in one folder per subject."""
+        members = []
+        used_names = set()
+        for file_obj in files:
+            suffix = Path(file_obj.uploaded_file.name).suffix.lower()
+            folder = file_obj.subcategory.name.replace("/", "-")
+            stem = file_obj.name.replace("/", "-")
+            archive_name = f"{folder}/{stem}{suffix}"
+            copy_number = 1
+            while archive_name in used_names:
+                copy_number += 1
+                archive_name = f"{folder}/{stem} ({copy_number}){suffix}"
+            used_names.add(archive_name)
+
+            modified = timezone.localtime(
+                file_obj.last_modified or file_obj.date_created
+            )
+            members.append(
+                ArchiveMember(
+                    storage_name=file_obj.uploaded_file.name,
+                    archive_name=archive_name,
+                    date_time=modified.timetuple()[:6],
+                )
+            )
+        return members
+
+    def post(self, request, *args, **kwargs):
+        file_ids = []
+        for file_id in request.POST.getlist("file_ids"):
+            try:
+                file_ids.append(uuid.UUID(file_id))
+            except ValueError:
+                return HttpResponseBadRequest(_("Invalid file id."))
+        if len(file_ids) > self.max_files:
+            return HttpResponseBadRequest(
+                _("At most %(max_files)d files can be downloaded at once.")
+                % {"max_files": self.max_files}
+            )
+
+        files = (
+            File.objects.filter(
+                pk__in=file_ids,
+                subcategory__is_active=True,
+                subcategory__category__is_active=True,
+            )
+            .select_related("subcategory")
+            .order_by("subcategory__name", "name", "pk")
+        )
+        members = self.get_archive_members(files)
+        if not members:
+            raise Http404(_("No file found."))
+
+        if isinstance(request, ASGIRequest):
+            content = astream_zip(members)
+        else:
+            content = stream_zip(members)
+        response = StreamingHttpResponse(content, content_type="application/zip")
+        response["Content-Disposition"] = 'attachment; filename="studyhub.zip"'
+        return response
+
+
+class MetricsView(View):
+    """
+    Metrics of the server in the Prometheus text format (see
+    app_studyhub.metrics), for the scraper sending the bearer METRICS_TOKEN.
+    Not found without METRICS_TOKEN.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not settings.METRICS_TOKEN:
+            raise Http404
+        authorization = request.headers.get("Authorization", "")
+        if not constant_time_compare(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+            raise PermissionDenied
+        return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
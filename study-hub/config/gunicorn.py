@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration of the production server (see entrypoint.production.sh).
+
+https://docs.gunicorn.org/en/stable/settings.html
+"""
+
+import os
+import shutil
+
+bind = "0.0.0.0:8000"
+workers = 3
+
+# the workers write their metrics (app_studyhub.metrics) to this directory,
+# which /metrics sums up whichever worker serves it
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/studyhub-metrics")
+
+
+def on_starting(server):
+    # the files of the workers of a previous run would be summed up too
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_worker_init(worker):
+    # each worker applies the invalidations made by the other processes
+    # (categories, subcategories, files) to its local caches
+    from app_studyhub.invalidation import start_listener
+
+    start_listener()
+
+
+def child_exit(server, worker):
+    # the gauges of a dead worker are removed, its counters are kept
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     "django.contrib.contenttypes",
     "django.contrib.sessions",
     "django.contrib.messages",
+    "django.contrib.postgres",
     "whitenoise.runserver_nostatic",
     "django.contrib.staticfiles",
     # third-party apps:
@@ -55,12 +56,22 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "app_studyhub.staticfiles.StaticFilesMiddleware",
+    # records the queries counted by the query budget middleware, after it
+    "app_studyhub.metrics.MetricsMiddleware",
+    # counts the queries of all the middlewares after it and of the views
+    "app_studyhub.querybudget.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
+    # after the language and CSRF middlewares, before any session or user access
+    "app_studyhub.pagecache.AnonymousPageCacheMiddleware",
+    # after the page cache, which renders the pages it caches from the primary
+    "app_studyhub.routers.ReplicaRoutingMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # after the authentication, the staff users profile their requests
+    "app_studyhub.profiling.ProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -92,14 +103,120 @@ WSGI_APPLICATION = "config.wsgi.application"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
+# Connections are persistent (one per thread, checked before each request)
+# or, with DJANGO_DATABASE_POOL, taken from a psycopg 3 pool per process which
+# its threads share. The pool only keeps the connections given back healthy.
+# Under ASGI (DJANGO_ASGI, see entrypoint.production.sh) the connections belong
+# to a request, not to a thread: they are closed after it, unless pooled.
+DATABASE_POOL = app_env.bool("DJANGO_DATABASE_POOL", default=False)
+ASGI_SERVER = app_env.bool("DJANGO_ASGI", default=False)
+persistent_connections = not (DATABASE_POOL or ASGI_SERVER)
+database_options = {
+    "engine": "django.db.backends.postgresql",
+    "conn_max_age": 900 if persistent_connections else 0,  # (15 minutes)
+    "conn_health_checks": persistent_connections,
+    "ssl_require": False,
+}
+
 DATABASES = {
-    "default": dj_database_url.config(
-        env="DJANGO_DATABASE_URL",
-        engine="django.db.backends.postgresql",
-        conn_max_age=900,  # (900 seconds = 15 minutes)
-        conn_health_checks=True,
-        ssl_require=False,
-    )
+    "default": dj_database_url.config(env="DJANGO_DATABASE_URL", **database_options)
+}
+
+# Read replicas of the default database (comma separated URLs), used by the
+# read-only views (see app_studyhub.routers); they mirror it in the tests
+DATABASE_REPLICAS = []
+for index, replica_url in enumerate(
+    app_env.list("DJANGO_DATABASE_REPLICA_URLS", default=[]), start=1
+):
+    replica_alias = f"replica_{index}"
+    DATABASES[replica_alias] = dj_database_url.parse(replica_url, **database_options)
+    # a replica which is down is noticed quickly (the primary is used)
+    DATABASES[replica_alias]["OPTIONS"] = {"connect_timeout": 2}
+    DATABASES[replica_alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(replica_alias)
+
+if DATABASE_POOL:
+    # https://www.psycopg.org/psycopg3/docs/api/pool.html#the-connectionpool-class
+    for database in DATABASES.values():
+        database.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": app_env.int("DJANGO_DATABASE_POOL_MIN_SIZE", default=1),
+            "max_size": app_env.int("DJANGO_DATABASE_POOL_MAX_SIZE", default=4),
+            # seconds a request waits for a connection before failing
+            "timeout": app_env.float("DJANGO_DATABASE_POOL_TIMEOUT", default=10.0),
+            # seconds after which a connection is replaced
+            "max_lifetime": app_env.float(
+                "DJANGO_DATABASE_POOL_MAX_LIFETIME", default=3600.0
+            ),
+            # seconds after which an unused connection (above min_size) is closed
+            "max_idle": app_env.float("DJANGO_DATABASE_POOL_MAX_IDLE", default=600.0),
+        }
+
+DATABASE_ROUTERS = ["app_studyhub.routers.ReplicaRouter"]
+
+# Queries per request allowed by URL name (None: not checked), see
+# app_studyhub.querybudget. A request over its budget, or repeating the same
+# read QUERY_REPEAT_THRESHOLD times (N+1 queries), is logged as a warning, or
+# fails with DJANGO_QUERY_BUDGET_STRICT (tests).
+QUERY_BUDGET_DEFAULT = app_env.int("DJANGO_QUERY_BUDGET_DEFAULT", default=20)
+QUERY_BUDGETS = {
+    "home-view": 2,
+    "category-list-view": 2,
+    "category-detail-view": 2,
+    "subcategory-detail-view": 6,
+    "search-all-view": 8,
+    # the files of an archive are imported by an action of the changelist
+    "admin:app_studyhub_subcategory_changelist": None,
+}
+QUERY_REPEAT_THRESHOLD = app_env.int("DJANGO_QUERY_REPEAT_THRESHOLD", default=5)
+QUERY_BUDGET_STRICT = app_env.bool("DJANGO_QUERY_BUDGET_STRICT", default=False)
+
+# Seconds a visitor reads from the primary after a write (e.g. contact form,
+# admin), while the replicas catch up
+DATABASE_REPLICA_PIN_SECONDS = app_env.int(
+    "DJANGO_DATABASE_REPLICA_PIN_SECONDS", default=5
+)
+
+# Bearer token of the Prometheus scraper of /metrics (app_studyhub.metrics),
+# the page is not found without it
+METRICS_TOKEN = app_env.str("DJANGO_METRICS_TOKEN", default="")
+
+# Profile one request in DJANGO_PROFILER_SAMPLE_RATE (0: none, the staff
+# users still profile theirs with ?_profile=inline|save), see
+# app_studyhub.profiling. The reports are logged to DJANGO_PROFILER_LOG_FILE,
+# rotated every 10 MiB.
+PROFILER_SAMPLE_RATE = app_env.int("DJANGO_PROFILER_SAMPLE_RATE", default=0)
+PROFILER_LOG_FILE = app_env.str("DJANGO_PROFILER_LOG_FILE", default="")
+if PROFILER_LOG_FILE:
+    LOGGING = {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "handlers": {
+            "profiles": {
+                "class": "logging.handlers.RotatingFileHandler",
+                "filename": PROFILER_LOG_FILE,
+                "maxBytes": 10 * 1024 * 1024,
+                "backupCount": 5,
+                "encoding": "utf-8",
+            },
+        },
+        "loggers": {
+            "app_studyhub.profiling": {
+                "handlers": ["profiles"],
+                "level": "INFO",
+                "propagate": False,
+            },
+        },
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# A cache private to each process (the default) is kept up to date with the
+# changes made by the others by app_studyhub.invalidation (PostgreSQL
+# LISTEN/NOTIFY), a shared cache (e.g. "redis://...") needs no listener.
+
+CACHES = {
+    "default": app_env.cache_url("DJANGO_CACHE_URL", default="locmemcache://"),
 }
 
 
@@ -188,6 +305,14 @@ AWS_S3_FILE_OVERWRITE = False
 AWS_QUERYSTRING_AUTH = False
 
 
+# Command rendering the first page of PDF documents (thumbnails and previews),
+# "pdftoppm" of Poppler (poppler-utils package)
+PDF_RASTERIZER = app_env.str("PDF_RASTERIZER", default="pdftoppm")
+# Command extracting the text of PDF documents (content search),
+# "pdftotext" of Poppler (poppler-utils package)
+PDF_TEXT_EXTRACTOR = app_env.str("PDF_TEXT_EXTRACTOR", default="pdftotext")
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
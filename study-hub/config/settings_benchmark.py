@@ -0,0 +1,65 @@
+"""
+Hermetic settings of the benchmarks (see "manage.py benchmark_urls"): a local
+PostgreSQL server, the files on the local disk, a local cache, no AWS access.
+
+    DJANGO_SETTINGS_MODULE=config.settings_benchmark python manage.py benchmark_urls
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+# required by the base settings, the environment (or .env) may override them
+os.environ.setdefault("DJANGO_SECRET_KEY", "studyhub-benchmark")
+os.environ.setdefault(
+    "DJANGO_DATABASE_URL", "postgres://postgres@localhost:5432/studyhub"
+)
+for name in (
+    "AWS_ACCESS_KEY_ID",
+    "AWS_SECRET_ACCESS_KEY",
+    "AWS_STORAGE_BUCKET_NAME",
+    "AWS_S3_REGION_NAME",
+):
+    # never used: nothing is stored on S3
+    os.environ.setdefault(name, "studyhub-benchmark")
+
+from .settings import *  # noqa: E402,F401,F403
+from .settings import DATABASES  # noqa: E402
+
+DEBUG = False
+ALLOWED_HOSTS = ["testserver", "localhost", "127.0.0.1"]
+
+# the benchmarks create their own database (test_<NAME>) on this server
+DATABASES = {"default": DATABASES["default"]}
+DATABASE_REPLICAS = []
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+# the static files are not collected (no manifest), the pages only link them
+STATIC_ROOT = None
+
+MEDIA_ROOT = Path(tempfile.gettempdir()) / "studyhub-benchmark-media"
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+# plain HTTP requests
+CSRF_COOKIE_SECURE = False
+SESSION_COOKIE_SECURE = False
+SECURE_SSL_REDIRECT = False
+SECURE_HSTS_SECONDS = 0
+
+# the queries are reported by the benchmarks
+QUERY_BUDGET_STRICT = False
+
+# sent by the metrics scenario, like by a Prometheus scraper
+METRICS_TOKEN = "studyhub-benchmark"
@@ -5,5 +5,13 @@ set -e
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+if [ "${DJANGO_ASGI:-False}" = "True" ]; then
+    # the async views are served by an event loop in each worker (see
+    # DJANGO_ASGI in config/settings.py)
+    echo "Starting web server with Gunicorn (Uvicorn workers, ASGI)..."
+    exec gunicorn config.asgi:application --config config/gunicorn.py \
+        --worker-class uvicorn_worker.UvicornWorker
+fi
+
 echo "Starting web server with Gunicorn..."
-exec gunicorn config.wsgi:application --bind 0.0.0.0:8000 --workers 3
+exec gunicorn config.wsgi:application --config config/gunicorn.py
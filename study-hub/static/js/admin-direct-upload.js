@@ -0,0 +1,114 @@
+// Upload of the file of the "File" admin form straight to the storage (presigned POST),
+// so the application servers never receive the bytes of the file:
+// 1. ask the server for a presigned POST (and the signed key of the object)
+// 2. upload the file to the storage from the browser
+// 3. submit the admin form with the signed key instead of the file
+document.addEventListener("DOMContentLoaded", function () {
+  const tokenInput = document.querySelector("input[name='uploaded_file_token'][data-direct-upload-url]");
+  if (!tokenInput) {
+    // the storage does not support direct uploads, the file is sent with the form
+    return;
+  }
+  const form = tokenInput.form;
+  const fileInput = form.querySelector("input[type='file'][name='uploaded_file']");
+  if (!fileInput) {
+    return;
+  }
+
+  const progress = document.createElement("span");
+  progress.className = "help";
+  fileInput.after(progress);
+
+  function requestDirectUpload(file) {
+    const data = new FormData();
+    data.append("csrfmiddlewaretoken", form.elements["csrfmiddlewaretoken"].value);
+    data.append("name", form.elements["name"].value);
+    data.append("subcategory", form.elements["subcategory"].value);
+    data.append("file_type", form.elements["file_type"].value);
+    data.append("filename", file.name);
+    data.append("content_type", file.type);
+    data.append("size", file.size);
+
+    return fetch(tokenInput.dataset.directUploadUrl, { method: "POST", body: data, credentials: "same-origin" }).then(
+      function (response) {
+        return response.json().then(function (body) {
+          if (!response.ok) {
+            const errors = Object.values(body.errors || {}).flat();
+            throw new Error(errors.join("\n") || response.statusText);
+          }
+          return body;
+        });
+      }
+    );
+  }
+
+  function uploadToStorage(presignedPost, file) {
+    return new Promise(function (resolve, reject) {
+      const data = new FormData();
+      Object.entries(presignedPost.fields).forEach(function ([key, value]) {
+        data.append(key, value);
+      });
+      // the file must be the last field of the form
+      data.append("file", file);
+
+      const request = new XMLHttpRequest();
+      request.open("POST", presignedPost.url);
+      request.upload.addEventListener("progress", function (e) {
+        if (e.lengthComputable) {
+          progress.textContent = ` ${Math.round((e.loaded * 100) / e.total)}%`;
+        }
+      });
+      request.addEventListener("load", function () {
+        if (request.status >= 200 && request.status < 300) {
+          resolve();
+        } else {
+          reject(new Error(`Storage error (${request.status})`));
+        }
+      });
+      request.addEventListener("error", function () {
+        reject(new Error("Network error"));
+      });
+      request.send(data);
+    });
+  }
+
+  let uploaded = false;
+  form.addEventListener("submit", function (e) {
+    const file = fileInput.files[0];
+    if (uploaded || !file) {
+      return;
+    }
+    e.preventDefault();
+    // keep the clicked button ("Save and continue editing"...)
+    const submitter = e.submitter;
+    const submitButtons = form.querySelectorAll("[type='submit']");
+    submitButtons.forEach(function (button) {
+      button.disabled = true;
+    });
+
+    requestDirectUpload(file)
+      .then(function (directUpload) {
+        return uploadToStorage(directUpload, file).then(function () {
+          return directUpload.token;
+        });
+      })
+      .then(function (token) {
+        tokenInput.value = token;
+        // the file is not sent again with the form
+        fileInput.removeAttribute("name");
+        uploaded = true;
+        submitButtons.forEach(function (button) {
+          button.disabled = false;
+        });
+        form.requestSubmit(submitter);
+      })
+      .catch(function (error) {
+        console.log(error);
+        alert(error.message);
+        progress.textContent = "";
+        submitButtons.forEach(function (button) {
+          button.disabled = false;
+        });
+      });
+  });
+});
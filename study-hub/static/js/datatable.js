@@ -1,15 +1,22 @@
 // get the current URL path
 const currentPathURL = window.location.pathname.toString();
 
+// name of the downloaded file: the stored files are named by their content (blobs/<sha256>.pdf),
+// so the name of the row and the extension of the stored file, as in the ZIP archives
+function downloadFilename(row) {
+  const extension = new URL(row.uploaded_file, window.location.href).pathname.match(/\.[^./]+$/);
+  return row.name.replace(/[\\/]/g, "-") + (extension ? extension[0].toLowerCase() : "");
+}
+
 // function of using jsFileDownloader library to download file from web application to local/user machine
-function fileDownloader(filepath, btnElement) {
+function fileDownloader(filepath, filename, btnElement) {
   // keep the original HTML element
   const originalHTML = btnElement.html();
 
   // change to loading/spinner
   btnElement.html('<i class="spinner-border spinner-border-sm text-light" aria-hidden="true"></i>');
 
-  new jsFileDownloader({ url: filepath })
+  new jsFileDownloader({ url: filepath, filename: filename })
     .then(function () {
       // restore to original HTML element when its done
       btnElement.html(originalHTML);
@@ -24,9 +31,29 @@ function fileDownloader(filepath, btnElement) {
 
 $(document).ready(function () {
   const table = $("#dataTable");
+  const searchInput = $("#searchInput");
+  // only on the "Search" page: search in the names or in the contents of the files
+  const searchMode = $("#searchMode");
 
   const dataTable = table.DataTable({
-    ajax: currentPathURL,
+    // paging, ordering and searching are processed on the server side
+    serverSide: true,
+    processing: true,
+    ajax: {
+      url: currentPathURL,
+      headers: {
+        "X-Requested-With": "XMLHttpRequest",
+      },
+      // let the browser revalidate cached pages (ETag) instead of downloading them again,
+      // so the URL must not change on each draw (no "draw" counter, no cache busting)
+      cache: true,
+      data: function (data) {
+        delete data.draw;
+        if (searchMode.length) {
+          data.mode = searchMode.val();
+        }
+      },
+    },
     rowId: "id",
     layout: {
       topStart: null,
@@ -47,6 +74,7 @@ $(document).ready(function () {
       zeroRecords: "Không tìm thấy kết quả phù hợp",
       emptyTable: "Không tìm thấy thông tin dữ liệu",
       loadingRecords: "Đang tải...",
+      processing: "Đang tải...",
       entries: {
         _: "dòng",
         1: "dòng",
@@ -65,7 +93,23 @@ $(document).ready(function () {
         name: "name",
         title: "Tên / Chủ đề",
         render: function (data, type, row, meta) {
-          return `<a class="text-color-accent" href="${row.uploaded_file}" target="_blank" >${data}</a>`;
+          let link = `<a class="text-color-accent" href="${row.uploaded_file}" target="_blank" >${data}</a>`;
+          if (row.snippet) {
+            // extract of the content around the matched words (escaped by the server)
+            link = `<div>${link}<div class="small text-muted">${row.snippet}</div></div>`;
+          }
+          if (!row.thumbnail_url) {
+            return link;
+          }
+          // preview of the first page, the document itself is not downloaded
+          return `
+            <div class="d-flex align-items-center gap-2">
+              <a href="${row.preview_url}" target="_blank">
+                <img src="${row.thumbnail_url}" alt="" loading="lazy" width="40" class="rounded border" />
+              </a>
+              ${link}
+            </div>
+          `;
         },
       },
       { data: "category", name: "category", title: "Phân loại", className: "text-center" },
@@ -93,16 +137,33 @@ $(document).ready(function () {
       style: "multi",
       items: "row",
     },
-    order: [
-      { name: "last_modified", dir: "desc" },
-      { name: "name", dir: "asc" },
-    ],
+    // no initial ordering: the server sorts by relevance when searching,
+    // otherwise by the last modified date
+    order: [],
+    // search query passed from other pages (e.g. "Home" page)
+    searchCols: [null, { search: searchInput.val() }],
   });
 
   // search form (not using the default from DataTables.net)
-  $("#searchInput").on("keyup", function () {
-    // only search for column number 1 (name column)
-    dataTable.columns([1]).search(this.value).draw();
+  let searchTimer = null;
+  searchInput.closest("form").on("submit", function (e) {
+    // the table is already searched while typing
+    e.preventDefault();
+  });
+  searchInput.on("keyup", function () {
+    const searchValue = this.value;
+    // wait until the user stops typing, every draw is a request to the server
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(function () {
+      // only search for column number 1 (name column)
+      if (dataTable.column(1).search() !== searchValue) {
+        dataTable.column(1).search(searchValue).draw();
+      }
+    }, 400);
+  });
+
+  searchMode.on("change", function () {
+    dataTable.draw();
   });
 
   // add class "px-0" from Bootstrap 5 to these element tags
@@ -116,13 +177,31 @@ $(document).ready(function () {
     "#dataTable_wrapper .d-md-flex.justify-content-between.align-items-center.dt-layout-end.col-md-auto.ms-auto"
   ).addClass("px-0");
 
+  // download of the selected files in one ZIP archive (built by the server)
+  const archiveForm = $("#archiveForm");
+  dataTable.on("select deselect draw", function () {
+    const selectedCount = dataTable.rows({ selected: true }).count();
+    $("#archiveButton").prop("disabled", selectedCount === 0);
+    $("#archiveCount").text(selectedCount);
+  });
+  archiveForm.on("submit", function () {
+    archiveForm.find("input[name='file_ids']").remove();
+    dataTable
+      .rows({ selected: true })
+      .ids()
+      .each(function (fileId) {
+        archiveForm.append($("<input>", { type: "hidden", name: "file_ids", value: fileId }));
+      });
+  });
+
   // file downloader
   $(table).on("click", ".btn-downloader", function (e) {
     e.preventDefault();
 
     const filepath = $(this).attr("file-url").toString();
     const btnElement = $(this);
+    const row = dataTable.row(btnElement.closest("tr")).data();
 
-    fileDownloader(filepath, btnElement);
+    fileDownloader(filepath, downloadFilename(row), btnElement);
   });
 });